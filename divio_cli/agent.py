@@ -0,0 +1,304 @@
+"""
+A local agent keeping clients, their connection pools and caches warm between
+commands.
+
+`main` is the entry point of the `divio` executable. While the agent is
+running, it forwards read-only commands to it through a unix socket instead
+of importing and running the CLI. Everything else, and every command when no
+agent is running, runs in the process as usual.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import socket
+import sys
+import time
+from urllib.parse import urlparse
+
+from . import background, settings
+
+
+logger = logging.getLogger("divio.agent")
+
+# Commands the agent runs, by their path. They neither prompt nor change
+# anything, and their output only depends on the API and the arguments.
+FORWARDED_COMMANDS = {
+    ("app", "list"),
+    ("app", "deploy-log"),
+    ("app", "deployments", "list"),
+    ("app", "deployments", "get"),
+    ("app", "deployments", "get-var"),
+    ("app", "env-vars", "list"),
+    ("app", "env-vars", "get"),
+    ("app", "environment-variables", "list"),
+    ("app", "environment-variables", "get"),
+    ("app", "service-instances", "list"),
+    ("organisations", "list"),
+    ("regions", "list"),
+    ("services", "list"),
+}
+# Aliases of the groups above.
+ALIASES = {"project": "app"}
+
+
+def is_supported():
+    return hasattr(socket, "AF_UNIX")
+
+
+def is_forwarded(args):
+    """
+    Return whether the command given by the arguments is run by the agent.
+    Global options are not forwarded, they have to be given locally.
+    """
+    if not args or args[0].startswith("-"):
+        return False
+    # options can come between the groups and commands, but none of the
+    # groups leading to forwarded commands takes a value
+    path = [arg for arg in args if not arg.startswith("-")]
+    path[0] = ALIASES.get(path[0], path[0])
+    return any(
+        tuple(path[: len(command)]) == command
+        for command in FORWARDED_COMMANDS
+    )
+
+
+def send(request, timeout=None, path=None):
+    """
+    Send a request to the agent and return its response, or `None` if no
+    agent is listening. Raise `socket.timeout` if it does not answer within
+    `timeout` seconds.
+    """
+    path = path or settings.DIVIO_AGENT_SOCKET
+    timeout = timeout or settings.AGENT_READ_TIMEOUT
+    if not is_supported() or not os.path.exists(path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(settings.AGENT_CONNECT_TIMEOUT)
+        try:
+            sock.connect(path)
+        except OSError:
+            # a socket left behind by an agent that did not shut down
+            return None
+        sock.settimeout(timeout)
+        sock.sendall(json.dumps(request).encode())
+        sock.shutdown(socket.SHUT_WR)
+        return json.loads(read_all(sock))
+    finally:
+        sock.close()
+
+
+def read_all(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def forward(args):
+    """
+    Run the command in the agent. Return its exit code, or `None` if it was
+    not forwarded.
+    """
+    if os.environ.get("DIVIO_NO_AGENT") or not is_forwarded(args):
+        return None
+
+    try:
+        response = send(
+            {
+                "args": args,
+                "cwd": os.getcwd(),
+                "env": dict(os.environ),
+                "color": sys.stdout.isatty(),
+                "tty": sys.stdout.isatty(),
+            }
+        )
+    except (OSError, ValueError) as exc:
+        # e.g. an agent that hangs, the command is run locally instead
+        logger.debug("could not forward the command to the agent: %s", exc)
+        return None
+    if response is None:
+        return None
+
+    sys.stdout.write(response["stdout"])
+    sys.stdout.flush()
+    sys.stderr.write(response["stderr"])
+    return response["exit_code"]
+
+
+def main():
+    exit_code = forward(sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+
+    from .cli import cli
+
+    cli()
+
+
+class ClientPool:
+    """
+    The clients of the agent, by endpoint and credentials. Reusing a client
+    reuses the connections of its session and what it cached.
+    """
+
+    def __init__(self):
+        self.clients = {}
+
+    def get(self, endpoint, debug=False, sudo=False):
+        from .cloud import CloudClient
+        from .config import get_netrc
+
+        token = get_netrc().get_token(urlparse(endpoint).hostname)
+        key = (endpoint, debug, sudo, token)
+        if key not in self.clients:
+            self.clients[key] = CloudClient(endpoint, debug=debug, sudo=sudo)
+        client = self.clients[key]
+        client.reset()
+        return client
+
+
+class CapturedOutput(io.StringIO):
+    """
+    Captures the output of a command, telling whether the output of the
+    client is a terminal, so that the command behaves as if run there.
+    """
+
+    def __init__(self, tty=False):
+        super().__init__()
+        self.tty = tty
+
+    def isatty(self):
+        return self.tty
+
+
+@contextlib.contextmanager
+def command_environment(request):
+    """
+    Run a command as if it was run by the client: in its directory, with its
+    environment and arguments, and with its output captured. Commands run
+    one after another, and what they left running in the background is
+    waited for before the directory and environment are restored.
+    """
+    cwd, environ, argv = os.getcwd(), dict(os.environ), sys.argv
+    streams = sys.stdin, sys.stdout, sys.stderr
+    stdout = CapturedOutput(tty=request.get("tty", False))
+    stderr = CapturedOutput()
+    try:
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        sys.argv = ["divio", *request["args"]]
+        # commands must not wait for input that never comes
+        sys.stdin = io.StringIO()
+        sys.stdout, sys.stderr = stdout, stderr
+        for handler in logging.getLogger().handlers:
+            if isinstance(handler, logging.StreamHandler):
+                handler.setStream(stderr)
+        yield stdout, stderr
+    finally:
+        background.join_all()
+        sys.stdin, sys.stdout, sys.stderr = streams
+        sys.argv = argv
+        os.environ.clear()
+        os.environ.update(environ)
+        os.chdir(cwd)
+
+
+def run_command(request, clients):
+    from . import retry
+    from .cli import cli
+    from .utils import Map
+
+    obj = Map()
+    obj.clients = clients
+    # the budget is meant for one command, not the life of the agent
+    retry.reset_budget()
+    with command_environment(request) as (stdout, stderr):
+        try:
+            cli.main(
+                request["args"],
+                prog_name="divio",
+                obj=obj,
+                color=request.get("color") or None,
+            )
+            exit_code = 0
+        except SystemExit as exc:
+            exit_code = exc.code if isinstance(exc.code, int) else 1
+        except Exception:
+            logger.exception("command %s failed", request["args"])
+            exit_code = 1
+
+    return {
+        "exit_code": exit_code,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+    }
+
+
+def serve(path=None, idle_timeout=None):
+    """
+    Run the agent until it is stopped or no command was received for
+    `idle_timeout` seconds.
+    """
+    path = path or settings.DIVIO_AGENT_SOCKET
+    idle_timeout = idle_timeout or settings.AGENT_IDLE_TIMEOUT
+    if send({"ping": True}, path=path):
+        raise RuntimeError(f"an agent is already listening on {path}")
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    clients = ClientPool()
+    started_at = time.time()
+    try:
+        # only the user running the agent can send it commands
+        umask = os.umask(0o177)
+        try:
+            server.bind(path)
+        finally:
+            os.umask(umask)
+        server.listen()
+        server.settimeout(idle_timeout)
+        while True:
+            try:
+                connection, _ = server.accept()
+            except socket.timeout:
+                logger.info("idle for %ss, shutting down", idle_timeout)
+                return
+            with connection:
+                # a client that does not send its request must not block
+                # the agent for the others
+                connection.settimeout(settings.AGENT_CONNECT_TIMEOUT)
+                try:
+                    request = json.loads(read_all(connection))
+                except (OSError, ValueError) as exc:
+                    logger.info("dropped a connection: %r", exc)
+                    continue
+                connection.settimeout(settings.AGENT_READ_TIMEOUT)
+                if request.get("stop"):
+                    connection.sendall(json.dumps({"stopped": True}).encode())
+                    return
+                if request.get("ping"):
+                    response = {"pid": os.getpid(), "started_at": started_at}
+                else:
+                    response = run_command(request, clients)
+                connection.sendall(json.dumps(response).encode())
+    finally:
+        server.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m divio_cli.agent")
+    parser.add_argument("--idle-timeout", type=int, default=None)
+    serve(idle_timeout=parser.parse_args().idle_timeout)
@@ -1,19 +1,28 @@
+import functools
 import os
 from urllib.parse import urljoin, urlparse
 
+import attr
 import requests
+from requests.structures import CaseInsensitiveDict
 
 from divio_cli.exceptions import DivioException
 
-from . import messages
+from . import messages, retry, transport
+from .config import get_netrc
+from .download import record_digest, save_response
+from .http_cache import get_identity
 from .utils import create_temp_dir, get_user_agent
 
 
 class SingleHostSession(requests.Session):
+    retry_policy = retry.default_policy
+
     def __init__(self, host, **kwargs):
         super().__init__()
         self.debug = kwargs.pop("debug", False)
         self.host = host.rstrip("/")
+        transport.mount(self, pool_size=kwargs.pop("pool_size", None))
 
         default_proxies = {}
 
@@ -42,11 +51,13 @@ class SingleHostSession(requests.Session):
             # All v3 endpoints support JSON, and some use nested data structures
             # that do not work with url-encoded body
             kwargs["json"] = kwargs.pop("data", {})
-        return super().request(method, url, *args, **kwargs)
+        send = functools.partial(super().request, method, url, *args, **kwargs)
+        return self.retry_policy.call(send, method, url)
 
 
+@attr.s(auto_attribs=True)
 class APIRequestError(DivioException):
-    pass
+    status_code: int = None
 
 
 class NetworkError(DivioException):
@@ -65,7 +76,10 @@ class APIRequest:
 
     method = "GET"
     url = None
-    default_headers = {"User-Agent": get_user_agent()}
+    # Number of seconds a response may be served from the on-disk cache
+    # without asking the server. Once expired, the cached response is
+    # revalidated with a conditional request. `None` disables caching.
+    cache_ttl = None
 
     def __init__(
         self,
@@ -94,6 +108,11 @@ class APIRequest:
             **(headers or {}),
         }
 
+    @property
+    def default_headers(self):
+        # built on first use rather than at import time, see get_user_agent
+        return {"User-Agent": get_user_agent()}
+
     def __call__(self, *args, **kwargs):
         return self.request(*args, **kwargs)
 
@@ -102,10 +121,7 @@ class APIRequest:
 
     def get_login(self):
         """Tries to get the login name for the current request"""
-        # import done here to prevent circular import
-        from . import cloud
-
-        netrc = cloud.WritableNetRC()
+        netrc = getattr(self.session, "netrc", None) or get_netrc()
         host = urlparse(self.session.host).hostname
         data = netrc.hosts.get(host)
         if data:
@@ -121,7 +137,33 @@ class APIRequest:
 
         return self.response_code_error_map
 
+    def get_cache(self):
+        if self.method != "GET" or self.cache_ttl is None:
+            return None
+        return getattr(self.session, "cache", None)
+
+    def get_cache_key(self, cache):
+        headers = CaseInsensitiveDict(getattr(self.session, "headers", {}))
+        headers.update(self.headers)
+        return cache.get_key(
+            self.method,
+            urljoin(self.session.host, self.get_url()),
+            params=self.params,
+            identity=get_identity(headers),
+        )
+
     def request(self, *args, **kwargs):
+        cache = self.get_cache()
+        entry = None
+        headers = self.headers
+        if cache:
+            cache_key = self.get_cache_key(cache)
+            entry = cache.get(cache_key)
+            if entry and entry.age < self.cache_ttl:
+                return self.verify(entry.to_response())
+            if entry:
+                headers = {**headers, **entry.get_conditional_headers()}
+
         try:
             response = self.session.request(
                 self.method,
@@ -129,7 +171,7 @@ class APIRequest:
                 *args,
                 data=self.data,
                 files=self.files,
-                headers=self.headers,
+                headers=headers,
                 params=self.params,
                 **kwargs,
             )
@@ -139,6 +181,13 @@ class APIRequest:
         ) as e:
             raise NetworkError(messages.NETWORK_ERROR_MESSAGE + str(e))
 
+        if cache:
+            if entry and response.status_code == requests.codes.not_modified:
+                cache.refresh(entry)
+                response = entry.to_response()
+            elif response.status_code == requests.codes.ok:
+                cache.set(cache_key, response)
+
         return self.verify(response)
 
     def verify(self, response):
@@ -160,7 +209,7 @@ class APIRequest:
                 # Must keep this generic due to compatibility issues of requests library for json decode exceptions.
                 except Exception:
                     error_msg = f"{error_msg}\n\n{response_content}"
-            raise APIRequestError(error_msg)
+            raise APIRequestError(error_msg, status_code=response.status_code)
         return self.process(response)
 
     def process(self, response):
@@ -218,12 +267,9 @@ class FileResponse:
             self.directory or create_temp_dir(), self.filename or "data.tar.gz"
         )
 
-        with open(dump_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=1024):
-                if chunk:  # filter out keep-alive new chunks
-                    f.write(chunk)
-                    f.flush()
-        return dump_path
+        stats = save_response(response, dump_path)
+        record_digest(stats.path, stats.sha256)
+        return stats.path
 
     def request(self, *args, **kwargs):
         kwargs["stream"] = True
@@ -240,6 +286,7 @@ class ApplicationsListRequest(JsonResponse, APIV3Request):
 
 class ApplicationPlanGroupsListRequest(JsonResponse, APIV3Request):
     url = "/billing/v3/application-plan-groups/"
+    cache_ttl = 60 * 60
 
 
 class ApplicationPlanGroupGetRequest(JsonResponse, APIV3Request):
@@ -430,6 +477,7 @@ class CreateApplicationRequest(JsonResponse, APIV3Request):
 class ApplicationTemplateListRequest(JsonResponse, APIV3Request):
     url = "/apps/v3/app-templates/"
     method = "GET"
+    cache_ttl = 60 * 60
 
 
 class ApplicationTemplateGetRequest(JsonResponse, APIV3Request):
@@ -450,16 +498,19 @@ class CreateServiceInstanceRequest(JsonResponse, APIV3Request):
 class ListServicesRequest(JsonResponse, APIV3Request):
     url = "/apps/v3/services/?{filter_region}&{filter_website}"
     method = "GET"
+    cache_ttl = 60 * 60
 
 
 class ListRegionsRequest(JsonResponse, APIV3Request):
     url = "/apps/v3/regions/"
     method = "GET"
+    cache_ttl = 60 * 60 * 24
 
 
 class ListOrganisationsRequest(JsonResponse, APIV3Request):
     url = "/iam/v3/organisations/"
     method = "GET"
+    cache_ttl = 60 * 10
 
 
 # Legacy
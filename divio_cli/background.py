@@ -0,0 +1,70 @@
+import logging
+import threading
+import time
+import weakref
+
+
+logger = logging.getLogger("divio.background")
+
+# The tasks started and not joined yet, see `join_all`.
+running_tasks = weakref.WeakSet()
+
+
+class BackgroundTask:
+    """
+    Runs a function in a daemon thread, so that it never delays the exit of
+    the CLI. Use `join` to wait for its result up to a deadline.
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.exception = None
+        self.thread = threading.Thread(
+            target=self.run,
+            name=f"divio-{func.__name__}",
+            daemon=True,
+        )
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args, **self.kwargs)
+        except Exception as exc:
+            logger.debug("%s failed: %s", self.func.__name__, exc)
+            self.exception = exc
+
+    def start(self):
+        running_tasks.add(self)
+        self.thread.start()
+        return self
+
+    def join(self, deadline=None):
+        """
+        Wait until the task is done or `deadline` (a `time.monotonic`
+        timestamp) has passed. Return whether the task is done.
+        """
+        timeout = None
+        if deadline is not None:
+            timeout = max(0, deadline - time.monotonic())
+        self.thread.join(timeout=timeout)
+        done = not self.thread.is_alive()
+        if done:
+            running_tasks.discard(self)
+        if not done:
+            logger.debug("%s did not finish in time", self.func.__name__)
+        return done
+
+
+def run_in_background(func, *args, **kwargs):
+    return BackgroundTask(func, *args, **kwargs).start()
+
+
+def join_all():
+    """
+    Wait for every task started so far, e.g. before the agent changes the
+    directory and environment they may read for the next command.
+    """
+    for task in list(running_tasks):
+        task.join()
@@ -1,4 +1,5 @@
 import functools
+import itertools
 import json
 import logging
 import os
@@ -7,23 +8,22 @@ import time
 from functools import partial
 
 import click
-import sentry_sdk
 import simple_logging_setup
 from click_aliases import ClickAliasedGroup
-from sentry_sdk.integrations.atexit import AtexitIntegration
 
-import divio_cli
 from divio_cli import widgets
+from divio_cli.background import run_in_background
 from divio_cli.client import Client
 from divio_cli.domain_models.app_template import AppTemplate
 
-from . import localdev, messages, settings
+from . import localdev, messages, polling, settings
 from .check_system import check_requirements, check_requirements_human
 from .cloud import CloudClient, get_divio_zone, get_endpoint
-from .excepthook import DivioExcepthookIntegration, divio_shutdown
+from .download import download
 from .exceptions import (
     ConfigurationNotFound,
     DivioException,
+    DivioWarning,
     EnvironmentDoesNotExist,
     ExitCode,
 )
@@ -37,24 +37,17 @@ from .upload.addon import upload_addon
 from .utils import (
     Map,
     clean_table_cell,
-    download_file,
     echo_environment_variables_as_txt,
     echo_large_content,
     get_cp_url,
     get_git_checked_branch,
     hr,
+    iter_table,
     launch_url,
     open_application_cloud_site,
     table,
 )
 from .validators.addon import validate_addon
-from .wizards import CreateAppWizard
-
-
-try:
-    import ipdb as pdb  # noqa: T100
-except ImportError:
-    import pdb  # noqa: T100
 
 
 # Display the default value for options globally.
@@ -66,6 +59,40 @@ def set_cli_non_interactive(ctx, non_interactive, value):
         widgets.set_non_interactive()
 
 
+cached_option = click.option(
+    "--cached",
+    is_flag=True,
+    default=False,
+    help=(
+        "Answer from the local metadata store when it holds the results. "
+        "It is refreshed with 'divio cache sync'."
+    ),
+)
+
+
+def get_max_staleness(ctx, param, value):
+    if value is not None:
+        return value
+    # scripts get current results unless they ask otherwise
+    if not sys.stdout.isatty():
+        return 0
+    return ctx.obj.client.config.get_max_staleness()
+
+
+max_staleness_option = click.option(
+    "--max-staleness",
+    type=click.IntRange(min=0),
+    default=None,
+    callback=get_max_staleness,
+    show_default="1 day in a terminal, 0 otherwise",
+    help=(
+        "Print stored results up to this many seconds old right away, and "
+        "refresh them in the background for the next call. Use 0 to always "
+        "request current results."
+    ),
+)
+
+
 @click.group(
     cls=ClickAliasedGroup,
     context_settings={"help_option_names": ["--help", "-h"]},
@@ -113,6 +140,7 @@ def cli(ctx, debug, zone, sudo, verbose):
                 "+divio.client",
                 "+divio.client.http.request",
                 "+divio.client.http.response",
+                "+divio.client.retry",
             ]
         )
 
@@ -163,9 +191,14 @@ def cli(ctx, debug, zone, sudo, verbose):
     if zone:
         os.environ["DIVIO_ZONE"] = zone
 
+    divio_zone = zone or get_divio_zone()
+
+    # the agent passes the clients it keeps between commands
+    clients = ctx.obj.clients if ctx.obj else None
+
     ctx.obj = Map()
-    ctx.obj.client = CloudClient(
-        get_endpoint(zone=zone), debug=debug, sudo=sudo
+    ctx.obj.client = (clients.get if clients else CloudClient)(
+        get_endpoint(zone=divio_zone), debug=debug, sudo=sudo
     )
     ctx.obj.zone = zone
 
@@ -190,34 +223,88 @@ def cli(ctx, debug, zone, sudo, verbose):
                 fg="red",
                 err=True,
             )
+            try:
+                import ipdb as pdb  # noqa: T100
+            except ImportError:
+                import pdb  # noqa: T100
+
             pdb.post_mortem(traceback)
 
         sys.excepthook = exception_handler
     else:
-        sentry_sdk.init(
-            ctx.obj.client.config.get_sentry_dsn(),
-            traces_sample_rate=0,
-            release=divio_cli.__version__,
-            server_name="client",
-            integrations=[
-                DivioExcepthookIntegration(),
-                AtexitIntegration(callback=divio_shutdown),
-            ],
-        )
+        sentry_dsn = ctx.obj.client.config.get_sentry_dsn()
+
+        def exception_handler(*exc_info):
+            # imported here as sentry is slow to import
+            from .excepthook import sentry_excepthook
+
+            sentry_excepthook(sentry_dsn, *exc_info)
+
+        sys.excepthook = exception_handler
 
     try:
         is_version_command = sys.argv[1] == "version"
     except IndexError:
         is_version_command = False
 
-    # migrate project_settings if needed
-    migrate_project_settings(client=ctx.obj.client)
+    # Migrating the project settings can involve an API request, and the
+    # update check a request to PyPI. Both run while the command executes.
+    migration = run_in_background(
+        migrate_project_settings, client=ctx.obj.client
+    )
 
     # skip if 'divio version' is run
+    update_check = None
     if not is_version_command:
-        # check for newer versions
-        update_info = ctx.obj.client.config.check_for_updates()
-        if update_info["update_available"]:
+        update_check = run_in_background(
+            ctx.obj.client.config.check_for_updates
+        )
+
+    ctx.call_on_close(
+        partial(finish_background_tasks, migration, update_check)
+    )
+    ctx.call_on_close(partial(finish_revalidations, ctx.obj.client))
+
+    # new client, sharing the connection pool and credentials of the
+    # legacy client
+    ctx.obj.client2 = Client(
+        zone=divio_zone,
+        session=ctx.obj.client.session,
+        netrc=ctx.obj.client.netrc,
+    )
+
+
+def finish_revalidations(client):
+    """
+    Tell which results were printed from the metadata store, and give their
+    refreshes some time to complete.
+    """
+    if not client.revalidations:
+        return
+
+    as_of = min(stored_at for stored_at, _ in client.revalidations)
+    click.secho(
+        messages.STALE_RESULTS.format(
+            as_of=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(as_of))
+        ),
+        fg="yellow",
+        err=True,
+    )
+
+    deadline = time.monotonic() + settings.BACKGROUND_TASKS_DEADLINE
+    for _, task in client.revalidations:
+        task.join(deadline)
+
+
+def finish_background_tasks(migration, update_check):
+    deadline = time.monotonic() + settings.BACKGROUND_TASKS_DEADLINE
+
+    migration.join(deadline)
+
+    # check for newer versions
+    if update_check and update_check.join(deadline):
+        update_info = update_check.result
+        if update_info and update_info["update_available"]:
             click.secho(
                 "New version {} is available. Type `divio version` to "
                 "show information about upgrading.".format(
@@ -227,11 +314,6 @@ def cli(ctx, debug, zone, sudo, verbose):
                 err=True,
             )
 
-    # new client
-    ctx.obj.client2 = Client(
-        zone=zone or get_divio_zone(),
-    )
-
 
 @cli.command()
 @click.argument("token", required=False)
@@ -319,12 +401,15 @@ def services():
     type=int,
     help="The maximum number of results that can be retrieved.",
 )
+@max_staleness_option
 @click.pass_obj
-def list_services(obj, region, as_json, limit_results):
+def list_services(obj, region, as_json, limit_results, max_staleness):
     """List all available services for a region."""
 
     results, messages = obj.client.get_services(
-        region_uuid=region, limit_results=limit_results
+        region_uuid=region,
+        limit_results=limit_results,
+        max_staleness=max_staleness,
     )
 
     if not results:
@@ -446,6 +531,9 @@ def application_create(
     obj.as_json = as_json
     obj.metadata = {}
 
+    # imported here as inquirer is slow to import
+    from .wizards import CreateAppWizard
+
     wiz = CreateAppWizard(obj)
 
     name = wiz.get_name(name)
@@ -511,23 +599,34 @@ def application_create(
     default=False,
     help="Choose whether to display content in json format.",
 )
+@cached_option
+@max_staleness_option
 @click.pass_obj
-def application_list(obj, grouped, pager, as_json):
+def application_list(obj, grouped, pager, as_json, cached, max_staleness):
     """List all your applications."""
     obj.pager = pager
-    api_response = obj.client.get_applications_v1()
+    (
+        applications,
+        organisations,
+    ) = obj.client.get_applications_with_organisations(
+        cached=cached, max_staleness=max_staleness
+    )
 
     if as_json:
+        api_response = {
+            "count": len(applications),
+            "next": None,
+            "previous": None,
+            "results": applications,
+        }
         click.echo(json.dumps(api_response, indent=2, sort_keys=True))
         return
 
     header = ["ID", "Slug", "Name", "Organisation"]
 
     data = {}
-    for application in api_response["results"]:
-        org_name = obj.client.get_organisation(application["organisation"])[
-            "name"
-        ]
+    for application in applications:
+        org_name = organisations[application["organisation"]]["name"]
         if not data.get(org_name):
             data[org_name] = []
         data[org_name].append(
@@ -603,11 +702,84 @@ def application_deploy_log(obj, remote_id, environment):
 @click.option(
     "--utc", "utc", default=False, is_flag=True, help="Show times in UTC/"
 )
+@click.option(
+    "--archive",
+    is_flag=True,
+    default=False,
+    help="Store the logs locally for 'divio app logs-search', starting "
+    "after the last ones stored.",
+)
 @click.pass_obj
 @allow_remote_id_override
-def application_logs(obj, remote_id, environment, tail, utc):
+def application_logs(obj, remote_id, environment, tail, utc, archive):
     """View logs."""
-    obj.client.show_log(remote_id, environment, tail, utc)
+    obj.client.show_log(remote_id, environment, tail, utc, archive=archive)
+
+
+@app.command(name="logs-search")
+@click.argument("query", required=False)
+@click.option(
+    "-e",
+    "--environment",
+    default="test",
+    help="Environment whose archived logs are searched.",
+)
+@click.option(
+    "--since",
+    help="Only show entries from this date or duration ago (e.g. 2h).",
+)
+@click.option(
+    "--until",
+    help="Only show entries before this date or duration ago (e.g. 30m).",
+)
+@click.option(
+    "-s",
+    "--service",
+    "services",
+    multiple=True,
+    help="Only show entries of this service, can be given several times.",
+)
+@click.option(
+    "-n",
+    "--limit",
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+    help="Show at most the latest matching entries.",
+)
+@click.option(
+    "--utc", "utc", default=False, is_flag=True, help="Show times in UTC."
+)
+@click.pass_obj
+@allow_remote_id_override
+def application_logs_search(
+    obj, remote_id, query, environment, since, until, services, limit, utc
+):
+    """
+    Search the logs archived with 'divio app logs --archive'.
+
+    QUERY uses the SQLite full-text search syntax, e.g. 'timeout',
+    '"connection refused"' or 'error NOT deprecation'.
+    """
+    from .logs import LogRenderer, parse_time
+
+    log_archive = obj.client.get_log_archive(remote_id, environment)
+    try:
+        entries = log_archive.search(
+            query,
+            since=parse_time(since) if since else None,
+            until=parse_time(until) if until else None,
+            services=services,
+            limit=limit,
+        )
+    finally:
+        log_archive.close()
+    if not entries:
+        raise DivioWarning(
+            "No archived log entries match, run 'divio app logs --archive' "
+            "to archive the latest ones."
+        )
+    LogRenderer(utc=utc).render(entries)
 
 
 @app.command(name="ssh")
@@ -749,20 +921,61 @@ def deployments(obj, pager, as_json):
     type=int,
     help="The maximum number of results that can be retrieved.",
 )
+@cached_option
+@max_staleness_option
 @click.pass_obj
 @allow_remote_id_override
 def list_deployments(
-    obj, remote_id, environment, all_environments, limit_results
+    obj,
+    remote_id,
+    environment,
+    all_environments,
+    limit_results,
+    cached,
+    max_staleness,
 ):
     """
     Retrieve deployments from an environment or
     deployments across all environments of an application.
     """
+    if (
+        not obj.as_json
+        and not all_environments
+        and not cached
+        and not max_staleness
+    ):
+        # Print the deployments of a single environment page by page.
+        environment_uuid, deployments = obj.client.iter_deployments(
+            application_uuid=remote_id,
+            environment=environment,
+            limit_results=limit_results,
+        )
+        columns = obj.table_format_columns
+        rows = (
+            [[row[key] for key in columns] for row in page]
+            for page in deployments.pages()
+        )
+        echo_large_content(
+            itertools.chain(
+                [f"Environment: {environment} ({environment_uuid})\n"],
+                iter_table(rows, columns),
+            ),
+            ctx=obj,
+        )
+
+        if deployments.messages:
+            click.echo()
+            for msg in deployments.messages:
+                click.secho(msg, fg="yellow")
+        return
+
     results, messages = obj.client.get_deployments(
         application_uuid=remote_id,
         environment=environment,
         all_environments=all_environments,
         limit_results=limit_results,
+        cached=cached,
+        max_staleness=max_staleness,
     )
 
     if obj.as_json:
@@ -926,6 +1139,35 @@ def list_environment_variables(
     or environment variables across all environments of an application.
     """
 
+    if not obj.as_json and not obj.as_txt and not all_environments:
+        # Print the environment variables of a single environment page by
+        # page.
+        environment_uuid, environment_variables = (
+            obj.client.iter_environment_variables(
+                application_uuid=remote_id,
+                environment=environment,
+                limit_results=limit_results,
+            )
+        )
+        columns = obj.table_format_columns
+        rows = (
+            [[clean_table_cell(row, key) for key in columns] for row in page]
+            for page in environment_variables.pages()
+        )
+        echo_large_content(
+            itertools.chain(
+                [f"Environment: {environment} ({environment_uuid})\n"],
+                iter_table(rows, columns, maxcolwidths=50),
+            ),
+            ctx=obj,
+        )
+
+        if environment_variables.messages:
+            click.echo()
+            for msg in environment_variables.messages:
+                click.secho(msg, fg="yellow")
+        return
+
     results, messages = obj.client.get_environment_variables(
         application_uuid=remote_id,
         environment=environment,
@@ -1121,41 +1363,61 @@ def service_instances():
     type=int,
     help="The maximum number of results that can be retrieved.",
 )
+@cached_option
 @click.pass_obj
 @allow_remote_id_override
 def list_service_instances(
-    obj, remote_id, environment, as_json, limit_results
+    obj, remote_id, environment, as_json, limit_results, cached
 ):
     """List the services instances of an application."""
 
-    try:
-        environment_uuid = obj.client.get_environment(remote_id, environment)[
-            "uuid"
-        ]
-    except KeyError:
-        click.secho(
-            f"Environment with the name '{environment}' does not exist.",
-            fg="red",
-            err=True,
+    if cached:
+        environment_uuid = (
+            obj.client.get_environment_resolver().get_environment(
+                remote_id, environment
+            )["uuid"]
+        )
+        results, messages = obj.client.get_service_instances(
+            environment_uuid=environment_uuid,
+            limit_results=limit_results,
+            cached=True,
         )
-        sys.exit(1)
+        count, pages = len(results), [results]
+    else:
+        try:
+            environment_uuid = obj.client.get_environment(
+                remote_id, environment
+            )["uuid"]
+        except KeyError:
+            click.secho(
+                f"Environment with the name '{environment}' does not exist.",
+                fg="red",
+                err=True,
+            )
+            sys.exit(1)
 
-    results, messages = obj.client.get_service_instances(
-        environment_uuid=environment_uuid, limit_results=limit_results
-    )
+        service_instances = obj.client.iter_service_instances(
+            environment_uuid=environment_uuid, limit_results=limit_results
+        )
+        # messages are only known once all pages were consumed
+        count, pages, messages = (
+            service_instances.count,
+            service_instances.pages(),
+            service_instances.messages,
+        )
 
-    if not results:
+    if not count:
         click.echo(
             f"No service instances found for {environment!r} environment."
         )
         return
 
-    if messages:
-        click.echo()
-        for msg in messages:
-            click.secho(msg, fg="yellow")
-
     if as_json:
+        results = [entry for page in pages for entry in page]
+        if messages:
+            click.echo()
+            for msg in messages:
+                click.secho(msg, fg="yellow")
         click.echo(json.dumps(results, indent=2, sort_keys=True))
         return
 
@@ -1167,20 +1429,27 @@ def list_service_instances(
         "Region",
         "Service",
     ]
-    data = [
+    rows = (
         [
-            entry["uuid"],
-            entry["prefix"],
-            entry["type"],
-            entry["service_status"],
-            entry["region"],
-            entry["service"],
+            [
+                entry["uuid"],
+                entry["prefix"],
+                entry["type"],
+                entry["service_status"],
+                entry["region"],
+                entry["service"],
+            ]
+            for entry in page
         ]
-        for entry in results
-    ]
+        for page in pages
+    )
 
-    output = table(data, headers, tablefmt="grid", maxcolwidths=30)
-    echo_large_content(output, ctx=obj)
+    echo_large_content(iter_table(rows, headers, maxcolwidths=30), ctx=obj)
+
+    if messages:
+        click.echo()
+        for msg in messages:
+            click.secho(msg, fg="yellow")
 
 
 @service_instances.command(name="add")
@@ -1239,6 +1508,26 @@ def common_pull_options(f):
         default=None,
         help="The UUID of a service instance backup to restore.",
     )
+    @click.option(
+        "--connections",
+        type=click.IntRange(min=1),
+        default=None,
+        help=(
+            "Download the backup over this many connections, if the storage "
+            "supports ranges, up to the 'http-pool-size' setting. Defaults "
+            "to the 'download-connections' setting."
+        ),
+    )
+    @click.option(
+        "--segment-size",
+        type=click.IntRange(min=1),
+        default=None,
+        help=(
+            "Size in MB of the ranges downloaded on each connection. "
+            "Defaults to the backup size split between the connections, up "
+            "to 32 MB."
+        ),
+    )
     @click.argument("environment", default="test")
     @click.argument("prefix", default=localdev.DEFAULT_SERVICE_PREFIX)
     @click.pass_obj
@@ -1248,6 +1537,8 @@ def common_pull_options(f):
         if "prefix" in kwargs:
             # prefixes are always in capital letters
             kwargs["prefix"] = kwargs["prefix"].upper()
+        if kwargs.get("segment_size"):
+            kwargs["segment_size"] *= 1024 * 1024
         return f(*args, **kwargs)
 
     return wrapper_common_options
@@ -1261,6 +1552,16 @@ def common_pull_options(f):
     type=click.Path(exists=False),
     help="Specify path to output the dumped database.",
 )
+@click.option(
+    "--stream",
+    is_flag=True,
+    default=False,
+    help=(
+        "Restore the database while it downloads, without writing the dump "
+        "to disk. Dumps that cannot be restored this way are downloaded "
+        "first."
+    ),
+)
 @common_pull_options
 def pull_db(
     obj,
@@ -1269,11 +1570,19 @@ def pull_db(
     prefix,
     keep_tempfile,
     backup_si_uuid,
+    connections,
+    segment_size,
     dumpfile,
+    stream,
 ):
     """
     Pull database from the Divio cloud environment.
     """
+    if stream and (keep_tempfile or dumpfile):
+        raise click.UsageError(
+            "--stream writes no file, it cannot be combined with "
+            "--keep-tempfile or --dumpfile."
+        )
 
     try:
         application_home = utils.get_application_home()
@@ -1289,12 +1598,15 @@ def pull_db(
             dump_path=dump_path,
             backup_si_uuid=backup_si_uuid,
             keep_tempfile=keep_tempfile,
+            connections=connections,
+            segment_size=segment_size,
+            stream=stream,
         )()
 
         return
 
     except ConfigurationNotFound:
-        if not remote_id:
+        if not remote_id or stream:
             raise
 
     if not dumpfile:
@@ -1325,19 +1637,29 @@ def pull_db(
             obj.client, backup_uuid, backup_si_uuid
         )
 
-        output = download_file(
-            url=download_url,
+        stats = download(
+            download_url,
             directory=directory,
             filename=filename,
+            connections=connections,
+            segment_size=segment_size,
         )
+        click.echo(stats, nl=False)
 
-    click.echo(f"wrote to {output}")
+    click.echo(f"wrote to {stats.path}")
 
 
 @application_pull.command(name="media")
 @common_pull_options
 def pull_media(
-    obj, remote_id, environment, prefix, keep_tempfile, backup_si_uuid
+    obj,
+    remote_id,
+    environment,
+    prefix,
+    keep_tempfile,
+    backup_si_uuid,
+    connections,
+    segment_size,
 ):
     """
     Pull media files from the Divio cloud environment.
@@ -1349,6 +1671,8 @@ def pull_media(
         application_uuid=remote_id,
         keep_tempfile=keep_tempfile,
         backup_si_uuid=backup_si_uuid,
+        connections=connections,
+        segment_size=segment_size,
     )
 
 
@@ -1462,16 +1786,7 @@ def push_db(
             si_backup_uuid=si_backup_uuid,
             notes=backups.UPLOAD_BACKUP_NOTE,
         )
-
-        restore_uuid = response["uuid"]
-        restore = {}
-
-        while not restore.get("finished", False):
-            time.sleep(2)
-            restore = obj.client.get_backup_restore(restore_uuid)
-
-        if restore.get("success") != "SUCCESS":
-            raise DivioException("Backup restore failed.")
+        backups.wait_for_backup_restore(obj.client, response["uuid"])
 
 
 @application_push.command(name="media")
@@ -1686,6 +2001,195 @@ def doctor(obj, machine_readable, checks):
     sys.exit(exitcode)
 
 
+@cli.command(name="deploy-many")
+@click.argument("targets", nargs=-1)
+@click.option(
+    "-f",
+    "--apps-file",
+    type=click.File(),
+    help="File listing an application (UUID, remote id or slug) and "
+    "optionally an environment per line, '-' to read from stdin.",
+)
+@click.option(
+    "--build-mode",
+    type=click.Choice(["AUTO", "ADOPT", "FORCE"], case_sensitive=False),
+    default="AUTO",
+)
+@click.option(
+    "-c",
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=settings.DEPLOY_CONCURRENCY,
+    show_default=True,
+    help="Maximum number of deployments running at once.",
+)
+@click.pass_obj
+def deploy_many(obj, targets, apps_file, build_mode, concurrency):
+    """
+    Deploy many applications at once.
+
+    TARGETS are given as APPLICATION[:ENVIRONMENT], the environment
+    defaults to test. Running deployments are attached to.
+    """
+    from . import deploy
+
+    lines = [target.replace(":", " ", 1) for target in targets]
+    if apps_file:
+        lines += list(apps_file)
+    targets = deploy.parse_targets(lines)
+    if not targets:
+        raise click.UsageError("Give targets or an apps file.")
+
+    targets = deploy.DeploymentScheduler(
+        obj.client,
+        targets,
+        build_mode=build_mode,
+        concurrency=concurrency,
+        on_progress=deploy.ProgressTable(),
+    ).run()
+    if any(target.failed for target in targets):
+        raise DivioException(deploy.get_summary(targets))
+    click.secho(f"{len(targets)} deployments succeeded.", fg="green")
+
+
+@cli.group(cls=ClickAliasedGroup)
+def agent():
+    """
+    Local agent keeping connections and caches warm between commands.
+
+    While it runs, list and get commands without global options are run by
+    the agent, which saves starting the CLI and connecting to the control
+    panel for every call. Set DIVIO_NO_AGENT to run a command locally.
+    """
+
+
+@agent.command(name="start")
+@click.option(
+    "--idle-timeout",
+    type=click.IntRange(min=1),
+    default=settings.AGENT_IDLE_TIMEOUT,
+    help="Seconds without commands after which the agent shuts down.",
+)
+def agent_start(idle_timeout):
+    """Start the agent in the background."""
+    import subprocess
+
+    from . import agent as divio_agent
+
+    if not divio_agent.is_supported():
+        raise DivioException("The agent is not supported on this platform.")
+    if divio_agent.send({"ping": True}):
+        raise DivioWarning("The agent is already running.")
+
+    subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "divio_cli.agent",
+            "--idle-timeout",
+            str(idle_timeout),
+        ],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+    try:
+        status = polling.poll(
+            lambda: divio_agent.send({"ping": True}),
+            until=bool,
+            interval=0.05,
+            max_interval=0.5,
+            timeout=settings.AGENT_START_TIMEOUT,
+        )
+    except polling.PollTimeout:
+        raise DivioException(
+            "The agent did not start, run 'python -m divio_cli.agent' to see "
+            "why."
+        )
+    click.secho(f"Agent started (pid {status['pid']}).", fg="green")
+
+
+@agent.command(name="stop")
+def agent_stop():
+    """Stop the agent."""
+    from . import agent as divio_agent
+
+    if not divio_agent.send({"stop": True}):
+        raise DivioWarning("The agent is not running.")
+    click.secho("Agent stopped.", fg="green")
+
+
+@agent.command(name="status")
+def agent_status():
+    """Tell whether the agent is running."""
+    from . import agent as divio_agent
+
+    status = divio_agent.send({"ping": True})
+    if not status:
+        raise DivioWarning("The agent is not running.")
+    started_at = time.strftime(
+        "%Y-%m-%d %H:%M:%S", time.localtime(status["started_at"])
+    )
+    click.echo(f"Agent running (pid {status['pid']}) since {started_at}.")
+
+
+@cli.group(cls=ClickAliasedGroup)
+def cache():
+    """Local copy of your applications and their metadata."""
+
+
+@cache.command(name="sync")
+@click.option(
+    "-a",
+    "--application",
+    "applications",
+    multiple=True,
+    help=(
+        "The UUID or slug of an application to refresh. Can be given "
+        "multiple times, all applications are refreshed by default."
+    ),
+)
+@click.option(
+    "--deployments/--no-deployments",
+    default=True,
+    help="Choose whether to refresh the deployments of the applications.",
+)
+@click.pass_obj
+def cache_sync(obj, applications, deployments):
+    """
+    Refresh the local metadata store.
+
+    Applications, organisations, regions, environments, service instances
+    and deployments are stored locally, so that list commands given
+    --cached answer without asking the control panel. Only deployments
+    that are new or were still running are fetched again.
+    """
+    start = time.monotonic()
+    stats = obj.client.sync_metadata_store(
+        application_uuids=applications, deployments=deployments
+    )
+    click.secho(
+        "Synced {applications} applications, {environments} environments, "
+        "{service_instances} service instances and {deployments} new "
+        "deployments in {seconds:.1f}s.".format(
+            seconds=time.monotonic() - start, **stats
+        ),
+        fg="green",
+    )
+
+
+@cache.command(name="clear")
+@click.pass_obj
+def cache_clear(obj):
+    """Delete the local metadata store."""
+    store = obj.client.get_store()
+    if store:
+        store.clear()
+    click.secho("Metadata store cleared.", fg="green")
+
+
 @cli.group(cls=ClickAliasedGroup)
 def organisations():
     """Your organisations."""
@@ -1706,11 +2210,14 @@ def organisations():
     type=int,
     help="The maximum number of results that can be retrieved.",
 )
+@cached_option
 @click.pass_obj
-def list_organisations(obj, as_json, limit_results):
+def list_organisations(obj, as_json, limit_results, cached):
     "List your organisations"
 
-    results, messages = obj.client.get_organisations(limit_results)
+    results, messages = obj.client.get_organisations(
+        limit_results, cached=cached
+    )
 
     if not results:
         click.secho("No organisations found.", fg="yellow")
@@ -1763,11 +2270,15 @@ def regions():
     type=int,
     help="The maximum number of results that can be retrieved.",
 )
+@cached_option
+@max_staleness_option
 @click.pass_obj
-def list_regions(obj, as_json, limit_results):
+def list_regions(obj, as_json, limit_results, cached, max_staleness):
     """List all available regions"""
 
-    results, messages = obj.client.get_regions(limit_results)
+    results, messages = obj.client.get_regions(
+        limit_results, cached=cached, max_staleness=max_staleness
+    )
 
     if not results:
         click.secho("No regions found.", fg="yellow")
@@ -1,13 +1,11 @@
 import json
 import logging
-import os
 import pprint
 import textwrap
 from urllib.parse import urljoin
 
-from requests import Session
-
-from divio_cli.config import WritableNetRC
+from divio_cli.api_requests import SingleHostSession
+from divio_cli.config import get_netrc
 from divio_cli.exceptions import DivioException
 from divio_cli.settings import ACCESS_TOKEN_URL_PATH
 
@@ -24,6 +22,18 @@ http_response_body_logger = logging.getLogger(
     "divio.client.http.response-body",
 )
 
+# User information returned by the API for a token. Shared by all clients of
+# a command, so that each token is only checked once.
+_user_info_cache = {}
+
+
+def get_cached_user_info(token):
+    return _user_info_cache.get(token)
+
+
+def cache_user_info(token, user_info):
+    _user_info_cache[token] = dict(user_info)
+
 
 class ApiError(DivioException):
     def __init__(self, *args, status_code=None, **kwargs):
@@ -33,11 +43,17 @@ class ApiError(DivioException):
 
 
 class Client:
-    def __init__(self, token="", zone=DEFAULT_ZONE):
+    def __init__(self, token="", zone=DEFAULT_ZONE, session=None, netrc=None):
+        """
+        `session` and `netrc` can be passed to share the connection pool and
+        the parsed credentials with another client, e.g. the `CloudClient`.
+        """
+
         self.zone = zone
 
         self.token = ""
-        self.session = None
+        self.session = session
+        self.netrc = netrc
         self.headers = {}
         self.user_info = {}
 
@@ -115,31 +131,36 @@ class Client:
 
     # session management
     def get_session(self):
-        session = Session()
-
-        session.proxies = {
-            "http": os.environ.get("HTTP_PROXY", ""),
-            "https": os.environ.get("HTTPS_PROXY", ""),
-        }
+        return SingleHostSession(
+            f"https://{self.get_api_host()}",
+            trust_env=False,
+        )
 
-        session.trust_env = False
+    def get_netrc(self):
+        if self.netrc is None:
+            self.netrc = get_netrc()
 
-        return session
+        return self.netrc
 
     def retrieve_user_info(self):
-        logger.debug("retrieving user information")
-
         self.user_info.clear()
 
-        response = self.request(
-            method="GET",
-            path=GET_CURRENT_USER_URL_PATH,
-        )
+        user_info = get_cached_user_info(self.token)
+
+        if user_info is None:
+            logger.debug("retrieving user information")
 
-        if response.status_code == 200:
-            self.user_info.update(**response.json())
+            response = self.request(
+                method="GET",
+                path=GET_CURRENT_USER_URL_PATH,
+            )
 
-        return response.status_code == 200
+            user_info = response.json()
+            cache_user_info(self.token, user_info)
+
+        self.user_info.update(**user_info)
+
+        return True
 
     def authenticate(self, token="__netrc__"):
         logger.debug("trying to authenticate")
@@ -149,17 +170,16 @@ class Client:
         # TODO: remove after the cloud-client was removed
         host = self.get_control_panel_host()
 
-        # reset session
         self.headers.clear()
-        self.session = self.get_session()
+
+        if self.session is None:
+            self.session = self.get_session()
 
         # set auth token
         self.token = token
 
         if self.token == "__netrc__":
-            logger.debug("reading %s", WritableNetRC.get_netrc_path())
-
-            netrc = WritableNetRC()
+            netrc = self.get_netrc()
 
             if host not in netrc.hosts:
                 raise DivioException(
@@ -5,28 +5,35 @@ import logging
 import os
 import re
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from itertools import groupby
 from operator import itemgetter
-from time import sleep
 from urllib.parse import urlparse
 
 import click
-import requests
-from dateutil.parser import isoparse
 
 from divio_cli.exceptions import (
     ApplicationUUIDNotFoundException,
     ConfigurationNotFound,
     DivioException,
     DivioWarning,
-    EnvironmentDoesNotExist,
 )
 
-from . import api_requests, messages, settings
-from .config import Config, WritableNetRC
+from . import api_requests, messages, polling, retry, settings, transport
+from .background import run_in_background
+from .client import cache_user_info, get_cached_user_info
+from .config import Config, get_netrc
+from .environments import EnvironmentResolver
+from .http_cache import get_identity
 from .localdev.utils import get_application_home, get_project_settings
-from .utils import json_response_request_paginate
+from .logs import LogArchive, LogRenderer, get_archive_path
+from .utils import (
+    iter_json_response_request_paginate,
+    json_response_request_paginate,
+)
 
 
 ENDPOINT = "https://control.{zone}"
@@ -61,35 +68,28 @@ def get_endpoint(zone=None):
     return endpoint
 
 
-def get_service_color(service):
-    color_mapping = {
-        "web": "blue",
-        "cronjob": "bright_cyan",
-        "shell": "bright_red",
-        "worker": "bright_blue",
-    }
-    try:
-        return color_mapping[service]
-    except KeyError:
-        return "yellow"
-
-
 class CloudClient:
     def __init__(self, endpoint, debug=False, sudo=False):
         self.debug = debug
         self.sudo = sudo
         self.config = Config()
         self.endpoint = endpoint
-        self.netrc = WritableNetRC()
+        self.netrc = get_netrc()
         self.session = self.init_session()
+        self._environment_resolver = None
+        self._environment_resolver_lock = threading.Lock()
+        self._stores = {}
+        # (stored at, background task) of the listings that were answered
+        # from the metadata store and are being refreshed
+        self.revalidations = []
 
     # Helpers
     def get_auth_header(self):
         host = urlparse(self.endpoint).hostname
-        data = self.netrc.hosts.get(host)
+        token = self.netrc.get_token(host)
         headers = {}
-        if data:
-            headers["Authorization"] = f"Token {data[2]}"
+        if token:
+            headers["Authorization"] = f"Token {token}"
         if self.sudo:
             headers["X-Sudo"] = "make me a sandwich"
         return headers
@@ -106,20 +106,121 @@ class CloudClient:
             headers=self.get_auth_header(),
             trust_env=False,
             debug=self.debug,
+            cache=self.config.get_http_cache(),
+            pool_size=self.config.get_http_pool_size(),
+            netrc=self.netrc,
         )
 
+    def reset(self):
+        """
+        Forget what is bound to the command the client was used for, so that
+        the agent can reuse it for the next one.
+        """
+        self.config = Config()
+        self._environment_resolver = None
+        self.revalidations = []
+
+    def get_environment_resolver(self):
+        with self._environment_resolver_lock:
+            if self._environment_resolver is None:
+                application_home = get_application_home(silent=True)
+                self._environment_resolver = EnvironmentResolver(
+                    self.session,
+                    directory=application_home
+                    and os.path.join(
+                        application_home, settings.DIVIO_DUMP_FOLDER
+                    ),
+                    store=self.get_store(),
+                )
+            return self._environment_resolver
+
+    def get_store(self):
+        """
+        Return the metadata store of the authenticated user, or `None` if it
+        is disabled.
+        """
+        identity = get_identity(self.session.headers)
+        if identity not in self._stores:
+            self._stores[identity] = self.config.get_metadata_store(
+                self.endpoint, identity
+            )
+        return self._stores[identity]
+
+    def get_listing(
+        self,
+        name,
+        fetch,
+        limit_results=None,
+        cached=False,
+        max_staleness=0,
+        **scope,
+    ):
+        """
+        Return the records and messages of a listing.
+
+        The records are read from the metadata store if `cached` and the
+        listing was stored before, or if it was stored at most
+        `max_staleness` seconds ago. In the latter case the listing is
+        refreshed in the background for the next call. Otherwise the records
+        are fetched and stored on the way.
+        """
+        store = self.get_store()
+        if store and (cached or max_staleness):
+            stored_at = store.get_synced_at(name, **scope)
+            if stored_at is not None and (
+                cached or time.time() - stored_at <= max_staleness
+            ):
+                records = store.get(name, **scope)
+                if not cached:
+                    task = run_in_background(
+                        self.store_listing, name, fetch, limit_results, **scope
+                    )
+                    self.revalidations.append((stored_at, task))
+                notes = []
+                if limit_results and len(records) > limit_results:
+                    notes.append(
+                        messages.RESULTS_LIMITED.format(
+                            count=len(records), limit=limit_results
+                        )
+                    )
+                return records[:limit_results], notes
+
+        return self.store_listing(name, fetch, limit_results, **scope)
+
+    def store_listing(self, name, fetch, limit_results=None, **scope):
+        results, messages = fetch()
+        store = self.get_store()
+        if store and (limit_results is None or len(results) < limit_results):
+            store.save(name, results, **scope)
+        return results, messages
+
     def authenticate(self, token):
         self.session.headers["Authorization"] = f"Token {token}"
 
-    def login(self, token):
-        request = api_requests.GetCurrentUserRequest(
-            self.session,
-            headers={
-                "Authorization": f"Token {token}",
-            },
-        )
+    def get_current_user(self, token=None):
+        """
+        Return the user authenticated by `token`, or by the session if no
+        token is given. Users are cached per token for the whole command.
+        """
+        headers = {}
+        if token:
+            headers["Authorization"] = f"Token {token}"
+        else:
+            auth_header = self.session.headers.get("Authorization", "")
+            token = auth_header[len("Token ") :]
 
-        user_data = request()
+        user_data = get_cached_user_info(token) if token else None
+        if user_data is None:
+            request = api_requests.GetCurrentUserRequest(
+                self.session, headers=headers
+            )
+            user_data = request()
+            if token:
+                cache_user_info(token, user_data)
+        return user_data
+
+    def login(self, token):
+        user_data = self.get_current_user(token)
 
         self.authenticate(token)
 
@@ -170,8 +271,7 @@ class CloudClient:
         return 0
 
     def check_login_status(self):
-        request = api_requests.GetCurrentUserRequest(self.session)
-        response = request()
+        response = self.get_current_user()
 
         user_id = response.get("uuid")
 
@@ -184,34 +284,92 @@ class CloudClient:
         request = api_requests.ProjectListRequest(self.session)
         return request()
 
-    def get_applications(self):
-        results, messages = json_response_request_paginate(
-            api_requests.ApplicationsListRequest,
-            self.session,
-            limit_results=None,
+    def get_applications(self, cached=False, max_staleness=0):
+        return self.get_listing(
+            "applications",
+            lambda: json_response_request_paginate(
+                api_requests.ApplicationsListRequest,
+                self.session,
+                limit_results=None,
+            ),
+            cached=cached,
+            max_staleness=max_staleness,
         )
 
-        return results, messages
+    def get_applications_with_organisations(
+        self, cached=False, max_staleness=0
+    ):
+        """
+        Return all applications along with a mapping of organisation UUIDs to
+        organisations. Both listings are fetched concurrently, so the number
+        of requests depends on the number of pages, not applications.
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            applications_future = executor.submit(
+                self.get_applications,
+                cached=cached,
+                max_staleness=max_staleness,
+            )
+            organisations_future = executor.submit(
+                self.get_organisations,
+                cached=cached,
+                max_staleness=max_staleness,
+            )
+            applications, _ = applications_future.result()
+            organisations, _ = organisations_future.result()
 
-    def get_organisations(self, limit_results=None):
-        results, messages = json_response_request_paginate(
-            api_requests.ListOrganisationsRequest,
-            self.session,
+        organisations_by_uuid = {
+            organisation["uuid"]: organisation
+            for organisation in organisations
+        }
+
+        # Applications can belong to organisations the user is not a member
+        # of, these are not part of the listing.
+        for application in applications:
+            organisation_uuid = application["organisation"]
+            if organisation_uuid not in organisations_by_uuid:
+                organisations_by_uuid[organisation_uuid] = (
+                    self.get_organisation(organisation_uuid)
+                )
+
+        return applications, organisations_by_uuid
+
+    def get_organisations(
+        self, limit_results=None, cached=False, max_staleness=0
+    ):
+        return self.get_listing(
+            "organisations",
+            lambda: json_response_request_paginate(
+                api_requests.ListOrganisationsRequest,
+                self.session,
+                limit_results=limit_results,
+            ),
             limit_results=limit_results,
+            cached=cached,
+            max_staleness=max_staleness,
         )
 
-        return results, messages
+    def get_regions(
+        self, limit_results=None, params=None, cached=False, max_staleness=0
+    ):
+        def fetch():
+            return json_response_request_paginate(
+                api_requests.ListRegionsRequest,
+                self.session,
+                params=params,
+                limit_results=limit_results,
+            )
 
-    def get_regions(self, limit_results=None, params=None):
-        if params is None:
-            params = {}
-        results, messages = json_response_request_paginate(
-            api_requests.ListRegionsRequest,
-            self.session,
-            params=params,
+        if params:
+            # filtered listings are not stored
+            return fetch()
+        return self.get_listing(
+            "regions",
+            fetch,
             limit_results=limit_results,
+            cached=cached,
+            max_staleness=max_staleness,
         )
-        return results, messages
 
     def get_application_plan_groups(self, params=None):
         if params is None:
@@ -283,7 +441,11 @@ class CloudClient:
         return request()
 
     def get_services(
-        self, region_uuid=None, application_uuid=None, limit_results=None
+        self,
+        region_uuid=None,
+        application_uuid=None,
+        limit_results=None,
+        max_staleness=0,
     ):
         kwargs = {}
 
@@ -296,22 +458,49 @@ class CloudClient:
             f"website={application_uuid}" if application_uuid else ""
         )
 
-        results, messages = json_response_request_paginate(
-            api_requests.ListServicesRequest,
-            self.session,
-            url_kwargs=kwargs,
+        def fetch():
+            return json_response_request_paginate(
+                api_requests.ListServicesRequest,
+                self.session,
+                url_kwargs=kwargs,
+                limit_results=limit_results,
+            )
+
+        if application_uuid:
+            # services available to an application are not stored
+            return fetch()
+        scope = {"region": region_uuid} if region_uuid else {}
+        return self.get_listing(
+            "services",
+            fetch,
             limit_results=limit_results,
+            max_staleness=max_staleness,
+            **scope,
         )
-        return results, messages
 
-    def get_service_instances(self, environment_uuid, limit_results=None):
-        results, messages = json_response_request_paginate(
+    def get_service_instances(
+        self, environment_uuid, limit_results=None, cached=False
+    ):
+        return self.get_listing(
+            "service_instances",
+            lambda: json_response_request_paginate(
+                api_requests.ListServiceInstancesRequest,
+                self.session,
+                url_kwargs={"environment_uuid": environment_uuid},
+                limit_results=limit_results,
+            ),
+            limit_results=limit_results,
+            cached=cached,
+            environment=environment_uuid,
+        )
+
+    def iter_service_instances(self, environment_uuid, limit_results=None):
+        return iter_json_response_request_paginate(
             api_requests.ListServiceInstancesRequest,
             self.session,
             url_kwargs={"environment_uuid": environment_uuid},
             limit_results=limit_results,
         )
-        return results, messages
 
     def add_service_instances(
         self, environment_uuid, prefix, region_uuid, service_uuid
@@ -328,29 +517,32 @@ class CloudClient:
         return request()
 
     def ssh(self, application_uuid, environment):
-        self.get_project(application_uuid)
-        try:
-            env = self.get_environment_by_application(
-                application_uuid, environment
-            )
-
-        except KeyError:
-            raise EnvironmentDoesNotExist(environment)
+        resolver = self.get_environment_resolver()
+        env = resolver.get_environment(
+            application_uuid, environment, deployed=True
+        )
 
-        if env["last_finished_deployment"]:
+        if env["deployed"]:
             try:
-                response = api_requests.EnvironmentRequest(
-                    self.session,
-                    url_kwargs={"environment_uuid": env["uuid"]},
-                )()
+                ssh_endpoint = env["ssh_endpoint"]
+                if not ssh_endpoint:
+                    with resolver.invalidate_on_not_found(application_uuid):
+                        response = api_requests.EnvironmentRequest(
+                            self.session,
+                            url_kwargs={"environment_uuid": env["uuid"]},
+                        )()
+                    ssh_endpoint = {
+                        key: response["ssh_endpoint"][key]
+                        for key in ("user", "host", "port")
+                    }
+                    resolver.set_ssh_endpoint(
+                        application_uuid, env["uuid"], ssh_endpoint
+                    )
                 ssh_command = [
                     "ssh",
                     "-p",
-                    str(response["ssh_endpoint"]["port"]),
-                    "{}@{}".format(
-                        response["ssh_endpoint"]["user"],
-                        response["ssh_endpoint"]["host"],
-                    ),
+                    str(ssh_endpoint["port"]),
+                    "{}@{}".format(ssh_endpoint["user"], ssh_endpoint["host"]),
                 ]
                 click.secho(" ".join(ssh_command), fg="green")
                 os.execvp("ssh", ssh_command)
@@ -375,18 +567,15 @@ class CloudClient:
         return response["results"][0]
 
     def get_environment(self, application_uuid, environment):
-        try:
-            env = self.get_environment_by_application(
-                application_uuid, environment
-            )
-        except KeyError:
-            raise EnvironmentDoesNotExist(environment)
+        resolver = self.get_environment_resolver()
+        env = resolver.get_environment(application_uuid, environment)
 
         try:
-            return api_requests.EnvironmentRequest(
-                self.session,
-                url_kwargs={"environment_uuid": env["uuid"]},
-            )()
+            with resolver.invalidate_on_not_found(application_uuid):
+                return api_requests.EnvironmentRequest(
+                    self.session,
+                    url_kwargs={"environment_uuid": env["uuid"]},
+                )()
 
         except (KeyError, json.decoder.JSONDecodeError):
             raise DivioException("Error establishing connection.")
@@ -401,46 +590,78 @@ class CloudClient:
         except (KeyError, json.decoder.JSONDecodeError):
             raise DivioException("Error establishing connection.")
 
-    def show_log(self, application_uuid, environment, tail=False, utc=True):
-        def print_log_data(data):
-            for entry in data:
-                dt = isoparse(entry["timestamp"])
-                if not utc:
-                    dt = dt.astimezone()
-                click.secho(
-                    "{} \u2502 {:^16} \u2502 {}".format(
-                        str(dt),
-                        click.style(
-                            entry["service"],
-                            fg=get_service_color(entry["service"]),
-                        ),
-                        entry["message"]
-                        .replace("\r", "")
-                        .replace("\x1b[6n", "")
-                        .replace("\x1b[J", "")
-                        .replace("\x1b[H", ""),
-                    )
-                )
+    def get_log_archive(self, application_uuid, environment):
+        env = self.get_environment_resolver().get_environment(
+            application_uuid, environment
+        )
+        return LogArchive(
+            get_archive_path(settings.DIVIO_LOGS_DIR, env["uuid"])
+        )
 
-        try:
-            env = self.get_environment_by_application(
-                application_uuid, environment
-            )
-        except KeyError:
-            raise EnvironmentDoesNotExist(environment)
+    def show_log(
+        self,
+        application_uuid,
+        environment,
+        tail=False,
+        utc=True,
+        archive=False,
+    ):
+        """
+        Print the latest page of logs, and the following ones with `tail`.
+        With `archive`, the pages are stored in the log archive of the
+        environment, starting after the last one stored: every page since
+        then is printed, up to the latest one.
+        """
+        renderer = LogRenderer(utc=utc)
+        resolver = self.get_environment_resolver()
+        env = resolver.get_environment(
+            application_uuid, environment, deployed=True
+        )
+        log_archive = None
 
-        if env["last_finished_deployment"]:
-            try:
-                # Make the initial log request
-                response = api_requests.LogRequest(
-                    self.session,
-                    url_kwargs={"environment_uuid": env["uuid"]},
-                )()
+        def print_log_data(response):
+            renderer.render(response["results"])
+            if log_archive is not None:
+                log_archive.append(response["results"], response.get("next"))
 
-                print_log_data(response["results"])
+        if env["deployed"]:
+            if archive:
+                log_archive = self.get_log_archive(
+                    application_uuid, environment
+                )
+            try:
+                response = None
+                cursor = log_archive and log_archive.get_cursor()
+                if cursor:
+                    resumed = self.session.request(url=cursor, method="GET")
+                    if resumed.ok:
+                        response = resumed.json()
+                    else:
+                        logger.debug("cannot resume the log archive")
+                if response is None:
+                    # Make the initial log request
+                    with resolver.invalidate_on_not_found(application_uuid):
+                        response = api_requests.LogRequest(
+                            self.session,
+                            url_kwargs={"environment_uuid": env["uuid"]},
+                        )()
+
+                print_log_data(response)
+                # catch up with the pages logged since the archive stopped
+                while (
+                    archive
+                    and not tail
+                    and response["results"]
+                    and response.get("next")
+                ):
+                    response = self.session.request(
+                        url=response["next"], method="GET"
+                    ).json()
+                    print_log_data(response)
 
                 if tail:
-                    # Now continue to poll
+                    # Now continue to poll, less often while the log is quiet
+                    poller = polling.Poller(interval=1, max_interval=5)
                     try:
                         while True:
                             # In this case, we can not construct the urls anymore and we have to rely on the previous response we got
@@ -448,9 +669,11 @@ class CloudClient:
                                 url=response["next"], method="GET"
                             ).json()
 
-                            print_log_data(response["results"])
-                            if not response["results"]:
-                                sleep(1)
+                            print_log_data(response)
+                            if response["results"]:
+                                poller.reset()
+                            else:
+                                poller.wait()
                     except (KeyboardInterrupt, SystemExit):
                         raise DivioException("Exiting...", fg=None)
             except (
@@ -459,6 +682,9 @@ class CloudClient:
                 api_requests.APIRequestError,
             ):
                 raise DivioException("Error retrieving logs.")
+            finally:
+                if log_archive is not None:
+                    log_archive.close()
 
         else:
             raise DivioException(
@@ -511,22 +737,10 @@ class CloudClient:
                 )
             return data
 
-        try:
-            env = self.get_environment_by_application(
-                application_uuid, environment
-            )
-        except KeyError:
-            raise EnvironmentDoesNotExist(environment)
-
-        try:
-            response = self.get_deployment_by_application(
-                application_uuid, env["uuid"]
-            )
-            response = self.get_deployment_by_uuid(response["uuid"])
-        except IndexError:
-            response = None
-
-        if response and response["ended_at"] is None:
+        response, attached = self.start_deployment(
+            application_uuid, environment, build_mode
+        )
+        if attached:
             click.secho(
                 f"Already deploying {environment} environment, attaching to running "
                 "deployment",
@@ -534,9 +748,6 @@ class CloudClient:
             )
         else:
             click.secho(f"Deploying {environment} environment", fg="green")
-            deployment = self.deploy_project(env["uuid"], build_mode)
-            sleep(1)
-            response = self.get_deployment_by_uuid(deployment["uuid"])
         try:
             with click.progressbar(
                 length=100,
@@ -544,16 +755,24 @@ class CloudClient:
                 show_eta=False,
                 item_show_func=fmt_progress,
             ) as bar:
-                progress_percent = 0
-                while response["ended_at"] is None:
-                    progress_percent = response["percent"]
-                    response = self.get_deployment_by_uuid(response["uuid"])
-                    bar.current_item = response["status"]
-                    bar.update(progress_percent - bar.pos)
-                    sleep(3)
+
+                def update_progress(deployment):
+                    bar.current_item = deployment["status"]
+                    bar.update(deployment["percent"] - bar.pos)
+
+                deployment_uuid = response["uuid"]
+                response = polling.poll(
+                    lambda: self.get_deployment_by_uuid(deployment_uuid),
+                    until=lambda deployment: deployment["ended_at"],
+                    on_progress=update_progress,
+                    interval=1,
+                    max_interval=5,
+                    timeout=settings.DEPLOY_TIMEOUT,
+                    message="The deployment did not finish",
+                )
                 if not response["success"]:
                     bar.current_item = "error"
-                    bar.update(progress_percent)
+                    bar.render_progress()
 
                     raise DivioException(
                         "\nDeployment failed. Please run "
@@ -567,6 +786,32 @@ class CloudClient:
         except KeyboardInterrupt:
             click.secho("Disconnected")
 
+    def start_deployment(self, application_uuid, environment, build_mode):
+        """
+        Deploy the environment, unless a deployment of it is running. Return
+        the deployment and whether it was already running.
+        """
+        env = self.get_environment_resolver().get_environment(
+            application_uuid, environment
+        )
+
+        try:
+            response = self.get_deployment_by_application(
+                application_uuid, env["uuid"]
+            )
+            response = self.get_deployment_by_uuid(response["uuid"])
+        except IndexError:
+            response = None
+
+        attached = bool(response and response["ended_at"] is None)
+        if not attached:
+            response = self.deploy_project(env["uuid"], build_mode)
+        # the stored listing may date from before the deployment started
+        store = self.get_store()
+        if store is not None:
+            store.delete("deployments", application=application_uuid)
+        return response, attached
+
     def get_deployment_by_application(
         self, application_uuid, environment_uuid
     ):
@@ -764,24 +1009,14 @@ class CloudClient:
         )
         return request()
 
-    def get_deployments(
-        self,
-        application_uuid,
-        environment,
-        all_environments,
-        limit_results,
+    def get_deployments_params(
+        self, application_uuid, environment, all_environments
     ):
-        environment_response = api_requests.EnvironmentsListRequest(
-            self.session,
-            params={
-                "application": application_uuid,
-            },
-        )()["results"]
-
-        # Map environments uuids with their corresponding slugs.
-        envs_uuid_slug_mapping = {
-            env["uuid"]: env["slug"] for env in environment_response
-        }
+        """
+        Return the environment uuid to slug mapping of the application and
+        the query parameters to list its deployments.
+        """
+        resolver = self.get_environment_resolver()
 
         # Limit results to application deployments by default
         # and allow to filter by environment.
@@ -789,34 +1024,40 @@ class CloudClient:
 
         # Retrieve environment data if environment is provided.
         if not all_environments:
-            env_found = False
-            for retrieved_env in environment_response:
-                if retrieved_env["slug"] == environment:
-                    params.update({"environment": retrieved_env["uuid"]})
-                    env_found = True
-                    break
-
-            if not env_found:
-                click.secho(
-                    f"Environment with the name {environment!r} does not exist.",
-                    fg="red",
-                    err=True,
-                )
-            try:
-                env = self.get_environment_by_application(
-                    application_uuid, environment
-                )
+            env = resolver.get_environment(application_uuid, environment)
+            params.update({"environment": env["uuid"]})
 
-                params.update({"environment": env["uuid"]})
-            except KeyError:
-                raise EnvironmentDoesNotExist(environment)
+        # Map environments uuids with their corresponding slugs.
+        envs_uuid_slug_mapping = resolver.get_slug_mapping(application_uuid)
+
+        return envs_uuid_slug_mapping, params
+
+    def get_deployments(
+        self,
+        application_uuid,
+        environment,
+        all_environments,
+        limit_results,
+        cached=False,
+        max_staleness=0,
+    ):
+        envs_uuid_slug_mapping, params = self.get_deployments_params(
+            application_uuid, environment, all_environments
+        )
 
         try:
-            results, messages = json_response_request_paginate(
-                api_requests.DeploymentsRequest,
-                self.session,
-                params=params,
+            results, messages = self.get_listing(
+                "deployments",
+                lambda: json_response_request_paginate(
+                    api_requests.DeploymentsRequest,
+                    self.session,
+                    params=params,
+                    limit_results=limit_results,
+                ),
                 limit_results=limit_results,
+                cached=cached,
+                max_staleness=max_staleness,
+                **params,
             )
 
             if results:
@@ -825,7 +1066,10 @@ class CloudClient:
                 # Group deployments by environment
                 results_grouped_by_environment = [
                     {
-                        "environment": envs_uuid_slug_mapping[key],
+                        "environment": envs_uuid_slug_mapping.get(key)
+                        or self.get_environment_resolver().get_slug(
+                            application_uuid, key
+                        ),
                         "environment_uuid": key,
                         "deployments": list(value),
                     }
@@ -845,23 +1089,183 @@ class CloudClient:
 
         return results_grouped_by_environment, messages
 
+    def sync_deployments(self, application_uuid):
+        """
+        Store the deployments of an application, only fetching the pages
+        with deployments that are new or were still running when they were
+        last stored. Return the number of fetched deployments.
+        """
+        store = self.get_store()
+        stored = store.get("deployments", application=application_uuid) or []
+        finished = {
+            deployment["uuid"]
+            for deployment in stored
+            if deployment.get("ended_at")
+        }
+
+        # deployments are listed from the most recent one, and finished
+        # deployments never change again
+        fetched = []
+        for deployment in iter_json_response_request_paginate(
+            api_requests.DeploymentsRequest,
+            self.session,
+            params={"application": application_uuid},
+            limit_results=None,
+        ):
+            if deployment["uuid"] in finished:
+                break
+            fetched.append(deployment)
+
+        fetched_uuids = {deployment["uuid"] for deployment in fetched}
+        store.replace(
+            "deployments",
+            fetched
+            + [
+                deployment
+                for deployment in stored
+                if deployment["uuid"] not in fetched_uuids
+            ],
+            application=application_uuid,
+        )
+        return len(fetched)
+
+    def sync_application(
+        self, application_uuid, deployments=True, resolver=None
+    ):
+        """
+        Store the environments, service instances and deployments of an
+        application. Return the number of records of each kind fetched.
+        `resolver` fetches the environments, the one of the client by
+        default.
+        """
+        store = self.get_store()
+        previous_environments = (
+            store.get("environments", application=application_uuid) or []
+        )
+        resolver = resolver or self.get_environment_resolver()
+        environments = resolver.get_environments(
+            application_uuid, refresh=True
+        )
+
+        environment_uuids = {
+            environment["uuid"] for environment in environments
+        }
+        for environment in previous_environments:
+            if environment["uuid"] not in environment_uuids:
+                store.delete(
+                    "service_instances", environment=environment["uuid"]
+                )
+
+        stats = {"environments": len(environments), "service_instances": 0}
+        for environment_uuid in environment_uuids:
+            service_instances, _ = self.get_service_instances(environment_uuid)
+            stats["service_instances"] += len(service_instances)
+
+        stats["deployments"] = (
+            self.sync_deployments(application_uuid) if deployments else 0
+        )
+        return stats
+
+    def sync_metadata_store(self, application_uuids=None, deployments=True):
+        """
+        Refresh the metadata store of the user, for all their applications or
+        only the given ones. Return the number of records of each kind
+        fetched.
+        """
+        store = self.get_store()
+        if store is None:
+            raise DivioException(
+                "The metadata store is disabled in the global configuration."
+            )
+
+        previous_applications = store.get("applications") or []
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            regions_future = executor.submit(self.get_regions)
+            applications, _ = self.get_applications_with_organisations()
+            regions_future.result()
+
+        # drop what is stored about applications that are gone
+        application_uuids_by_slug = {
+            application["slug"]: application["uuid"]
+            for application in applications
+        }
+        for application in previous_applications:
+            if application["uuid"] in application_uuids_by_slug.values():
+                continue
+            for environment in (
+                store.get("environments", application=application["uuid"])
+                or []
+            ):
+                store.delete(
+                    "service_instances", environment=environment["uuid"]
+                )
+            store.delete("environments", application=application["uuid"])
+            store.delete("deployments", application=application["uuid"])
+
+        if application_uuids:
+            # applications can be given by slug as well
+            application_uuids = [
+                application_uuids_by_slug.get(uuid, uuid)
+                for uuid in application_uuids
+            ]
+        else:
+            application_uuids = list(application_uuids_by_slug.values())
+
+        stats = {
+            "applications": len(applications),
+            "environments": 0,
+            "service_instances": 0,
+            "deployments": 0,
+        }
+        # shared by the threads and kept in memory, the environments of all
+        # applications do not belong to the cache of the current project
+        resolver = EnvironmentResolver(self.session, store=store)
+        with ThreadPoolExecutor(
+            max_workers=settings.SYNC_MAX_WORKERS
+        ) as executor:
+            for application_stats in executor.map(
+                lambda uuid: self.sync_application(
+                    uuid, deployments=deployments, resolver=resolver
+                ),
+                application_uuids,
+            ):
+                for name, count in application_stats.items():
+                    stats[name] += count
+        return stats
+
+    def iter_deployments(self, application_uuid, environment, limit_results):
+        """
+        Lazily retrieve the deployments of a single environment.
+
+        Return the environment uuid and the deployments, which are fetched
+        page by page while they are being consumed.
+        """
+        _, params = self.get_deployments_params(
+            application_uuid, environment, all_environments=False
+        )
+
+        try:
+            deployments = iter_json_response_request_paginate(
+                api_requests.DeploymentsRequest,
+                self.session,
+                params=params,
+                limit_results=limit_results,
+            )
+        except json.decoder.JSONDecodeError:
+            raise DivioException("Error in fetching deployments.")
+
+        if not deployments.count:
+            raise DivioWarning(
+                f"No deployments found for {environment!r} environment."
+            )
+
+        return params["environment"], deployments
+
     def get_deployment(
         self,
         application_uuid,
         deployment_uuid,
     ):
-        environment_response = api_requests.EnvironmentsListRequest(
-            self.session,
-            params={
-                "application": application_uuid,
-            },
-        )()["results"]
-
-        # Map environments uuids with their corresponding slugs.
-        envs_uuid_slug_mapping = {
-            env["uuid"]: env["slug"] for env in environment_response
-        }
-
         try:
             deployment = api_requests.DeploymentRequest(
                 self.session,
@@ -872,7 +1276,9 @@ class CloudClient:
             # E.g. The user asks for a deployment by providing a uuid
             # which belongs to a deployment of an environment on a
             # completely different application. Will trigger a KeyError.
-            environment_slug = envs_uuid_slug_mapping[environment_uuid]
+            environment_slug = self.get_environment_resolver().get_slug(
+                application_uuid, environment_uuid
+            )
             deployment.pop("environment")
         except (json.decoder.JSONDecodeError, KeyError):
             raise DivioException("Error in fetching deployment.")
@@ -889,18 +1295,6 @@ class CloudClient:
         deployment_uuid,
         variable_name,
     ):
-        environment_response = api_requests.EnvironmentsListRequest(
-            self.session,
-            params={
-                "application": application_uuid,
-            },
-        )()["results"]
-
-        # Map environments uuids with their corresponding slugs.
-        envs_uuid_slug_mapping = {
-            env["uuid"]: env["slug"] for env in environment_response
-        }
-
         try:
             deployment = api_requests.DeploymentEnvironmentVariablesRequest(
                 self.session,
@@ -911,7 +1305,9 @@ class CloudClient:
             # E.g. The user asks for a deployment by providing a uuid
             # which belongs to a deployment of an environment on a
             # completely different application. Will trigger a KeyError.
-            environment_slug = envs_uuid_slug_mapping[environment_uuid]
+            environment_slug = self.get_environment_resolver().get_slug(
+                application_uuid, environment_uuid
+            )
             deployment.pop("environment")
 
             value = deployment["environment_variables"].get(variable_name)
@@ -928,25 +1324,18 @@ class CloudClient:
             "deployment": deployment,
         }
 
-    def get_environment_variables(
+    def get_environment_variables_params(
         self,
         application_uuid,
         environment,
         all_environments,
-        limit_results,
         variable_name=None,
     ):
-        environment_response = api_requests.EnvironmentsListRequest(
-            self.session,
-            params={
-                "application": application_uuid,
-            },
-        )()["results"]
-
-        # Map environments uuids with their corresponding slugs.
-        envs_uuid_slug_mapping = {
-            env["uuid"]: env["slug"] for env in environment_response
-        }
+        """
+        Return the environment uuid to slug mapping of the application and
+        the query parameters to list its environment variables.
+        """
+        resolver = self.get_environment_resolver()
 
         # The environment variables V3 endpoint requires either
         # an application or an environment or both to be present
@@ -954,19 +1343,30 @@ class CloudClient:
         if all_environments:
             params = {"application": application_uuid}
         else:
-            params = {}
-            env_found = False
-            for retrieved_env in environment_response:
-                if retrieved_env["slug"] == environment:
-                    params.update({"environment": retrieved_env["uuid"]})
-                    env_found = True
-                    break
-            if not env_found:
-                raise EnvironmentDoesNotExist(environment)
+            env = resolver.get_environment(application_uuid, environment)
+            params = {"environment": env["uuid"]}
 
         if variable_name:
             params.update({"name": variable_name})
 
+        # Map environments uuids with their corresponding slugs.
+        envs_uuid_slug_mapping = resolver.get_slug_mapping(application_uuid)
+
+        return envs_uuid_slug_mapping, params
+
+    def get_environment_variables(
+        self,
+        application_uuid,
+        environment,
+        all_environments,
+        limit_results,
+        variable_name=None,
+    ):
+        envs_uuid_slug_mapping, params = self.get_environment_variables_params(
+            application_uuid, environment, all_environments, variable_name
+        )
+
+        # never stored, as the values are secrets
         results, messages = json_response_request_paginate(
             api_requests.GetEnvironmentVariablesRequest,
             self.session,
@@ -980,7 +1380,10 @@ class CloudClient:
             # Group environment variables by environment
             results_grouped_by_environment = [
                 {
-                    "environment": envs_uuid_slug_mapping[key],
+                    "environment": envs_uuid_slug_mapping.get(key)
+                    or self.get_environment_resolver().get_slug(
+                        application_uuid, key
+                    ),
                     "environment_uuid": key,
                     "environment_variables": list(value),
                 }
@@ -1003,6 +1406,33 @@ class CloudClient:
 
         return results_grouped_by_environment, messages
 
+    def iter_environment_variables(
+        self, application_uuid, environment, limit_results
+    ):
+        """
+        Lazily retrieve the environment variables of a single environment.
+
+        Return the environment uuid and the environment variables, which are
+        fetched page by page while they are being consumed.
+        """
+        _, params = self.get_environment_variables_params(
+            application_uuid, environment, all_environments=False
+        )
+
+        environment_variables = iter_json_response_request_paginate(
+            api_requests.GetEnvironmentVariablesRequest,
+            self.session,
+            params=params,
+            limit_results=limit_results,
+        )
+
+        if not environment_variables.count:
+            raise DivioWarning(
+                f"No environment variables found for {environment!r} environment."
+            )
+
+        return params["environment"], environment_variables
+
     def create_repository(
         self,
         organisation,
@@ -1224,7 +1654,11 @@ class CloudClient:
         )()
 
     def finish_backup_upload(self, finish_url):
-        return requests.post(url=finish_url)
+        return retry.default_policy.call(
+            lambda: transport.get_session().post(url=finish_url),
+            "POST",
+            finish_url,
+        )
 
     def create_backup_restore(
         self, backup_uuid: str, si_backup_uuid: str, notes: str | None = None
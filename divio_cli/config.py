@@ -1,6 +1,10 @@
+import contextlib
 import errno
 import json
 import os
+import stat
+import tempfile
+import threading
 import time
 from netrc import netrc
 
@@ -9,6 +13,7 @@ from packaging import version
 from divio_cli.exceptions import DivioException
 
 from . import __version__, settings, utils
+from .http_cache import HTTPCache
 
 
 def get_global_config_path():
@@ -48,7 +53,7 @@ class Config:
                 if exc.errno != errno.EEXIST:
                     raise
 
-        with open(self.config_path, "w+") as fh:
+        with utils.atomic_open(self.config_path) as fh:
             json.dump(self.config, fh)
 
     def check_for_updates(self, force=False):
@@ -110,6 +115,81 @@ class Config:
     def get_sentry_dsn(self):
         return self.config.get("sentry-dsn", settings.DEFAULT_SENTRY_DSN)
 
+    def get_http_pool_size(self):
+        return self.config.get(
+            "http-pool-size", settings.DEFAULT_HTTP_POOL_SIZE
+        )
+
+    def get_download_connections(self):
+        connections = self.config.get(
+            "download-connections", settings.DEFAULT_DOWNLOAD_CONNECTIONS
+        )
+        try:
+            connections = int(connections)
+        except (TypeError, ValueError):
+            # invalid config
+            return settings.DEFAULT_DOWNLOAD_CONNECTIONS
+        return max(connections, 1)
+
+    def get_http_cache(self):
+        if self.config.get("disable_http_cache", False):
+            return None
+        return HTTPCache(
+            directory=self.config.get(
+                "http-cache-dir", settings.DIVIO_CACHE_DIR
+            ),
+            max_size=self.config.get(
+                "http-cache-max-size", settings.DEFAULT_CACHE_MAX_SIZE
+            ),
+        )
+
+    def get_max_staleness(self):
+        return self.config.get("max-staleness", settings.DEFAULT_MAX_STALENESS)
+
+    def get_metadata_store(self, endpoint, identity):
+        if self.config.get("disable_metadata_store", False):
+            return None
+
+        from .store import MetadataStore, get_store_path
+
+        directory = self.config.get(
+            "metadata-store-dir", settings.DIVIO_METADATA_DIR
+        )
+        return MetadataStore(get_store_path(directory, endpoint, identity))
+
+
+# Parsed netrc files by path, along with the modification time and size the
+# file had when it was parsed.
+_netrc_cache = {}
+_netrc_lock = threading.Lock()
+
+
+def _get_file_signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_netrc():
+    """
+    Return the parsed netrc file. The file is only parsed once per process,
+    and again when it was changed on disk since.
+    """
+    path = WritableNetRC.get_netrc_path()
+
+    with _netrc_lock:
+        cached = _netrc_cache.get(path)
+        if cached:
+            signature, parsed_netrc = cached
+            try:
+                if _get_file_signature(path) == signature:
+                    return parsed_netrc
+            except OSError:
+                pass
+
+        parsed_netrc = WritableNetRC()
+        parsed_netrc.remember()
+        return parsed_netrc
+
 
 class WritableNetRC(netrc):
     def __init__(self, *args, **kwargs):
@@ -142,6 +222,21 @@ class WritableNetRC(netrc):
         home = os.path.expanduser("~")
         return os.path.join(home, ".netrc")
 
+    def remember(self, path=None):
+        """Make `get_netrc` return this instance while `path` is unchanged."""
+        if path is None:
+            path = self.get_netrc_path()
+        try:
+            _netrc_cache[path] = (_get_file_signature(path), self)
+        except OSError:
+            _netrc_cache.pop(path, None)
+
+    def get_token(self, host):
+        data = self.hosts.get(host)
+        if data:
+            return data[2]
+        return None
+
     def add(self, host, login, account, password):
         self.hosts[host] = (login, account, password)
 
@@ -164,5 +259,27 @@ class WritableNetRC(netrc):
             if password:
                 out.append(f"\tpassword {password}")
 
-        with open(path, "w") as f:
-            f.write(os.linesep.join(out))
+        # write to a temporary file first, so that a crash or a concurrent
+        # `divio` process never sees a partially written netrc. A symlinked
+        # netrc is replaced where it points to, keeping the link and the
+        # mode of the file.
+        target = os.path.realpath(path)
+        try:
+            mode = stat.S_IMODE(os.stat(target).st_mode)
+        except FileNotFoundError:
+            mode = 0o600
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(target), prefix=".netrc."
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(os.linesep.join(out))
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, target)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+
+        with _netrc_lock:
+            self.remember(path)
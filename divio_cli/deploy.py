@@ -0,0 +1,256 @@
+"""
+Deploy the environments of many applications at once, see `divio
+deploy-many`.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import attr
+import click
+
+from . import polling, settings
+from .exceptions import DivioException
+from .utils import table
+
+
+logger = logging.getLogger("divio.deploy")
+
+UUID_RE = re.compile(
+    r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.I
+)
+
+
+@attr.s(auto_attribs=True)
+class Target:
+    """An environment to deploy and the state of its deployment."""
+
+    application: str
+    environment: str
+    application_uuid: str | None = None
+    deployment: dict | None = None
+    attached: bool = False
+    error: str | None = None
+    # when the deployment was started, its deadline counts from there
+    started_at: float | None = None
+
+    @property
+    def name(self):
+        return f"{self.application} {self.environment}"
+
+    @property
+    def finished(self):
+        return self.error is not None or bool(
+            self.deployment and self.deployment.get("ended_at")
+        )
+
+    @property
+    def failed(self):
+        return self.error is not None or (
+            self.finished and not self.deployment.get("success")
+        )
+
+    @property
+    def status(self):
+        if self.error is not None:
+            return "error"
+        if self.deployment is None:
+            return "waiting"
+        if self.finished:
+            return "failed" if self.failed else "done"
+        return self.deployment.get("status") or "starting"
+
+    @property
+    def percent(self):
+        if self.deployment is None:
+            return 0
+        if self.finished and not self.failed:
+            return 100
+        return self.deployment.get("percent") or 0
+
+
+def parse_targets(lines, default_environment="test"):
+    """
+    Parse lines of `<application> [<environment>]`, where the application is
+    given by UUID, remote id or slug. Blank lines and comments starting with
+    `#` are ignored, and so are targets listed twice.
+    """
+    targets = {}
+    for line in lines:
+        fields = line.split("#", 1)[0].split()
+        if not fields:
+            continue
+        if len(fields) > 2:
+            raise DivioException(
+                f"Invalid line '{line.strip()}', expected "
+                "'<application> [<environment>]'."
+            )
+        application, environment = (fields + [default_environment])[:2]
+        targets.setdefault(
+            (application, environment), Target(application, environment)
+        )
+    return list(targets.values())
+
+
+class DeploymentScheduler:
+    """
+    Deploys targets with at most `concurrency` deployments running at once.
+
+    A single loop polls every running deployment, starting with short
+    intervals that grow as the deployments take longer. Targets sharing a
+    deployment are refreshed by a single request, and the requests of a
+    round are sent concurrently over the pooled connections of the client.
+    `on_progress` is called with all targets after each round.
+
+    An error affecting a target, e.g. an unknown environment, fails that
+    target only. Each deployment fails once it runs for longer than
+    `timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        client,
+        targets,
+        build_mode="AUTO",
+        concurrency=settings.DEPLOY_CONCURRENCY,
+        on_progress=None,
+        timeout=settings.DEPLOY_TIMEOUT,
+    ):
+        self.client = client
+        self.targets = targets
+        self.build_mode = build_mode
+        self.concurrency = concurrency
+        self.on_progress = on_progress
+        self.timeout = timeout
+        self.application_uuids = {}
+
+    def get_application_uuid(self, application):
+        if application not in self.application_uuids:
+            if application.isdigit() or UUID_RE.match(application):
+                uuid = self.client.get_application_uuid(application)
+            else:
+                uuid = self.client.get_application_uuid_for_slug(application)
+            self.application_uuids[application] = uuid
+        return self.application_uuids[application]
+
+    def start(self, target):
+        target.started_at = time.monotonic()
+        try:
+            target.application_uuid = self.get_application_uuid(
+                target.application
+            )
+            target.deployment, target.attached = self.client.start_deployment(
+                target.application_uuid, target.environment, self.build_mode
+            )
+        except DivioException as exc:
+            target.error = exc.format_message()
+        except Exception as exc:
+            # e.g. a connection error, the other targets go on
+            logger.debug("could not start %s", target.name, exc_info=True)
+            target.error = str(exc) or type(exc).__name__
+
+    def refresh(self, executor, targets):
+        def fetch(deployment_uuid):
+            try:
+                return self.client.get_deployment_by_uuid(deployment_uuid)
+            except Exception as exc:
+                # keep the last known state, the next round tries again
+                logger.debug("could not refresh %s: %s", deployment_uuid, exc)
+                return None
+
+        uuids = list({target.deployment["uuid"] for target in targets})
+        deployments = dict(zip(uuids, executor.map(fetch, uuids)))
+        for target in targets:
+            deployment = deployments[target.deployment["uuid"]]
+            if deployment is not None:
+                target.deployment = deployment
+
+    def report(self):
+        if self.on_progress is not None:
+            self.on_progress(self.targets)
+
+    def run(self):
+        """Deploy all targets and return them once they are finished."""
+        pending = list(self.targets)
+        running = []
+        poller = polling.Poller(interval=1, max_interval=5)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                if running:
+                    self.refresh(executor, running)
+                    now = time.monotonic()
+                    for target in running:
+                        if (
+                            not target.finished
+                            and now - target.started_at >= self.timeout
+                        ):
+                            target.error = "timed out"
+                    running = [t for t in running if not t.finished]
+
+                started = pending[: self.concurrency - len(running)]
+                pending = pending[len(started) :]
+                list(executor.map(self.start, started))
+                running += [t for t in started if not t.finished]
+
+                self.report()
+                if not running and not pending:
+                    return self.targets
+                poller.wait()
+
+
+class ProgressTable:
+    """
+    Prints the progress of the targets. In a terminal the table is redrawn
+    in place, otherwise a line is printed whenever a target changes.
+    """
+
+    def __init__(self, interactive=None):
+        if interactive is None:
+            interactive = sys.stdout.isatty()
+        self.interactive = interactive
+        self.height = 0
+        self.statuses = {}
+
+    def __call__(self, targets):
+        if self.interactive:
+            self.draw(targets)
+        else:
+            self.log(targets)
+
+    def draw(self, targets):
+        output = table(
+            [
+                (t.application, t.environment, t.status, f"{t.percent}%")
+                for t in targets
+            ],
+            headers=("Application", "Environment", "Status", "Progress"),
+        )
+        if self.height:
+            # move to the first line of the previous table and clear it
+            click.echo(f"\x1b[{self.height}F\x1b[J", nl=False)
+        click.echo(output)
+        self.height = output.count("\n") + 1
+
+    def log(self, targets):
+        for target in targets:
+            status = (target.status, target.percent)
+            if self.statuses.get(target.name) != status:
+                self.statuses[target.name] = status
+                click.echo(f"{target.name}: {target.status} ({status[1]}%)")
+
+
+def get_summary(targets):
+    failed = [target for target in targets if target.failed]
+    lines = [f"{len(failed)} of {len(targets)} deployments failed:"]
+    for target in failed:
+        reason = target.error or (
+            f"run 'divio app deploy-log {target.environment} "
+            f"--remote-id {target.application_uuid}' for details"
+        )
+        lines.append(f"  {target.name}: {reason}")
+    return "\n".join(lines)
@@ -0,0 +1,839 @@
+"""
+Downloads of large files, e.g. backups of databases and media files.
+
+Responses are copied with `readinto` into a reusable buffer, which doubles
+every time it is filled, up to 8 MiB, and files are never flushed before
+they are complete: copying is bound by the network rather than by Python
+calls and system calls per chunk.
+
+The bytes are hashed as they arrive, checked against the length and MD5
+announced by the storage, and their SHA-256 is recorded next to the file.
+"""
+
+from __future__ import annotations
+
+import base64
+import contextlib
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+import attr
+import click
+
+from . import retry, transport
+from .exceptions import DivioException
+from .utils import create_temp_dir, pretty_size
+
+
+logger = logging.getLogger("divio.download")
+
+MIN_BUFFER_SIZE = 64 * 1024
+MAX_BUFFER_SIZE = 8 * 1024 * 1024
+# Smallest and largest ranges downloaded on their own connection, by default.
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+MAX_SEGMENT_SIZE = 32 * 1024 * 1024
+# Ranges downloaded ahead of the first one not received yet, by connection.
+SEGMENT_WINDOW = 2
+# Seconds between the records of the ranges received, to resume downloads.
+CHECKPOINT_INTERVAL = 1
+# Bytes read ahead of streamed downloads, to tell their format.
+HEAD_SIZE = 512
+
+
+@attr.s(auto_attribs=True)
+class DownloadStats:
+    path: str
+    size: int
+    seconds: float
+    connections: int = 1
+    # bytes received by a previous download
+    resumed: int = 0
+    sha256: str | None = None
+
+    @property
+    def throughput(self):
+        """Bytes per second."""
+        if self.seconds <= 0:
+            return 0
+        return (self.size - self.resumed) / self.seconds
+
+    def __str__(self):
+        text = "{} at {}/s".format(
+            pretty_size(self.size), pretty_size(self.throughput) or "0 bytes"
+        )
+        if self.connections > 1:
+            text += f" over {self.connections} connections"
+        if self.resumed:
+            text += f", resumed after {pretty_size(self.resumed)}"
+        return text
+
+
+class DownloadCorrupted(DivioException):
+    pass
+
+
+class DownloadCancelled(DivioException):
+    def __init__(self, message="Download cancelled."):
+        super().__init__(message, fg="yellow")
+
+
+class Digest:
+    """The SHA-256 of a download and, when there is one to check, its MD5."""
+
+    def __init__(self, md5=False):
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.md5 = hashlib.md5() if md5 else None
+
+    def update(self, data):
+        self.size += len(data)
+        self.sha256.update(data)
+        if self.md5 is not None:
+            self.md5.update(data)
+
+
+class OrderedDigest(Digest):
+    """
+    The digest of a file written in any order. Bytes written right after
+    those hashed are hashed on the way, the others are read back from the
+    file once those before them are there. As ranges are downloaded in
+    order, these were written shortly before and are read from the page
+    cache while the download goes on.
+    """
+
+    def __init__(self, path, md5=False):
+        super().__init__(md5=md5)
+        self.path = path
+        self.file = None
+        # `lock` guards the hashes, `read_lock` the file: writers hashing
+        # their bytes do not wait for the file to be read
+        self.lock = threading.Lock()
+        self.read_lock = threading.Lock()
+
+    def update_at(self, data, offset):
+        with self.lock:
+            if offset == self.size:
+                self.update(data)
+
+    def catch_up(self, end):
+        """Hash the bytes up to `end`, which must all be written."""
+        with self.read_lock:
+            while True:
+                with self.lock:
+                    start = self.size
+                if start >= end:
+                    return
+                if self.file is None:
+                    self.file = open(self.path, "rb")
+                self.file.seek(start)
+                data = self.file.read(min(MAX_BUFFER_SIZE, end - start))
+                if not data:
+                    raise DownloadCorrupted(f"{self.path} is incomplete.")
+                with self.lock:
+                    # bytes written meanwhile may have been hashed on the way
+                    if self.size < start + len(data):
+                        self.update(data[self.size - start :])
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def get_expected_md5(response):
+    """
+    Return the MD5 of the body of `response` announced by the storage in
+    `Content-MD5` or `x-goog-hash`, if any.
+    """
+    headers = response.headers
+    if headers.get("Content-Encoding"):
+        # it would be the one of the encoded body
+        return None
+    value = headers.get("Content-MD5")
+    for part in headers.get("x-goog-hash", "").split(","):
+        name, _, digest = part.strip().partition("=")
+        if name == "md5":
+            value = digest
+    if value:
+        try:
+            return base64.b64decode(value).hex()
+        except ValueError:
+            return None
+    return None
+
+
+def get_etag_md5(response):
+    """
+    Return the MD5 of the body of `response` given by its ETag, if it comes
+    from S3. The ETag of an S3 object uploaded in one part is its MD5,
+    unless the object is encrypted with KMS or a key of the customer; the
+    ETags of other servers are opaque.
+    """
+    headers = response.headers
+    if headers.get("Content-Encoding"):
+        return None
+    if not (
+        headers.get("x-amz-request-id") or headers.get("Server") == "AmazonS3"
+    ):
+        return None
+    if headers.get("x-amz-server-side-encryption", "").startswith(
+        "aws:kms"
+    ) or headers.get("x-amz-server-side-encryption-customer-algorithm"):
+        return None
+    etag = get_etag(response)
+    if etag and re.match(r'^"[0-9a-f]{32}"$', etag):
+        return etag[1:-1]
+    return None
+
+
+def needs_md5(response):
+    return bool(get_expected_md5(response) or get_etag_md5(response))
+
+
+def verify_response(response, digest):
+    """Check the digest of the body of `response` against its headers."""
+    length = get_content_length(response)
+    if (
+        length is not None
+        and not response.headers.get("Content-Encoding")
+        and digest.size != length
+    ):
+        raise DownloadCorrupted(
+            f"The download is incomplete: {digest.size} of {length} bytes "
+            "were received."
+        )
+    if digest.md5 is None:
+        return
+    expected = get_expected_md5(response)
+    if expected and digest.md5.hexdigest() != expected:
+        raise DownloadCorrupted(
+            "The download is corrupted: its MD5 differs from the one of the "
+            "storage."
+        )
+    etag_md5 = get_etag_md5(response)
+    if not expected and etag_md5 and digest.md5.hexdigest() != etag_md5:
+        # ETags are not always MD5s, even on S3
+        click.secho(
+            "The MD5 of the download differs from the ETag of the storage. "
+            "The ETag may not be an MD5, the download is kept.",
+            fg="yellow",
+            err=True,
+        )
+
+
+def get_digest_path(path):
+    return f"{path}.sha256"
+
+
+def record_digest(path, sha256):
+    """Record the SHA-256 of `path` next to it, as `sha256sum` does."""
+    with open(get_digest_path(path), "w") as f:
+        f.write(f"{sha256}  {os.path.basename(path)}\n")
+
+
+def verify_file(path):
+    """
+    Check a downloaded file against the SHA-256 recorded for it. Return
+    whether one was recorded.
+    """
+    try:
+        with open(get_digest_path(path)) as f:
+            expected = f.read().split()[0]
+    except (OSError, IndexError):
+        return False
+    digest = Digest()
+    buffer = bytearray(MAX_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb") as file:
+        while True:
+            read = file.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+    if digest.sha256.hexdigest() != expected:
+        raise DownloadCorrupted(
+            f"{path} is corrupted: its SHA-256 differs from the one recorded "
+            "when it was downloaded."
+        )
+    return True
+
+
+def move(path, directory):
+    """Move a downloaded file and its recorded digest to `directory`."""
+    target = os.path.join(directory, os.path.basename(path))
+    shutil.move(path, target)
+    if os.path.exists(get_digest_path(path)):
+        shutil.move(get_digest_path(path), get_digest_path(target))
+    return target
+
+
+def remove(path):
+    """Remove a downloaded file and its recorded digest."""
+    os.remove(path)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(get_digest_path(path))
+
+
+def preallocate(fd, size):
+    """
+    Reserve `size` bytes for the file, which avoids fragmenting it and
+    fails early when the disk is too small.
+    """
+    if not size or not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError as exc:
+        # e.g. on file systems without support for it
+        logger.debug("could not preallocate %s bytes: %s", size, exc)
+
+
+def get_content_length(response):
+    try:
+        return int(response.headers["Content-Length"])
+    except (KeyError, ValueError):
+        return None
+
+
+def iter_chunks(response, limit=None, cancel=None):
+    """
+    Yield the body of a streamed response, or its first `limit` bytes, in
+    chunks that are only valid until the next one is read.
+
+    The buffer starts small, so that small bodies do not allocate much, and
+    doubles every time a read fills it. As `readinto` waits until the buffer
+    is full or the body ends, large bodies are read by `MAX_BUFFER_SIZE`
+    after a few reads, however fast the network is.
+    """
+    raw = response.raw
+    if response.headers.get("Content-Encoding"):
+        # decoded chunks do not fit a fixed buffer
+        yield from raw.stream(MAX_BUFFER_SIZE, decode_content=True)
+        return
+
+    buffer = bytearray(MIN_BUFFER_SIZE)
+    view = memoryview(buffer)
+    remaining = limit
+    while remaining is None or remaining > 0:
+        if cancel is not None and cancel.is_set():
+            return
+        size = (
+            len(buffer) if remaining is None else min(len(buffer), remaining)
+        )
+        read = raw.readinto(view[:size])
+        if not read:
+            return
+        yield view[:read]
+        if remaining is not None:
+            remaining -= read
+        if read == len(buffer) and len(buffer) < MAX_BUFFER_SIZE:
+            buffer = bytearray(len(buffer) * 2)
+            view = memoryview(buffer)
+
+
+def copy_response(response, file, on_progress=None, digest=None, cancel=None):
+    """
+    Write the body of a streamed response to `file` and return its size.
+    `on_progress` is called with the number of bytes written so far.
+    `DownloadCancelled` is raised once the `cancel` event is set.
+    """
+    written = 0
+    for chunk in iter_chunks(response, cancel=cancel):
+        file.write(chunk)
+        if digest is not None:
+            digest.update(chunk)
+        written += len(chunk)
+        if on_progress is not None:
+            on_progress(written)
+    if cancel is not None and cancel.is_set():
+        raise DownloadCancelled
+    return written
+
+
+def save_response(response, path, on_progress=None, cancel=None):
+    """
+    Write the body of a streamed response to `path`, which is removed if
+    the body does not match the length or MD5 announced, or if the
+    download is cancelled.
+    """
+    start = time.monotonic()
+    digest = Digest(md5=needs_md5(response))
+    try:
+        with open(path, "wb") as file:
+            preallocate(file.fileno(), get_content_length(response))
+            size = copy_response(response, file, on_progress, digest, cancel)
+            # drop what was preallocated for a longer body
+            file.truncate(size)
+        verify_response(response, digest)
+    except (DownloadCorrupted, DownloadCancelled):
+        os.remove(path)
+        raise
+    stats = DownloadStats(
+        path,
+        size,
+        time.monotonic() - start,
+        sha256=digest.sha256.hexdigest(),
+    )
+    logger.debug("downloaded %s: %s", path, stats)
+    return stats
+
+
+class RangesNotSupported(Exception):
+    pass
+
+
+def supports_ranges(response):
+    return (
+        response.headers.get("Accept-Ranges") == "bytes"
+        and not response.headers.get("Content-Encoding")
+        and bool(get_content_length(response))
+    )
+
+
+def get_etag(response):
+    etag = response.headers.get("ETag")
+    # weak validators may not be used to resume
+    if etag and not etag.startswith("W/"):
+        return etag
+    return None
+
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        elif start < end:
+            merged.append((start, end))
+    return merged
+
+
+def get_segments(size, connections, segment_size=None, received=()):
+    """
+    Split the `size` bytes not `received` yet in ranges, as `(start, end)`
+    with `end` excluded.
+    """
+    missing, position = [], 0
+    for start, end in merge_ranges(received):
+        if start > position:
+            missing.append((position, start))
+        position = max(position, end)
+    if position < size:
+        missing.append((position, size))
+
+    if not segment_size:
+        total = sum(end - start for start, end in missing)
+        segment_size = max(
+            min(-(-total // connections), MAX_SEGMENT_SIZE), MIN_SEGMENT_SIZE
+        )
+    return [
+        (offset, min(offset + segment_size, end))
+        for start, end in missing
+        for offset in range(start, end, segment_size)
+    ]
+
+
+class PartialDownload:
+    """
+    A download to `path`, written to `path.part` until it is complete. The
+    ranges received so far are recorded next to it with the URL, the ETag
+    and the size of the file, so that downloading it again resumes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.part_path = f"{path}.part"
+        self.state_path = f"{path}.part.json"
+
+    def get_received(self, url, etag, size):
+        """Return the ranges received of this version of the file."""
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return []
+        if not os.path.exists(self.part_path) or state.get("size") != size:
+            return []
+        # download URLs expire, the ETag identifies the file
+        if (etag or state.get("etag")) and etag != state.get("etag"):
+            return []
+        if not etag and url != state.get("url"):
+            return []
+        return [tuple(r) for r in state.get("received", [])]
+
+    def save(self, url, etag, size, received):
+        state = {
+            "url": url,
+            "etag": etag,
+            "size": size,
+            "received": merge_ranges(received),
+        }
+        path = f"{self.state_path}.tmp"
+        with open(path, "w") as f:
+            json.dump(state, f)
+        os.replace(path, self.state_path)
+
+    def discard(self):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.state_path)
+
+    def complete(self):
+        os.replace(self.part_path, self.path)
+        self.discard()
+
+
+def has_partial_download(directory):
+    """Tell whether a download to `directory` recorded ranges to resume."""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return False
+    for name in names:
+        if not name.endswith(".part.json"):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                if json.load(f).get("received"):
+                    return True
+        except (OSError, ValueError, AttributeError):
+            continue
+    return False
+
+
+class SegmentQueue:
+    """
+    Hands out segments in order, up to `window` segments ahead of the first
+    one that is not done, so that the bytes written stay close together.
+    """
+
+    def __init__(self, segments, window):
+        self.segments = segments
+        self.window = window
+        self.next = 0
+        self.first_pending = 0
+        self.done_indexes = set()
+        self.condition = threading.Condition()
+
+    def get(self, stop):
+        """Return the next segment and its index, or `None` once stopped."""
+        with self.condition:
+            while (
+                self.next < len(self.segments)
+                and self.next >= self.first_pending + self.window
+                and not stop.is_set()
+            ):
+                self.condition.wait(CHECKPOINT_INTERVAL)
+            if self.next >= len(self.segments) or stop.is_set():
+                return None
+            self.next += 1
+            return self.next - 1, self.segments[self.next - 1]
+
+    def done(self, index):
+        with self.condition:
+            self.done_indexes.add(index)
+            while self.first_pending in self.done_indexes:
+                self.done_indexes.remove(self.first_pending)
+                self.first_pending += 1
+            self.condition.notify_all()
+
+
+class SegmentWriter:
+    """Writes data at given offsets of a file, from several threads."""
+
+    def __init__(self, path, size, received=(), on_progress=None, digest=None):
+        flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        if not received:
+            flags |= os.O_TRUNC
+        self.fd = os.open(path, flags, 0o666)
+        preallocate(self.fd, size)
+        self.received = list(received)
+        # the offset reached by each range, by its start
+        self.offsets = {}
+        self.written = sum(end - start for start, end in received)
+        self.on_progress = on_progress
+        self.digest = digest
+        self.lock = threading.Lock()
+
+    def write(self, data, offset):
+        if hasattr(os, "pwrite"):
+            while data:
+                written = os.pwrite(self.fd, data, offset)
+                data, offset = data[written:], offset + written
+        else:
+            with self.lock:
+                os.lseek(self.fd, offset, os.SEEK_SET)
+                os.write(self.fd, data)
+
+    def copy(self, response, start, end, cancel):
+        offset = start
+        for chunk in iter_chunks(response, limit=end - start, cancel=cancel):
+            self.write(chunk, offset)
+            if self.digest is not None:
+                self.digest.update_at(chunk, offset)
+            offset += len(chunk)
+            with self.lock:
+                self.offsets[start] = offset
+                self.written += len(chunk)
+                if self.on_progress is not None:
+                    self.on_progress(self.written)
+        if offset != end and not cancel.is_set():
+            raise DivioException(
+                f"The download ended after {offset} of {end} bytes."
+            )
+
+    def get_received(self):
+        with self.lock:
+            return merge_ranges(self.received + list(self.offsets.items()))
+
+    def get_written_end(self):
+        """Return where the bytes written from the start of the file end."""
+        received = self.get_received()
+        return received[0][1] if received and received[0][0] == 0 else 0
+
+    def close(self):
+        os.close(self.fd)
+
+
+def save_segments(
+    url,
+    response,
+    path,
+    connections,
+    segment_size=None,
+    on_progress=None,
+    cancel=None,
+):
+    """
+    Download the body of `response`, which must announce a length, by
+    ranges over up to `connections` connections, writing them to their
+    place in a preallocated file. The first range is read from `response`,
+    unless a previous download of the file is resumed. If the download
+    fails, the ranges received are recorded for the next one. Ranges are
+    downloaded in order and hashed as soon as those before them are done,
+    while the download goes on. Once the `cancel` event is set, the ranges
+    received are recorded and `DownloadCancelled` is raised.
+    """
+    start_time = time.monotonic()
+    size = get_content_length(response)
+    etag = get_etag(response)
+    partial = PartialDownload(path)
+    received = partial.get_received(url, etag, size)
+    if received:
+        logger.debug("resuming the download of %s", path)
+    segments = get_segments(size, connections, segment_size, received)
+    session = transport.get_session()
+    digest = OrderedDigest(partial.part_path, md5=needs_md5(response))
+    writer = SegmentWriter(
+        partial.part_path, size, received, on_progress, digest
+    )
+    # stops the other connections once one of them failed
+    stop = threading.Event()
+
+    def fetch(segment):
+        start, end = segment
+        headers = {"Range": f"bytes={start}-{end - 1}"}
+        if etag:
+            # the whole file is sent if it changed
+            headers["If-Range"] = etag
+        with retry.default_policy.call(
+            lambda: session.get(url, headers=headers, stream=True), "GET", url
+        ) as segment_response:
+            segment_response.raise_for_status()
+            if segment_response.status_code != 206:
+                raise RangesNotSupported
+            writer.copy(segment_response, start, end, stop)
+
+    queue = SegmentQueue(segments, SEGMENT_WINDOW * connections)
+
+    def work(item):
+        while item is not None:
+            index, segment = item
+            if index == 0 and not received:
+                writer.copy(response, *segment, cancel=stop)
+            else:
+                fetch(segment)
+            queue.done(index)
+            digest.catch_up(writer.get_written_end())
+            item = queue.get(stop)
+
+    complete = False
+    try:
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            futures = []
+            # the first worker reads the initial response
+            for _ in range(min(connections, len(segments))):
+                futures.append(executor.submit(work, queue.get(stop)))
+            try:
+                while futures:
+                    done, futures = wait(
+                        futures,
+                        timeout=CHECKPOINT_INTERVAL,
+                        return_when=FIRST_EXCEPTION,
+                    )
+                    for future in done:
+                        future.result()
+                    if cancel is not None and cancel.is_set():
+                        raise DownloadCancelled
+                    if futures:
+                        partial.save(url, etag, size, writer.get_received())
+            except BaseException:
+                stop.set()
+                raise
+        digest.catch_up(size)
+        complete = True
+    finally:
+        writer.close()
+        digest.close()
+        if not complete:
+            partial.save(url, etag, size, writer.get_received())
+    try:
+        verify_response(response, digest)
+    except DownloadCorrupted:
+        # resuming would keep the corrupted bytes
+        partial.discard()
+        os.remove(partial.part_path)
+        raise
+    partial.complete()
+
+    stats = DownloadStats(
+        path,
+        size,
+        time.monotonic() - start_time,
+        connections=max(1, min(connections, len(segments))),
+        resumed=sum(end - start for start, end in received),
+        sha256=digest.sha256.hexdigest(),
+    )
+    logger.debug("downloaded %s: %s", path, stats)
+    return stats
+
+
+def get_download_connections():
+    # import done here to prevent circular import
+    from .config import Config
+
+    return Config().get_download_connections()
+
+
+def download(
+    url,
+    directory=None,
+    filename=None,
+    on_progress=None,
+    connections=None,
+    segment_size=None,
+    cancel=None,
+):
+    """
+    Download `url` to a file in `directory` and return its stats. Servers
+    accepting ranges are downloaded over up to `connections` connections,
+    by ranges of `segment_size` bytes (the size split evenly by default),
+    and a download that failed is resumed by the next one of the file.
+    The SHA-256 of the file is recorded next to it. `DownloadCancelled` is
+    raised once the `cancel` event is set.
+    """
+    if connections is None:
+        connections = get_download_connections()
+    # connections beyond the pool would be opened and closed for each range
+    connections = min(connections, transport.get_pool_size())
+
+    def get():
+        return retry.default_policy.call(
+            lambda: transport.get_session().get(url, stream=True), "GET", url
+        )
+
+    def save(response, path):
+        partial = PartialDownload(path)
+        partial.discard()
+        stats = save_response(response, partial.part_path, on_progress, cancel)
+        partial.complete()
+        stats.path = path
+        return stats
+
+    with get() as response:
+        response.raise_for_status()
+
+        if not filename:
+            if response.headers.get("Content-Encoding") == "gzip":
+                filename = "data.tar.gz"
+            else:
+                filename = "data.dump"
+        path = os.path.join(directory or create_temp_dir(), filename)
+
+        stats = None
+        if not supports_ranges(response):
+            stats = save(response, path)
+        else:
+            try:
+                stats = save_segments(
+                    url,
+                    response,
+                    path,
+                    connections,
+                    segment_size,
+                    on_progress,
+                    cancel,
+                )
+            except RangesNotSupported:
+                logger.debug("%s ignores ranges or changed", url)
+
+    if stats is None:
+        # the first range of the response was consumed, start over
+        with get() as response:
+            response.raise_for_status()
+            stats = save(response, path)
+    record_digest(path, stats.sha256)
+    return stats
+
+
+class Stream:
+    """
+    The body of a download, consumed as it arrives instead of written to a
+    file. `head` holds its first bytes, which tell its format.
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self.chunks = iter_chunks(response)
+        head = bytearray()
+        for chunk in self.chunks:
+            head += chunk
+            if len(head) >= HEAD_SIZE:
+                break
+        self.head = bytes(head)
+
+    def copy(self, file, on_progress=None):
+        """
+        Write the body to `file`, e.g. the stdin of a process, checking it
+        like downloads to files. Return its stats.
+        """
+        start = time.monotonic()
+        digest = Digest(md5=needs_md5(self.response))
+        for chunk in itertools.chain([self.head], self.chunks):
+            file.write(chunk)
+            digest.update(chunk)
+            if on_progress is not None:
+                on_progress(digest.size)
+        verify_response(self.response, digest)
+        return DownloadStats(
+            None,
+            digest.size,
+            time.monotonic() - start,
+            sha256=digest.sha256.hexdigest(),
+        )
+
+
+@contextlib.contextmanager
+def stream(url):
+    """Open the download of `url` as a `Stream`."""
+    with retry.default_policy.call(
+        lambda: transport.get_session().get(url, stream=True), "GET", url
+    ) as response:
+        response.raise_for_status()
+        yield Stream(response)
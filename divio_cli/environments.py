@@ -0,0 +1,207 @@
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+
+from . import api_requests, settings
+from .exceptions import EnvironmentDoesNotExist
+from .utils import atomic_open
+
+
+logger = logging.getLogger("divio.environments")
+
+
+class EnvironmentResolver:
+    """
+    Resolves environment slugs of applications to their UUIDs and a few
+    other fields that rarely change.
+
+    Environments are cached for `ttl` seconds, in the `.divio` folder of the
+    current project if there is one and in memory otherwise. Only stable
+    fields are kept: anything that changes with deployments has to be
+    fetched from the API. Environments are also read from and written to the
+    metadata `store`, if given.
+    """
+
+    filename = "environments.json"
+
+    def __init__(self, session, directory=None, ttl=None, store=None):
+        self.session = session
+        self.store = store
+        self.path = (
+            os.path.join(directory, self.filename) if directory else None
+        )
+        self.ttl = settings.ENVIRONMENT_CACHE_TTL if ttl is None else ttl
+        self._data = None
+        self.lock = threading.RLock()
+        # applications whose environments were fetched by this process
+        self._fetched = set()
+
+    def load(self):
+        if self._data is None:
+            self._data = {}
+            if self.path:
+                try:
+                    with open(self.path) as fh:
+                        self._data = json.load(fh)
+                except (OSError, ValueError):
+                    pass
+        return self._data
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            with self.lock, atomic_open(self.path) as fh:
+                json.dump(self._data, fh, indent=4)
+        except OSError as exc:
+            logger.debug("could not write %s: %s", self.path, exc)
+
+    def get_stable_fields(self, environment, previous=None):
+        previous = previous or {}
+        return {
+            "uuid": environment["uuid"],
+            "slug": environment["slug"],
+            "branch": environment.get("branch"),
+            # environments never go back to not being deployed
+            "deployed": bool(
+                environment.get("last_finished_deployment")
+                or previous.get("deployed")
+            ),
+            "ssh_endpoint": previous.get("ssh_endpoint"),
+        }
+
+    def get_environments(self, application_uuid, refresh=False):
+        with self.lock:
+            entry = self.load().get(application_uuid)
+            expired = self.is_expired(entry)
+            if expired and not refresh and self.store:
+                entry = self.load_from_store(application_uuid) or entry
+                expired = self.is_expired(entry)
+            fetch = expired or (
+                refresh and application_uuid not in self._fetched
+            )
+
+        if fetch:
+            environments = api_requests.EnvironmentsListRequest(
+                self.session,
+                params={"application": application_uuid},
+            )()["results"]
+            with self.lock:
+                entry = self.store_environments(application_uuid, environments)
+                self._fetched.add(application_uuid)
+            if self.store:
+                self.store.save(
+                    "environments", environments, application=application_uuid
+                )
+
+        return entry["environments"]
+
+    def is_expired(self, entry):
+        return not entry or time.time() - entry["stored_at"] > self.ttl
+
+    def store_environments(
+        self, application_uuid, environments, stored_at=None
+    ):
+        data = self.load()
+        previous = {
+            environment["uuid"]: environment
+            for environment in data.get(application_uuid, {}).get(
+                "environments", []
+            )
+        }
+        entry = data[application_uuid] = {
+            "stored_at": stored_at or time.time(),
+            "environments": [
+                self.get_stable_fields(
+                    environment, previous.get(environment["uuid"])
+                )
+                for environment in environments
+            ],
+        }
+        self.save()
+        return entry
+
+    def load_from_store(self, application_uuid):
+        stored_at = self.store.get_synced_at(
+            "environments", application=application_uuid
+        )
+        if stored_at is None:
+            return None
+        return self.store_environments(
+            application_uuid,
+            self.store.get("environments", application=application_uuid),
+            stored_at=stored_at,
+        )
+
+    def get_environment(self, application_uuid, slug, deployed=False):
+        """
+        Return the environment with the given slug. The cache is refreshed
+        if the environment is unknown, or if it has to be `deployed` and was
+        not the last time it was fetched.
+        """
+        environment = None
+        for refresh in (False, True):
+            environment = next(
+                (
+                    environment
+                    for environment in self.get_environments(
+                        application_uuid, refresh=refresh
+                    )
+                    if environment["slug"] == slug
+                ),
+                None,
+            )
+            if environment and (environment["deployed"] or not deployed):
+                break
+
+        if not environment:
+            raise EnvironmentDoesNotExist(slug)
+        return environment
+
+    def get_slug_mapping(self, application_uuid, refresh=False):
+        return {
+            environment["uuid"]: environment["slug"]
+            for environment in self.get_environments(
+                application_uuid, refresh=refresh
+            )
+        }
+
+    def get_slug(self, application_uuid, environment_uuid):
+        """
+        Return the slug of the environment, refreshing the cache if the
+        environment was created after it was stored. Raise a `KeyError` if
+        the environment does not belong to the application.
+        """
+        slugs = self.get_slug_mapping(application_uuid)
+        if environment_uuid not in slugs:
+            slugs = self.get_slug_mapping(application_uuid, refresh=True)
+        return slugs[environment_uuid]
+
+    def set_ssh_endpoint(self, application_uuid, environment_uuid, endpoint):
+        for environment in self.get_environments(application_uuid):
+            if environment["uuid"] == environment_uuid:
+                environment["ssh_endpoint"] = endpoint
+                self.save()
+
+    def invalidate(self, application_uuid):
+        data = self.load()
+        if data.pop(application_uuid, None):
+            self.save()
+
+    @contextlib.contextmanager
+    def invalidate_on_not_found(self, application_uuid):
+        """
+        Drop the cached environments of the application if a request made
+        with them returns a 404, e.g. because an environment was deleted.
+        """
+        try:
+            yield
+        except api_requests.APIRequestError as exc:
+            if exc.status_code == requests.codes.not_found:
+                self.invalidate(application_uuid)
+            raise
@@ -2,8 +2,12 @@ import sys
 import traceback
 
 import click
+import sentry_sdk
 from sentry_sdk import capture_exception
 from sentry_sdk.integrations import Integration
+from sentry_sdk.integrations.atexit import AtexitIntegration
+
+from . import __version__
 
 
 def divio_shutdown(pending, timeout):
@@ -38,3 +42,25 @@ class DivioExcepthookIntegration(Integration):
     @staticmethod
     def setup_once():
         sys.excepthook = confirmation_excepthook
+
+
+def init_sentry(dsn):
+    sentry_sdk.init(
+        dsn,
+        traces_sample_rate=0,
+        release=__version__,
+        server_name="client",
+        integrations=[
+            DivioExcepthookIntegration(),
+            AtexitIntegration(callback=divio_shutdown),
+        ],
+    )
+
+
+def sentry_excepthook(dsn, *exc_info):
+    """
+    Initialize Sentry only once an unhandled exception occurred, as it is
+    slow to set up and not needed by commands that succeed.
+    """
+    init_sentry(dsn)
+    confirmation_excepthook(*exc_info)
@@ -0,0 +1,170 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+logger = logging.getLogger("divio.client.http.cache")
+
+# Response headers kept in the cache. Everything else is dropped.
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+class CacheEntry:
+    def __init__(self, key, data):
+        self.key = key
+        self.data = data
+
+    @property
+    def age(self):
+        return time.time() - self.data["stored_at"]
+
+    @property
+    def headers(self):
+        return CaseInsensitiveDict(self.data["headers"])
+
+    def get_conditional_headers(self):
+        """Headers to revalidate the entry with the server."""
+        headers = {}
+        if "ETag" in self.headers:
+            headers["If-None-Match"] = self.headers["ETag"]
+        if "Last-Modified" in self.headers:
+            headers["If-Modified-Since"] = self.headers["Last-Modified"]
+        return headers
+
+    def to_response(self):
+        response = requests.Response()
+        response.status_code = self.data["status_code"]
+        response.url = self.data["url"]
+        response.headers = self.headers
+        response.encoding = "utf-8"
+        response._content = self.data["content"].encode("utf-8")
+        return response
+
+
+class HTTPCache:
+    """
+    An on-disk cache for API responses.
+
+    Every response is stored in its own file, named after the hash of the
+    request method, URL (including query parameters) and the identity of the
+    user making the request. When the cache grows above `max_size` bytes, the
+    least recently used entries are evicted.
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+
+    def get_key(self, method, url, params=None, identity=None):
+        prepared_url = requests.Request(method, url, params=params).prepare()
+        key = "\n".join([method, prepared_url.url, identity or ""])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self.get_path(key)
+        try:
+            with open(path) as fh:
+                data = json.load(fh)
+        except OSError:
+            return None
+        except ValueError:
+            # corrupt entry, e.g. from an interrupted write
+            self.delete(key)
+            return None
+
+        # the modification time is used to find the least recently used
+        # entries when evicting
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return CacheEntry(key, data)
+
+    def set(self, key, response):
+        data = {
+            "stored_at": time.time(),
+            "url": response.url,
+            "status_code": response.status_code,
+            "headers": {
+                name: response.headers[name]
+                for name in CACHED_HEADERS
+                if name in response.headers
+            },
+            "content": response.text,
+        }
+        self.write(key, data)
+        self.evict()
+
+    def refresh(self, entry):
+        """Mark an entry as fresh after the server confirmed it is valid."""
+        entry.data["stored_at"] = time.time()
+        self.write(entry.key, entry.data)
+
+    def write(self, key, data):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as fh:
+                json.dump(data, fh)
+            os.replace(tmp_path, self.get_path(key))
+        except OSError as exc:
+            # the cache is an optimization, never fail a command because of it
+            logger.debug("could not write cache entry %s: %s", key, exc)
+
+    def delete(self, key):
+        with contextlib.suppress(OSError):
+            os.remove(self.get_path(key))
+
+    def evict(self):
+        try:
+            entries = [
+                entry
+                for entry in os.scandir(self.directory)
+                if entry.name.endswith(".json")
+            ]
+        except OSError:
+            return
+
+        stats = {}
+        for entry in entries:
+            with contextlib.suppress(OSError):
+                stats[entry.path] = entry.stat()
+
+        size = sum(stat.st_size for stat in stats.values())
+        for path, stat in sorted(
+            stats.items(), key=lambda item: item[1].st_mtime
+        ):
+            if size <= self.max_size:
+                break
+            with contextlib.suppress(OSError):
+                os.remove(path)
+                size -= stat.st_size
+
+    def clear(self):
+        with contextlib.suppress(OSError):
+            for entry in os.scandir(self.directory):
+                with contextlib.suppress(OSError):
+                    os.remove(entry.path)
+
+
+def get_identity(headers):
+    """
+    Return an identifier of the user the given request headers authenticate,
+    without leaking the token itself into the cache.
+    """
+    identity = "\n".join(
+        f"{name}:{headers[name]}"
+        for name in ("Authorization", "X-Sudo")
+        if headers.get(name)
+    )
+    if not identity:
+        return ""
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
@@ -1,23 +1,23 @@
 from __future__ import annotations
 
 import contextlib
+import logging
 import os
-import time
+import threading
 from datetime import datetime, timedelta, timezone
 from enum import Enum
 
-import boto3
-
-from azure.storage.blob import BlobClient
-
 import requests
 
+from divio_cli import polling, retry, settings, transport
 from divio_cli.exceptions import DivioException
-from divio_cli.utils import pretty_size
+from divio_cli.utils import download_file, pretty_size
 
 from ..cloud import CloudClient
 
 
+logger = logging.getLogger("divio.backups")
+
 BACKUP_RETENTION = timedelta(hours=1)
 UPLOAD_BACKUP_NOTE = "Divio CLI push"
 DOWNLOAD_BACKUP_NOTE = "Divio CLI pull"
@@ -39,6 +39,7 @@ def create_backup(
     environment: str,
     type: Type,
     prefix: str | None = None,
+    cancel: threading.Event | None = None,
 ) -> tuple[str, str]:
     """
     Trigger a backup for the service instance matching `type` and `prefix`.
@@ -62,7 +63,7 @@ def create_backup(
         delete_at=get_backup_delete_at(),
     )
     backup_uuid = response["uuid"]
-    return _wait_for_backup_to_complete(client, backup_uuid)
+    return _wait_for_backup_to_complete(client, backup_uuid, cancel=cancel)
 
 
 def get_backup_uuid_from_service_backup(
@@ -133,11 +134,20 @@ def upload_backup(
 
 
 def _upload_backup_aws(upload_params, local_file):
+    # imported here as the storage SDKs are slow to import and only needed
+    # by the matching backend
+    import boto3
+    from botocore.config import Config as BotoConfig
+
     boto3.client(
         "s3",
         aws_access_key_id=upload_params["aws_access_key_id"],
         aws_secret_access_key=upload_params["aws_secret_access_key"],
         aws_session_token=upload_params["aws_session_token"],
+        config=BotoConfig(
+            max_pool_connections=transport.get_pool_size(),
+            tcp_keepalive=True,
+        ),
     ).upload_file(
         local_file,
         Bucket=upload_params["bucket"],
@@ -146,10 +156,14 @@ def _upload_backup_aws(upload_params, local_file):
 
 
 def _upload_backup_azure(upload_params, local_file):
+    from azure.storage.blob import BlobClient
+
     with open(local_file, "rb") as fh:
-        BlobClient.from_blob_url(blob_url=upload_params["url"]).upload_blob(
-            fh, overwrite=True, max_concurrency=10
-        )
+        BlobClient.from_blob_url(
+            blob_url=upload_params["url"],
+            session=transport.get_session(),
+            session_owner=False,
+        ).upload_blob(fh, overwrite=True, max_concurrency=10)
 
 
 def _upload_backup_exoscale(upload_params, local_file):
@@ -161,13 +175,21 @@ def _upload_backup_exoscale(upload_params, local_file):
             f"which is above the upload size limit of {pretty_size(max_size)}."
         )
     with open(local_file, "rb") as fh:
-        requests.put(upload_params["url"], data=fh).raise_for_status()
+
+        def send():
+            # rewind the file in case a previous attempt consumed it
+            fh.seek(0)
+            return transport.get_session().put(upload_params["url"], data=fh)
+
+        response = retry.default_policy.call(send, "PUT", upload_params["url"])
+        response.raise_for_status()
 
 
 def create_backup_download_url(
     client: CloudClient,
     backup_uuid: str,
     backup_si_uuid: str,
+    cancel: threading.Event | None = None,
 ) -> str:
     """
     Get a download URL for a given backup UUID and service instance backup UUID.
@@ -185,12 +207,15 @@ def create_backup_download_url(
         raise DivioException("Error while creating backup download")
 
     # Wait for the backup download to complete
-    backup_download_si = {"ended_at": None}
-    while not backup_download_si.get("ended_at"):
-        time.sleep(2)
-        backup_download_si = client.get_backup_download_service_instance(
+    backup_download_si = polling.poll(
+        lambda: client.get_backup_download_service_instance(
             backup_download_si_uuid
-        )
+        ),
+        until=lambda si: si.get("ended_at"),
+        timeout=settings.BACKUP_TIMEOUT,
+        cancel=cancel,
+        message="Backup download did not complete",
+    )
     if backup_download_si.get("errors"):
         raise DivioException(
             f"Backup download failed: {backup_download_si['errors']}"
@@ -200,13 +225,19 @@ def create_backup_download_url(
 
 
 def _wait_for_backup_to_complete(
-    client: CloudClient, backup_uuid: str, message: str = "Backup failed"
+    client: CloudClient,
+    backup_uuid: str,
+    message: str = "Backup failed",
+    cancel: threading.Event | None = None,
 ) -> tuple[str, str]:
     # Wait for the backup to complete
-    backup = {"state": ""}
-    while backup.get("state") != "COMPLETED":
-        time.sleep(2)
-        backup = client.get_backup(backup_uuid)
+    backup = polling.poll(
+        lambda: client.get_backup(backup_uuid),
+        until=lambda backup: backup.get("state") == "COMPLETED",
+        timeout=settings.BACKUP_TIMEOUT,
+        cancel=cancel,
+        message="Backup did not complete",
+    )
 
     success = backup.get("success")
     si_backups = backup.get("service_instance_backups", [])
@@ -225,3 +256,51 @@ def _wait_for_backup_to_complete(
         raise DivioException("No service instance backup was found.")
 
     return backup["uuid"], backup["service_instance_backups"][0]
+
+
+def wait_for_backup_restore(client: CloudClient, restore_uuid: str) -> None:
+    restore = polling.poll(
+        lambda: client.get_backup_restore(restore_uuid),
+        until=lambda restore: restore.get("finished", False),
+        timeout=settings.RESTORE_TIMEOUT,
+        message="Backup restore did not finish",
+    )
+    if restore.get("success") != "SUCCESS":
+        raise DivioException("Backup restore failed.")
+
+
+def prefetch_backup(
+    client: CloudClient,
+    application_uuid: str,
+    environment: str,
+    type: Type,
+    directory: str,
+    prefix: str | None = None,
+    cancel: threading.Event | None = None,
+) -> str | None:
+    """
+    Create and download a backup ahead of the step restoring it, without
+    printing anything. Return the path of the downloaded file, or `None`
+    if there is nothing to download or it failed: the restoring step then
+    goes on without it and reports what went wrong.
+    """
+    try:
+        env_uuid = client.get_environment(application_uuid, environment)[
+            "uuid"
+        ]
+        service_instance = client.get_service_instance(type, env_uuid, prefix)
+        if service_instance["service_status"] == "NEW":
+            return None
+        backup_uuid, backup_si_uuid = create_backup(
+            client, application_uuid, environment, type, prefix, cancel=cancel
+        )
+        download_url = create_backup_download_url(
+            client, backup_uuid, backup_si_uuid, cancel=cancel
+        )
+        if not download_url:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        return download_file(download_url, directory=directory, cancel=cancel)
+    except (DivioException, requests.RequestException, OSError) as exc:
+        logger.debug("could not prefetch the %s backup: %s", type, exc)
+        return None
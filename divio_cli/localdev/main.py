@@ -1,5 +1,6 @@
+import contextlib
 import errno
-import json
+import functools
 import os
 import re
 import shutil
@@ -7,6 +8,7 @@ import stat
 import subprocess
 import sys
 import tarfile
+import tempfile
 from pathlib import PurePosixPath
 from time import sleep, time
 
@@ -22,12 +24,14 @@ from divio_cli.exceptions import (
 from divio_cli.localdev.push import PushDb, PushMedia, dump_database
 from divio_cli.utils import get_local_git_remotes
 
+from .. import download as downloads
 from .. import settings
 from ..cloud import get_divio_zone
+from ..download import download
+from ..taskgraph import TaskGraph
 from ..utils import (
     check_call,
     check_output,
-    download_file,
     get_subprocess_env,
     is_windows,
     launch_url,
@@ -123,8 +127,7 @@ def configure_project(website_slug, path, client, zone=None):
         raise DivioException(f"{os.path.dirname(path)} is not a directory")
 
     # Write the file
-    with open(path, "w+") as fh:
-        json.dump(website_data, fh, indent=4)
+    utils.write_project_settings(path, website_data)
 
     click.secho(
         "Configuration file: {}".format(click.style(path, fg="bright_green"))
@@ -141,15 +144,12 @@ def configure_project(website_slug, path, client, zone=None):
     )
 
 
-def setup_website_containers(
-    client, application_uuid, environment, path, prefix=DEFAULT_SERVICE_PREFIX
-):
+def build_website_containers(path):
     try:
         docker_compose = utils.get_docker_compose_cmd(path)
     except DockerComposeDoesNotExist as e:
         # give a reason
         raise DockerComposeDoesNotExist("Cannot setup containers") from e
-    docker_compose_config = utils.DockerComposeConfig(docker_compose)
 
     # stop all running containers for project
     check_call(docker_compose("stop"))
@@ -162,6 +162,25 @@ def setup_website_containers(
     click.secho("building local docker images", fg="green")
     check_call(docker_compose("build"))
 
+
+def setup_website_containers(
+    client,
+    application_uuid,
+    environment,
+    path,
+    prefix=DEFAULT_SERVICE_PREFIX,
+    build=True,
+    dump_file=None,
+):
+    """
+    Build the containers and import the database of the environment.
+    `dump_file` is a database dump that was already downloaded.
+    """
+    if build:
+        build_website_containers(path)
+    docker_compose = utils.get_docker_compose_cmd(path)
+    docker_compose_config = utils.DockerComposeConfig(docker_compose)
+
     if docker_compose_config.has_service(
         "db"
     ) or docker_compose_config.has_service(f"database_{prefix}".lower()):
@@ -189,6 +208,7 @@ def setup_website_containers(
             prefix=prefix,
             db_type=db_type,
             dump_path=dump_path,
+            dump_file=dump_file,
         )()
 
         if needs_legacy_migration():
@@ -247,35 +267,114 @@ def create_workspace(
     application_uuid = client.get_application_uuid_for_slug(website_slug)
     env = client.get_environment_by_application(application_uuid, environment)
 
-    # clone git project
-    clone_project(
-        website_slug=website_slug,
-        path=path,
-        client=client,
-        zone=zone,
-        branch=env["branch"],
-    )
-
-    # check for new baseproject + add configuration file
-    configure_project(
-        website_slug=website_slug, path=path, client=client, zone=zone
-    )
-
-    # setup docker website containers (if docker-compose.yml exists)
-    try:
-        setup_website_containers(
-            client=client,
-            application_uuid=application_uuid,
-            environment=environment,
+    # The backups of the database and media files are created and downloaded
+    # while the images are built, once the cloned project tells that they
+    # are restored. They are downloaded next to the workspace, which must be
+    # empty to be cloned to.
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    download_dir = tempfile.mkdtemp(prefix=".divio-setup-", dir=parent)
+    graph = TaskGraph()
+
+    def clone():
+        clone_project(
+            website_slug=website_slug,
             path=path,
+            client=client,
+            zone=zone,
+            branch=env["branch"],
         )
-        pull_media(client=client, environment=environment, path=path)
-    except DockerComposeDoesNotExist:
-        click.secho(
-            "Warning: docker-compose.yml does not exist. Will continue without...",
-            fg="yellow",
+        # check for new baseproject + add configuration file
+        configure_project(
+            website_slug=website_slug, path=path, client=client, zone=zone
         )
 
+    def needs_backup(backup_type):
+        try:
+            docker_compose = utils.get_docker_compose_cmd(path)
+            docker_compose_config = utils.DockerComposeConfig(docker_compose)
+        except DivioException:
+            # nothing is restored, the build step tells why
+            return False
+        if backup_type == backups.Type.DB:
+            return docker_compose_config.has_service(
+                "db"
+            ) or docker_compose_config.has_service(
+                f"database_{DEFAULT_SERVICE_PREFIX}".lower()
+            )
+        return docker_compose_config.has_volume_mount("web", "/data")
+
+    def prefetch(backup_type, prefix):
+        if not needs_backup(backup_type):
+            return None
+        return backups.prefetch_backup(
+            client,
+            application_uuid,
+            environment,
+            backup_type,
+            directory=os.path.join(download_dir, backup_type.value.lower()),
+            prefix=prefix,
+            cancel=graph.cancel,
+        )
+
+    def build():
+        # setup docker website containers (if docker-compose.yml exists)
+        try:
+            build_website_containers(path)
+        except DockerComposeDoesNotExist:
+            click.secho(
+                "Warning: docker-compose.yml does not exist. Will continue without...",
+                fg="yellow",
+            )
+            return False
+        return True
+
+    def import_database():
+        if graph.results["build"]:
+            setup_website_containers(
+                client=client,
+                application_uuid=application_uuid,
+                environment=environment,
+                path=path,
+                build=False,
+                dump_file=graph.results["database_backup"],
+            )
+
+    def import_media():
+        if graph.results["build"]:
+            pull_media(
+                client=client,
+                environment=environment,
+                path=path,
+                backup_path=graph.results["media_backup"],
+            )
+
+    graph.add("clone", clone)
+    graph.add(
+        "database_backup",
+        functools.partial(prefetch, backups.Type.DB, DEFAULT_SERVICE_PREFIX),
+        after=["clone"],
+    )
+    graph.add(
+        "media_backup",
+        functools.partial(prefetch, backups.Type.MEDIA, None),
+        after=["clone"],
+    )
+    graph.add("build", build, after=["clone"])
+    graph.add(
+        "import_database",
+        import_database,
+        after=["build", "database_backup"],
+    )
+    # restores run one after the other, their output would mix otherwise
+    graph.add(
+        "import_media", import_media, after=["import_database", "media_backup"]
+    )
+    try:
+        graph.run()
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
+
     instructions = (
         "Your workspace is setup and ready to start.",
         f"Change directory to '{path}' and run 'divio app up'",
@@ -469,6 +568,20 @@ class DatabaseImportBase:
     def get_db_restore_command(self, db_type):
         raise NotImplementedError
 
+    def run_restore_command(self, db_container_id, restore_command, **kwargs):
+        check_call(
+            [
+                "docker",
+                "exec",
+                db_container_id,
+                "/bin/bash",
+                "-c",
+                restore_command,
+            ],
+            env=get_subprocess_env(),
+            **kwargs,
+        )
+
     def restore_db_postgres(self, db_container_id):
         restore_command = self.get_db_restore_command(self.db_type)
         # Create db
@@ -522,17 +635,8 @@ class DatabaseImportBase:
 
         # TODO: use same dump-type detection like server side on db-api
         try:
-            check_call(
-                [
-                    "docker",
-                    "exec",
-                    db_container_id,
-                    "/bin/bash",
-                    "-c",
-                    restore_command,
-                ],
-                env=get_subprocess_env(),
-                catch=False,
+            self.run_restore_command(
+                db_container_id, restore_command, catch=False
             )
         except subprocess.CalledProcessError as exc:
             raise DivioException(
@@ -557,17 +661,7 @@ class DatabaseImportBase:
             ]
         )
 
-        check_call(
-            (
-                "docker",
-                "exec",
-                db_container_id,
-                "/bin/bash",
-                "-c",
-                restore_command,
-            ),
-            env=get_subprocess_env(),
-        )
+        self.run_restore_command(db_container_id, restore_command)
 
     def restore_db(self):
         click.secho(" ---> Importing database", nl=False)
@@ -598,6 +692,10 @@ class ImportLocalDatabase(DatabaseImportBase):
         click.secho(
             f" ===> Loading database dump {self.custom_dump_path} into local {self.prefix} database"
         )
+        # e.g. a dump kept by `divio app pull db --keep-tempfile`
+        if os.path.exists(downloads.get_digest_path(self.custom_dump_path)):
+            with utils.TimedStep("Verifying dump"):
+                downloads.verify_file(self.custom_dump_path)
         db_container_id = utils.get_db_container_id(
             self.path, prefix=self.prefix
         )
@@ -626,13 +724,54 @@ class ImportLocalDatabase(DatabaseImportBase):
         return self.restore_commands[db_type][kind].format(self.db_dump_path)
 
 
+@contextlib.contextmanager
+def hint_resume(backup_si_uuid, directory):
+    """
+    Tell how to resume the download of a backup to `directory` if it fails
+    once part of it was received.
+    """
+    try:
+        yield
+    except (DivioException, requests.RequestException, KeyboardInterrupt):
+        if not downloads.has_partial_download(directory):
+            raise
+        click.secho(
+            "\nThe download resumes when running the command again with "
+            f"--service-instance-backup {backup_si_uuid}",
+            fg="yellow",
+            err=True,
+        )
+        raise
+
+
+def is_streamable_dump(head, db_type):
+    """
+    Tell from its first bytes whether a dump can be restored as it is read,
+    without seeking in it.
+    """
+    if db_type == "fsm-postgres":
+        # pg_restore reads custom format archives in order, other formats
+        # are left to it to recognise in a file
+        return head.startswith(b"PGDMP")
+    # SQL statements
+    return db_type == "fsm-mysql"
+
+
 class ImportRemoteDatabase(DatabaseImportBase):
+    # the restore commands read the dump from their standard input
+    STREAM_PATH = "/dev/stdin"
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.environment = kwargs.pop("environment", None)
         self.application_uuid = kwargs.pop("application_uuid", None)
         self.keep_tempfile = kwargs.pop("keep_tempfile", None)
         self.backup_si_uuid = kwargs.pop("backup_si_uuid", None)
+        self.dump_file = kwargs.pop("dump_file", None)
+        self.connections = kwargs.pop("connections", None)
+        self.segment_size = kwargs.pop("segment_size", None)
+        self.stream = kwargs.pop("stream", False)
+        self.download_url = None
         remote_project_name = f"Project {self.application_uuid}"
 
         click.secho(
@@ -640,6 +779,15 @@ class ImportRemoteDatabase(DatabaseImportBase):
         )
 
     def setup(self):
+        if self.dump_file:
+            os.makedirs(self.dump_path, exist_ok=True)
+            self.host_db_dump_path = downloads.move(
+                self.dump_file, self.dump_path
+            )
+            utils.step(f"Using downloaded backup: {self.host_db_dump_path}")
+            self.db_dump_path = self.get_container_dump_path()
+            return
+
         if self.backup_si_uuid:
             with utils.TimedStep("Verifying backup instance"):
                 backup_uuid = backups.get_backup_uuid_from_service_backup(
@@ -660,28 +808,114 @@ class ImportRemoteDatabase(DatabaseImportBase):
                 self.client, backup_uuid, self.backup_si_uuid
             )
 
-        if download_url:
-            # Create the dump target directory if it does not exist yet
-            if not os.path.exists(self.dump_path):
-                os.makedirs(self.dump_path)
-
-            with utils.TimedStep("Downloading database"):
-                self.host_db_dump_path = download_file(
-                    download_url, directory=self.dump_path
-                )
-            utils.step(f"Writing temp file: {self.host_db_dump_path}")
-            # strip path from dump_path for use in the docker container and ensure
-            # posix path, even when running on Windows
-            host_dump_path = re.findall(
-                r"([^\/|^\\\\]+)",
-                self.host_db_dump_path.replace(self.path, ""),
-            )
-            self.db_dump_path = PurePosixPath("/app", *host_dump_path)
+        if download_url and self.stream:
+            # downloaded by the restore step
+            self.download_url = download_url
+            self.host_db_dump_path = None
+            self.db_dump_path = self.STREAM_PATH
+        elif download_url:
+            self.download_dump(download_url)
         else:
             utils.step("empty database")
             self.db_dump_path = None
             self.host_db_dump_path = None
 
+    def download_dump(self, download_url):
+        # Create the dump target directory if it does not exist yet
+        if not os.path.exists(self.dump_path):
+            os.makedirs(self.dump_path)
+
+        with utils.TimedStep("Downloading database"), hint_resume(
+            self.backup_si_uuid, self.dump_path
+        ):
+            stats = download(
+                download_url,
+                directory=self.dump_path,
+                connections=self.connections,
+                segment_size=self.segment_size,
+            )
+            self.host_db_dump_path = stats.path
+            click.echo(stats, nl=False)
+        utils.step(f"Writing temp file: {self.host_db_dump_path}")
+        self.db_dump_path = self.get_container_dump_path()
+
+    def run_restore_command(self, db_container_id, restore_command, **kwargs):
+        if not self.download_url:
+            return super().run_restore_command(
+                db_container_id, restore_command, **kwargs
+            )
+
+        with downloads.stream(self.download_url) as stream:
+            if is_streamable_dump(stream.head, self.db_type):
+                return self.stream_dump(
+                    db_container_id, restore_command, stream
+                )
+
+        click.echo("\n      The dump cannot be streamed", nl=False)
+        download_url, self.download_url = self.download_url, None
+        self.download_dump(download_url)
+        return super().run_restore_command(
+            db_container_id,
+            self.get_db_restore_command(self.db_type),
+            **kwargs,
+        )
+
+    def stream_dump(self, db_container_id, restore_command, stream):
+        """Restore the dump while it downloads, by piping it to the command."""
+        command = [
+            "docker",
+            "exec",
+            "-i",
+            db_container_id,
+            "/bin/bash",
+            "-c",
+            restore_command,
+        ]
+        process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, env=get_subprocess_env()
+        )
+        try:
+            stats = stream.copy(process.stdin)
+        except BrokenPipeError:
+            # the command failed, its exit code tells
+            stats = None
+        except BaseException as exc:
+            # the command must not take the end of its input for the end of
+            # the dump
+            process.kill()
+            message = (
+                "The database is partially restored, pull it again to "
+                "restore it completely."
+            )
+            if isinstance(exc, (DivioException, requests.RequestException)):
+                raise DivioException(
+                    f"The download of the database dump failed: {exc}\n\n"
+                    f"{message}"
+                ) from exc
+            click.secho(f"\n{message}", fg="yellow", err=True)
+            raise
+        finally:
+            with contextlib.suppress(BrokenPipeError):
+                process.stdin.close()
+            returncode = process.wait()
+        if returncode or stats is None:
+            raise DivioException(
+                "Could not restore the streamed database dump. Restoring "
+                "it from a file, without --stream, may work.\n\n"
+                "The executed command was:\n"
+                "  {command}".format(command=" ".join(command)),
+            )
+        click.echo(f"\n      Streamed {stats}", nl=False)
+
+    def get_container_dump_path(self):
+        # strip path from dump_path for use in the docker container and ensure
+        # posix path, even when running on Windows
+        host_dump_path = re.findall(
+            r"([^\/|^\\\\]+)",
+            self.host_db_dump_path.replace(self.path, ""),
+        )
+        return PurePosixPath("/app", *host_dump_path)
+
     def get_db_restore_command(self, db_type):
         cmd = self.restore_commands[db_type]["binary"]
         return cmd.format(self.db_dump_path)
@@ -692,37 +926,24 @@ class ImportRemoteDatabase(DatabaseImportBase):
                 utils.step(f"Keeping temp file: {self.host_db_dump_path}")
             else:
                 utils.step(f"Removing temp file: {self.host_db_dump_path}")
-                os.remove(self.host_db_dump_path)
+                downloads.remove(self.host_db_dump_path)
         super().finish(*args, **kwargs)
 
 
-def pull_media(
+def download_media_backup(
     client,
+    application_uuid,
     environment,
-    prefix=None,
-    application_uuid=None,
-    path=None,
-    backup_si_uuid=None,
-    keep_tempfile=False,
+    prefix,
+    backup_si_uuid,
+    project_home,
+    connections=None,
+    segment_size=None,
 ):
-    project_home = utils.get_application_home(path)
-    application_uuid = utils.get_project_settings(project_home)[
-        "application_uuid"
-    ]
-    remote_project_name = f"Project {application_uuid}"
-    docker_compose = utils.get_docker_compose_cmd(project_home)
-    docker_compose_config = utils.DockerComposeConfig(docker_compose)
-
-    local_data_folder = os.path.join(project_home, "data")
-    remote_data_folder = "/data"
-
-    if not docker_compose_config.has_volume_mount("web", remote_data_folder):
-        click.secho("No mount for /data folder found")
-        return
-
-    main_step = utils.MainStep(
-        f"Pulling media files from {remote_project_name} {environment} environment"
-    )
+    """
+    Download a backup of the media files, created unless `backup_si_uuid`
+    is given. Return its path, or `None` if there is none.
+    """
     if backup_si_uuid:
         with utils.TimedStep("Verifying backup instance"):
             backup_uuid = backups.get_backup_uuid_from_service_backup(
@@ -751,7 +972,7 @@ def pull_media(
             ):
                 click.secho("No Object Storage service instance found")
 
-                return
+                return None
 
         with utils.TimedStep("Creating backup"):
             backup_uuid, backup_si_uuid = backups.create_backup(
@@ -767,13 +988,74 @@ def pull_media(
             client, backup_uuid, backup_si_uuid
         )
 
-    with utils.TimedStep("Downloading"):
-        directory = os.path.join(project_home, settings.DIVIO_DUMP_FOLDER)
-        backup_path = download_file(download_url, directory=directory)
+    directory = os.path.join(project_home, settings.DIVIO_DUMP_FOLDER)
+    with utils.TimedStep("Downloading"), hint_resume(
+        backup_si_uuid, directory
+    ):
+        stats = download(
+            download_url,
+            directory=directory,
+            connections=connections,
+            segment_size=segment_size,
+        )
+        backup_path = stats.path
         if not backup_path:
             # no backup yet, skipping
+            return None
+        click.secho(f"to {backup_path}, {stats}", nl=False)
+
+    return backup_path
+
+
+def pull_media(
+    client,
+    environment,
+    prefix=None,
+    application_uuid=None,
+    path=None,
+    backup_si_uuid=None,
+    keep_tempfile=False,
+    backup_path=None,
+    connections=None,
+    segment_size=None,
+):
+    """
+    Replace the local media files by those of the environment. `backup_path`
+    is a backup of them that was already downloaded.
+    """
+    project_home = utils.get_application_home(path)
+    application_uuid = utils.get_project_settings(project_home)[
+        "application_uuid"
+    ]
+    remote_project_name = f"Project {application_uuid}"
+    docker_compose = utils.get_docker_compose_cmd(project_home)
+    docker_compose_config = utils.DockerComposeConfig(docker_compose)
+
+    local_data_folder = os.path.join(project_home, "data")
+    remote_data_folder = "/data"
+
+    if not docker_compose_config.has_volume_mount("web", remote_data_folder):
+        click.secho("No mount for /data folder found")
+        return
+
+    main_step = utils.MainStep(
+        f"Pulling media files from {remote_project_name} {environment} environment"
+    )
+    if backup_path:
+        utils.step(f"Using downloaded backup: {backup_path}")
+    else:
+        backup_path = download_media_backup(
+            client,
+            application_uuid,
+            environment,
+            prefix,
+            backup_si_uuid,
+            project_home,
+            connections=connections,
+            segment_size=segment_size,
+        )
+        if not backup_path:
             return
-        click.secho(f"to {backup_path}", nl=False)
 
     media_path = os.path.join(local_data_folder, "media")
 
@@ -812,7 +1094,7 @@ def pull_media(
 
     if not keep_tempfile:
         with utils.TimedStep("Removing temporary files"):
-            os.remove(backup_path)
+            downloads.remove(backup_path)
 
     main_step.done()
 
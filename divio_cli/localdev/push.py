@@ -3,7 +3,6 @@ from __future__ import annotations
 import os
 import subprocess
 import tarfile
-import time
 
 import attr
 import click
@@ -112,14 +111,7 @@ class PushBase:
                 si_backup_uuid=self.si_backup_uuid,
                 notes=backups.UPLOAD_BACKUP_NOTE,
             )
-            restore_uuid = res["uuid"]
-
-            restore = {}
-            while not restore.get("finished", False):
-                time.sleep(2)
-                restore = self.client.get_backup_restore(restore_uuid)
-            if restore.get("success") != "SUCCESS":
-                raise DivioException("Backup restore failed.")
+            backups.wait_for_backup_restore(self.client, res["uuid"])
 
     def cleanup_step(self):
         with utils.TimedStep("Deleting temporary files"):
@@ -3,10 +3,10 @@ import functools
 import json
 import os
 import subprocess
+import threading
 from time import time
 
 import click
-import yaml
 
 from .. import config, settings
 from ..exceptions import (
@@ -16,7 +16,12 @@ from ..exceptions import (
     DivioWarning,
     DockerComposeDoesNotExist,
 )
-from ..utils import check_call, check_output, is_windows
+from ..utils import atomic_open, check_call, check_output, is_windows
+
+
+# Serializes the writes of the project settings, which are migrated in the
+# background while commands run.
+project_settings_lock = threading.RLock()
 
 
 def get_project_settings_path(path=None, silent=False):
@@ -62,6 +67,11 @@ def get_project_settings(path=None, silent=False):
         raise DivioException(f"Unexpected value in {path}")
 
 
+def write_project_settings(path, data):
+    with project_settings_lock, atomic_open(path) as fh:
+        json.dump(data, fh, indent=4)
+
+
 def migrate_project_settings(client):
     """
     Migrates old versions of `.divio/config.json` to the current format.
@@ -72,7 +82,13 @@ def migrate_project_settings(client):
     This function is the main entry-point for settings forward migrations.
     Place any additional migrations here.
     """
+    # read and written at once, so that commands writing the settings
+    # meanwhile are not overwritten
+    with project_settings_lock:
+        _migrate_project_settings(client)
 
+
+def _migrate_project_settings(client):
     try:
         path = get_project_settings_path(silent=True)
         settings = get_project_settings(path=path, silent=True)
@@ -102,8 +118,7 @@ def migrate_project_settings(client):
                 settings_updated = True
 
     if settings_updated:
-        with open(path, "w") as fh:
-            json.dump(settings, fh, indent=4)
+        write_project_settings(path, settings)
 
 
 def get_application_home(path=None, silent=False):
@@ -194,6 +209,9 @@ def ensure_windows_docker_compose_file_exists(path):
         # TODO: use correct exit from click
         raise DivioException(f"docker-compose.yml not found at {unix_path}")
 
+    # imported here to keep the CLI startup fast
+    import yaml
+
     with open(unix_path) as fh:
         conf = yaml.load(fh, Loader=yaml.SafeLoader)
 
@@ -277,6 +295,8 @@ def start_database_server(docker_compose, prefix):
 
 class DockerComposeConfig:
     def __init__(self, docker_compose):
+        import yaml
+
         super().__init__()
         self.config = yaml.load(
             check_output(docker_compose("config")), Loader=yaml.SafeLoader
@@ -0,0 +1,231 @@
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import click
+from dateutil.parser import isoparse
+
+from .exceptions import DivioException
+
+
+# Carriage returns and the terminal queries and cursor moves found in the
+# output of interactive programs, which would garble the terminal.
+ESCAPE_SEQUENCES = re.compile(r"\r|\x1b\[(?:6n|J|H)")
+
+SERVICE_COLORS = {
+    "web": "blue",
+    "cronjob": "bright_cyan",
+    "shell": "bright_red",
+    "worker": "bright_blue",
+}
+
+
+def get_service_color(service):
+    return SERVICE_COLORS.get(service, "yellow")
+
+
+def parse_timestamp(value):
+    # `fromisoformat` is much faster than `isoparse`, but before Python 3.11
+    # it only reads the format it writes
+    try:
+        if value.endswith("Z"):
+            return datetime.fromisoformat(f"{value[:-1]}+00:00")
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return isoparse(value)
+
+
+class LogRenderer:
+    """
+    Prints log entries a page at a time, keeping up with busy environments:
+    each page is written at once, service labels are styled once and
+    nothing is styled when the output is not a terminal.
+    """
+
+    def __init__(self, utc=True, color=None):
+        if color is None:
+            ctx = click.get_current_context(silent=True)
+            color = ctx.color if ctx and ctx.color is not None else None
+        if color is None:
+            color = sys.stdout.isatty()
+        self.utc = utc
+        self.color = color
+        self.labels = {}
+
+    def get_label(self, service):
+        label = self.labels.get(service)
+        if label is None:
+            label = f"{service:^16}"
+            if self.color:
+                label = click.style(label, fg=get_service_color(service))
+            self.labels[service] = label
+        return label
+
+    def format_timestamp(self, value):
+        dt = parse_timestamp(value)
+        if not self.utc:
+            dt = dt.astimezone()
+        return str(dt)
+
+    def format(self, entry):
+        return "{} │ {} │ {}\n".format(
+            self.format_timestamp(entry["timestamp"]),
+            self.get_label(entry["service"]),
+            ESCAPE_SEQUENCES.sub("", entry["message"]),
+        )
+
+    def render(self, entries):
+        if not entries:
+            return
+        page = "".join(map(self.format, entries))
+        if self.color:
+            # click translates the styles on Windows
+            click.echo(page, nl=False, color=True)
+        else:
+            sys.stdout.write(page)
+        sys.stdout.flush()
+
+
+def get_archive_path(directory, environment_uuid):
+    return os.path.join(directory, f"{environment_uuid}.sqlite3")
+
+
+class LogArchive:
+    """
+    An append-only local copy of the logs of an environment, indexed for
+    full-text search when SQLite has FTS5. It remembers the `next` cursor of
+    the last page, so that archiving resumes where it stopped. As logs may
+    hold secrets, the file is only readable by its owner.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), 0o700, exist_ok=True)
+            os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        self.connection = sqlite3.connect(path)
+        self.create_tables()
+
+    def create_tables(self):
+        with self.connection as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "id INTEGER PRIMARY KEY, time REAL, timestamp TEXT, "
+                "service TEXT, message TEXT)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_time ON entries (time)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS state "
+                "(key TEXT PRIMARY KEY, value TEXT)"
+            )
+            try:
+                connection.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING "
+                    "fts5(message, content='entries', content_rowid='id')"
+                )
+                self.indexed = True
+            except sqlite3.OperationalError:
+                # SQLite built without FTS5, searches scan the messages
+                self.indexed = False
+
+    def get_cursor(self):
+        row = self.connection.execute(
+            "SELECT value FROM state WHERE key = 'next'"
+        ).fetchone()
+        return row[0] if row else None
+
+    def append(self, entries, cursor=None):
+        """Store a page of entries and the cursor of the next page."""
+        with self.connection as connection:
+            for entry in entries:
+                row_id = connection.execute(
+                    "INSERT INTO entries (time, timestamp, service, message) "
+                    "VALUES (?, ?, ?, ?)",
+                    (
+                        parse_timestamp(entry["timestamp"]).timestamp(),
+                        entry["timestamp"],
+                        entry["service"],
+                        entry["message"],
+                    ),
+                ).lastrowid
+                if self.indexed:
+                    connection.execute(
+                        "INSERT INTO entries_fts (rowid, message) "
+                        "VALUES (?, ?)",
+                        (row_id, entry["message"]),
+                    )
+            if cursor:
+                connection.execute(
+                    "INSERT OR REPLACE INTO state VALUES ('next', ?)",
+                    (cursor,),
+                )
+
+    def search(
+        self, query=None, since=None, until=None, services=(), limit=None
+    ):
+        """
+        Return the latest entries matching the query, the time range (as
+        POSIX timestamps) and the services, oldest first.
+        """
+        where, values = [], []
+        if query and self.indexed:
+            where.append(
+                "id IN (SELECT rowid FROM entries_fts "
+                "WHERE entries_fts MATCH ?)"
+            )
+            values.append(query)
+        elif query:
+            where.append("message LIKE ?")
+            values.append(f"%{query}%")
+        if since is not None:
+            where.append("time >= ?")
+            values.append(since)
+        if until is not None:
+            where.append("time < ?")
+            values.append(until)
+        if services:
+            where.append(f"service IN ({', '.join('?' * len(services))})")
+            values.extend(services)
+
+        sql = "SELECT timestamp, service, message FROM entries"
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        sql += " ORDER BY time DESC, id DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        try:
+            rows = self.connection.execute(sql, values).fetchall()
+        except sqlite3.OperationalError as exc:
+            # most likely a syntax error in the query
+            raise DivioException(f"Invalid search query: {exc}")
+        return [
+            {"timestamp": timestamp, "service": service, "message": message}
+            for timestamp, service, message in reversed(rows)
+        ]
+
+    def close(self):
+        self.connection.close()
+
+
+def parse_time(value):
+    """
+    Parse a point in time given as a date (local time unless it has an
+    offset) or as a duration before now such as `90s`, `30m`, `2h` or `1d`.
+    Return a POSIX timestamp.
+    """
+    match = re.match(r"^(\d+)([smhd])$", value)
+    if match:
+        amount, unit = match.groups()
+        seconds = int(amount) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[unit]
+        return time.time() - seconds
+    try:
+        return isoparse(value).timestamp()
+    except ValueError:
+        raise click.BadParameter(
+            f"'{value}' is neither a date nor a duration like 30m or 2h."
+        )
@@ -26,6 +26,11 @@ LOGIN_CHECK_ERROR = (
     "You are currently not logged in, please log in using `divio login`."
 )
 
+STALE_RESULTS = (
+    "Results as of {as_of}. They are being refreshed for the next call, use "
+    "--max-staleness 0 to wait for current ones."
+)
+
 LOGOUT_CONFIRMATION = "Are you sure you want to logout from {}?"
 LOGOUT_ERROR = "You are not logged into {} at the moment"
 LOGOUT_SUCCESS = "Logged out from {}"
@@ -58,3 +63,9 @@ PUSH_MEDIA_WARNING = (
     "\nand take a backup before restoring media files."
     "\n\nPlease proceed with caution!"
 )
+
+
+RESULTS_LIMITED = (
+    "There were {count} results available, but the limit is currently set "
+    "at {limit}. Adjust the --limit option for more."
+)
@@ -0,0 +1,107 @@
+import logging
+import time
+
+from divio_cli.exceptions import DivioException
+
+
+logger = logging.getLogger("divio.polling")
+
+
+class PollTimeout(DivioException):
+    """The operation did not finish before the deadline."""
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        # the last state received, for callers that can do with it
+        self.result = result
+
+
+class PollCancelled(DivioException):
+    def __init__(self, message="Cancelled."):
+        super().__init__(message, fg="yellow")
+
+
+class Poller:
+    """
+    Waits between the checks of a long running operation.
+
+    The first checks are close to each other, so that quick operations are
+    noticed as soon as they are done. The interval then grows by `backoff`
+    up to `max_interval`, so that long operations send fewer requests.
+    `reset` goes back to the first interval, e.g. once a log returned new
+    lines.
+
+    `wait` raises `PollTimeout` once `timeout` seconds have passed since the
+    poller was created, and `PollCancelled` when the `cancel` event (a
+    `threading.Event`) is set, which also interrupts the current wait.
+    """
+
+    def __init__(
+        self,
+        interval=0.5,
+        max_interval=10,
+        backoff=1.5,
+        timeout=None,
+        cancel=None,
+        message="Timed out",
+    ):
+        self.initial_interval = interval
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.cancel = cancel
+        self.message = message
+        self.started_at = time.monotonic()
+        self.deadline = None if timeout is None else self.started_at + timeout
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def reset(self):
+        self.interval = self.initial_interval
+
+    def check_cancelled(self):
+        if self.cancel is not None and self.cancel.is_set():
+            raise PollCancelled
+
+    def wait(self, result=None):
+        """
+        Wait for the next check. `result` is the last state received, it is
+        attached to the `PollTimeout` raised once the deadline passed.
+        """
+        self.check_cancelled()
+        delay = self.interval
+        if self.deadline is not None:
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                raise PollTimeout(
+                    f"{self.message} after {int(self.elapsed)}s.",
+                    result=result,
+                )
+            # check a last time at the deadline
+            delay = min(delay, remaining)
+
+        if self.cancel is not None:
+            self.cancel.wait(delay)
+            self.check_cancelled()
+        else:
+            time.sleep(delay)
+        self.interval = min(self.interval * self.backoff, self.max_interval)
+
+
+def poll(fetch, until, on_progress=None, **kwargs):
+    """
+    Call `fetch` until `until` returns true for its result, and return that
+    result. `on_progress` is called with every result. The other arguments
+    are those of `Poller`.
+    """
+    poller = Poller(**kwargs)
+    while True:
+        result = fetch()
+        if on_progress is not None:
+            on_progress(result)
+        if until(result):
+            logger.debug("done after %.1fs", poller.elapsed)
+            return result
+        poller.wait(result)
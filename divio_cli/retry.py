@@ -0,0 +1,199 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+
+logger = logging.getLogger("divio.client.retry")
+
+# Methods that can be sent again without changing the outcome of the first
+# request (RFC 9110, section 9.2.2).
+IDEMPOTENT_METHODS = frozenset(
+    ("GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE")
+)
+RETRY_STATUS_CODES = frozenset(
+    (
+        requests.codes.too_many_requests,
+        requests.codes.bad_gateway,
+        requests.codes.service_unavailable,
+        requests.codes.gateway_timeout,
+    )
+)
+
+
+def parse_retry_after(value):
+    """
+    Return the number of seconds to wait according to a `Retry-After`
+    header, which is either a number of seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(tz=timezone.utc)).total_seconds())
+
+
+def is_connect_error(exception):
+    """
+    Return whether the request failed before it reached the server, which
+    makes it safe to send again regardless of the method.
+    """
+    if isinstance(exception, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(exception, requests.exceptions.ConnectionError):
+        cause = exception.args[0] if exception.args else None
+        reason = getattr(cause, "reason", None)
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+class RetryBudget:
+    """
+    Limits the total number of retries of a command, so that a failing
+    service does not make every single request wait for its full backoff.
+    """
+
+    def __init__(self, max_retries):
+        self.max_retries = max_retries
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.used >= self.max_retries:
+                return False
+            self.used += 1
+            return True
+
+
+class RetryPolicy:
+    """
+    Sends HTTP requests again when they fail with a transient error.
+
+    Connection errors, timeouts and the status codes in `RETRY_STATUS_CODES`
+    are retried for idempotent methods. Other methods are only retried when
+    the server did not process the request: on connection failures and on
+    429 responses. The delay between attempts follows the `Retry-After`
+    header when present and decorrelated jitter otherwise.
+    """
+
+    def __init__(
+        self, max_attempts=5, base_delay=0.5, max_delay=30, budget=None
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget(max_retries=20)
+
+    def is_retryable(self, method, response=None, exception=None):
+        if exception is not None:
+            if method.upper() in IDEMPOTENT_METHODS:
+                return isinstance(
+                    exception,
+                    (
+                        requests.exceptions.ConnectionError,
+                        requests.exceptions.Timeout,
+                    ),
+                )
+            return is_connect_error(exception)
+
+        if method.upper() in IDEMPOTENT_METHODS:
+            return response.status_code in RETRY_STATUS_CODES
+        return response.status_code == requests.codes.too_many_requests
+
+    def get_delay(self, previous_delay, response=None):
+        if response is not None:
+            retry_after = parse_retry_after(
+                response.headers.get("Retry-After")
+            )
+            if retry_after is not None:
+                return retry_after
+        return min(
+            self.max_delay,
+            random.uniform(self.base_delay, previous_delay * 3),
+        )
+
+    def call(self, send, method, url):
+        """
+        Call `send` until it returns a response that does not need to be
+        retried, and return that response. The last exception is raised if
+        every attempt failed.
+        """
+        delay = self.base_delay
+        attempt = 1
+        while True:
+            response = exception = None
+            try:
+                response = send()
+            except requests.exceptions.RequestException as exc:
+                exception = exc
+
+            if attempt >= self.max_attempts or not self.is_retryable(
+                method, response, exception
+            ):
+                if exception is not None:
+                    raise exception
+                return response
+
+            delay = self.get_delay(delay, response)
+            if delay > self.max_delay:
+                logger.debug(
+                    "not retrying %s %s, server asked to wait %.0fs",
+                    method,
+                    url,
+                    delay,
+                )
+                return response
+            if not self.budget.acquire():
+                logger.debug(
+                    "not retrying %s %s, retry budget of %s exhausted",
+                    method,
+                    url,
+                    self.budget.max_retries,
+                )
+                if exception is not None:
+                    raise exception
+                return response
+
+            logger.debug(
+                "%s %s failed (%s), retrying in %.1fs "
+                "(attempt %s/%s, %s/%s retries used)",
+                method,
+                url,
+                exception or f"status-code={response.status_code}",
+                delay,
+                attempt + 1,
+                self.max_attempts,
+                self.budget.used,
+                self.budget.max_retries,
+            )
+            if response is not None:
+                # release the connection, e.g. for streamed responses
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+
+# Shared by every request of a command, so that they use the same budget.
+default_policy = RetryPolicy()
+
+
+def reset_budget():
+    """
+    Give the next command a full retry budget, for processes running
+    several commands such as the agent.
+    """
+    default_policy.budget = RetryBudget(default_policy.budget.max_retries)
@@ -12,6 +12,47 @@ DIVIO_GLOBAL_CONFIG_FILE = os.path.join(
     os.getenv("XDG_CONFIG_HOME", os.path.expanduser("~/.config")),
     "divio/config.json",
 )
+DIVIO_CACHE_DIR = os.path.join(
+    os.path.dirname(DIVIO_GLOBAL_CONFIG_FILE), "cache"
+)
+DEFAULT_CACHE_MAX_SIZE = 50 * 1024 * 1024
+DIVIO_METADATA_DIR = os.path.join(
+    os.path.dirname(DIVIO_GLOBAL_CONFIG_FILE), "metadata"
+)
+DIVIO_LOGS_DIR = os.path.join(
+    os.path.dirname(DIVIO_GLOBAL_CONFIG_FILE), "logs"
+)
+DEFAULT_HTTP_POOL_SIZE = 16
+# Connections over which backups are downloaded, by ranges.
+DEFAULT_DOWNLOAD_CONNECTIONS = 4
+# Seconds to wait for the update check and the project settings migration
+# once a command is done. They run in the background while it executes.
+BACKGROUND_TASKS_DEADLINE = 1
+PYPI_TIMEOUT = 3
+# Applications refreshed concurrently by `divio cache sync`.
+SYNC_MAX_WORKERS = 8
+# Seconds for which list commands run in a terminal print stored results,
+# while refreshing them in the background.
+DEFAULT_MAX_STALENESS = 24 * 60 * 60
+DIVIO_AGENT_SOCKET = os.path.join(
+    os.path.dirname(DIVIO_GLOBAL_CONFIG_FILE), "agent.sock"
+)
+# Seconds after which an agent that received no command shuts down.
+AGENT_IDLE_TIMEOUT = 15 * 60
+AGENT_CONNECT_TIMEOUT = 0.5
+AGENT_START_TIMEOUT = 10
+# Seconds to wait for the output of a forwarded command, after which it is
+# run locally.
+AGENT_READ_TIMEOUT = 60
+# Seconds after which waiting for an operation of the API is given up.
+BACKUP_TIMEOUT = 6 * 60 * 60
+RESTORE_TIMEOUT = 6 * 60 * 60
+DEPLOY_TIMEOUT = 2 * 60 * 60
+# Deployments run at once by `divio deploy-many`.
+DEPLOY_CONCURRENCY = 10
+REPOSITORY_VERIFICATION_TIMEOUT = 30
+# Seconds during which the environments of an application are cached.
+ENVIRONMENT_CACHE_TTL = 24 * 60 * 60
 DEFAULT_SENTRY_DSN = (
     "https://c81d7d22230841d7ae752bac26c84dcf@o1163.ingest.sentry.io/6001539"
 )
@@ -0,0 +1,187 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+logger = logging.getLogger("divio.store")
+
+# Columns of every table besides the UUID, the position of the record in the
+# API listing and the record itself. Each of them is indexed, records are
+# looked up by them.
+TABLES = {
+    "organisations": (),
+    "regions": (),
+    "services": ("region",),
+    "applications": ("slug", "organisation"),
+    "environments": ("application", "slug"),
+    "service_instances": ("environment",),
+    "deployments": ("application", "environment"),
+}
+
+
+def get_store_path(directory, endpoint, identity):
+    """
+    Return the path of the store for the user `identity` authenticates on
+    `endpoint`. Users and zones never share a store.
+    """
+    key = hashlib.sha256(f"{endpoint}\n{identity}".encode()).hexdigest()
+    return os.path.join(directory, f"{key[:32]}.sqlite3")
+
+
+class MetadataStore:
+    """
+    A local SQLite copy of API records that rarely change. The file is only
+    readable by its owner.
+
+    Records are stored by listing: `replace` stores all the records of a
+    listing, e.g. the deployments of an application, and remembers when it
+    was done. `get` only answers for listings that were stored before, and
+    returns `None` otherwise so that the caller can ask the API instead.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), 0o700, exist_ok=True)
+                os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+            # sync requests the API from several threads, all access goes
+            # through `lock`
+            self._connection = sqlite3.connect(
+                self.path, check_same_thread=False
+            )
+            self.create_tables()
+        return self._connection
+
+    def create_tables(self):
+        with self._connection as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS syncs ("
+                "name TEXT, scope TEXT, synced_at REAL, "
+                "PRIMARY KEY (name, scope))"
+            )
+            for name, fields in TABLES.items():
+                columns = "".join(f", {field} TEXT" for field in fields)
+                connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} ("
+                    f"uuid TEXT PRIMARY KEY{columns}, "
+                    "position INTEGER, data TEXT)"
+                )
+                for field in fields:
+                    connection.execute(
+                        f"CREATE INDEX IF NOT EXISTS {name}_{field} "
+                        f"ON {name} ({field})"
+                    )
+
+    def get_where(self, name, scope):
+        for field in scope:
+            if field not in TABLES[name]:
+                raise ValueError(f"{name} cannot be filtered by {field}")
+        if not scope:
+            return "", ()
+        where = " AND ".join(f"{field} = ?" for field in scope)
+        return f" WHERE {where}", tuple(scope.values())
+
+    def get_synced_at(self, name, **scope):
+        """
+        Return when the listing was stored, including listings covering it,
+        e.g. the deployments of all environments of an application cover the
+        deployments of one of them.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT scope, synced_at FROM syncs WHERE name = ?", (name,)
+            ).fetchall()
+
+        synced_at = None
+        for stored_scope, stored_at in rows:
+            if json.loads(stored_scope).items() <= scope.items():
+                synced_at = max(synced_at or stored_at, stored_at)
+        return synced_at
+
+    def get(self, name, **scope):
+        """Return the records of a stored listing, or `None`."""
+        where, values = self.get_where(name, scope)
+        if self.get_synced_at(name, **scope) is None:
+            return None
+
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT data FROM {name}{where} ORDER BY position",
+                values,
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def replace(self, name, records, **scope):
+        """
+        Store the records of a complete listing, dropping the records of the
+        same listing that are not part of it anymore.
+        """
+        fields = TABLES[name]
+        where, values = self.get_where(name, scope)
+        rows = [
+            (
+                record["uuid"],
+                *(record.get(field, scope.get(field)) for field in fields),
+                position,
+                json.dumps(record),
+            )
+            for position, record in enumerate(records)
+        ]
+        placeholders = ", ".join("?" * (len(fields) + 3))
+
+        with self.lock, self.connection as connection:
+            connection.execute(f"DELETE FROM {name}{where}", values)
+            connection.executemany(
+                f"INSERT OR REPLACE INTO {name} VALUES ({placeholders})",
+                rows,
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO syncs VALUES (?, ?, ?)",
+                (name, json.dumps(scope, sort_keys=True), time.time()),
+            )
+
+    def save(self, name, records, **scope):
+        """
+        Like `replace`, but errors are only logged: records that were just
+        received from the API are stored on the way, and the store must
+        never fail the command that requested them.
+        """
+        try:
+            self.replace(name, records, **scope)
+        except (sqlite3.Error, OSError) as exc:
+            logger.debug("could not store %s: %s", name, exc)
+
+    def delete(self, name, **scope):
+        """Drop the records and listings matching `scope`."""
+        where, values = self.get_where(name, scope)
+        with self.lock, self.connection as connection:
+            connection.execute(f"DELETE FROM {name}{where}", values)
+            for (stored_scope,) in connection.execute(
+                "SELECT scope FROM syncs WHERE name = ?", (name,)
+            ).fetchall():
+                if scope.items() <= json.loads(stored_scope).items():
+                    connection.execute(
+                        "DELETE FROM syncs WHERE name = ? AND scope = ?",
+                        (name, stored_scope),
+                    )
+
+    def clear(self):
+        self.close()
+        with contextlib.suppress(OSError):
+            os.remove(self.path)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+logger = logging.getLogger("divio.taskgraph")
+
+
+class TaskGraph:
+    """
+    Runs tasks concurrently, each as soon as the tasks it depends on are
+    done, so that the whole takes as long as its longest chain of tasks.
+
+    Tasks read the results of the tasks they depend on from `results`. Once
+    a task failed, no other task is started, `cancel` is set so that the
+    running ones can stop early (see `polling.Poller`), and `run` raises the
+    error once they returned.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+        self.results = {}
+        self.durations = {}
+        self.cancel = threading.Event()
+
+    def add(self, name, func, after=()):
+        for dependency in after:
+            if dependency not in self.tasks:
+                raise ValueError(f"unknown task {dependency}")
+        self.tasks[name] = (func, tuple(after))
+
+    def run_task(self, name, func):
+        start = time.monotonic()
+        try:
+            return func()
+        finally:
+            self.durations[name] = time.monotonic() - start
+            logger.debug("%s took %.1fs", name, self.durations[name])
+
+    def run(self):
+        """Run all tasks and return their results by name."""
+        pending = dict(self.tasks)
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=max(len(pending), 1)) as executor:
+            try:
+                while pending or running:
+                    if error is None:
+                        for name, (func, after) in list(pending.items()):
+                            if all(dep in self.results for dep in after):
+                                del pending[name]
+                                future = executor.submit(
+                                    self.run_task, name, func
+                                )
+                                running[future] = name
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        try:
+                            self.results[name] = future.result()
+                        except Exception as exc:
+                            logger.debug("%s failed: %s", name, exc)
+                            if error is None:
+                                error = exc
+                                self.cancel.set()
+            except BaseException:
+                # e.g. a KeyboardInterrupt, stop what can be stopped
+                self.cancel.set()
+                raise
+        if error is not None:
+            raise error
+        return self.results
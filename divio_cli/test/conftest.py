@@ -1,4 +1,5 @@
 import contextlib
+import io
 import os
 import shlex
 import shutil
@@ -7,6 +8,7 @@ from unittest.mock import Mock
 
 import pytest
 import requests
+from urllib3 import HTTPResponse
 
 
 TEST_DATA_DIRECTORY = "test_data"
@@ -86,6 +88,29 @@ def base_session():
     return session
 
 
+@pytest.fixture
+def make_response():
+    """Return a function building streamed responses of a body."""
+
+    def make_response(body, headers=None):
+        response = requests.Response()
+        response.status_code = 200
+        response.headers.update(headers or {})
+        # the announced length is only used to preallocate the file, the raw
+        # response must not enforce it
+        raw_headers = dict(headers or {})
+        raw_headers.pop("Content-Length", None)
+        response.raw = HTTPResponse(
+            body=io.BytesIO(body),
+            headers=raw_headers,
+            preload_content=False,
+            decode_content=False,
+        )
+        return response
+
+    return make_response
+
+
 @pytest.fixture
 def bad_request_response():
     class HttpBadResponse:
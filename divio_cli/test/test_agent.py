@@ -0,0 +1,130 @@
+import os
+import socket
+import sys
+import threading
+
+import pytest
+
+from divio_cli import agent
+
+
+pytestmark = pytest.mark.skipif(
+    not agent.is_supported(), reason="unix sockets are not available"
+)
+
+
+@pytest.mark.parametrize(
+    "args, forwarded",
+    [
+        (["app", "list", "--json"], True),
+        (["project", "list"], True),
+        (["app", "deployments", "--json", "list", "-s", "live"], True),
+        (["app", "env-vars", "get", "SECRET_KEY"], True),
+        (["regions", "list"], True),
+        (["app", "deploy", "live"], False),
+        (["app", "env-vars"], False),
+        (["login", "<token>"], False),
+        (["--zone", "example.com", "app", "list"], False),
+        (["-d", "app", "list"], False),
+        ([], False),
+    ],
+)
+def test_is_forwarded(args, forwarded):
+    assert agent.is_forwarded(args) is forwarded
+
+
+@pytest.fixture
+def socket_path():
+    # unix socket paths are limited to about a hundred characters
+    path = os.path.join("/tmp", f"divio-test-{os.getpid()}.sock")
+    yield path
+    if os.path.exists(path):
+        os.remove(path)
+
+
+@pytest.fixture
+def server(socket_path):
+    thread = threading.Thread(
+        target=agent.serve,
+        kwargs={"path": socket_path, "idle_timeout": 10},
+        daemon=True,
+    )
+    thread.start()
+    while not agent.send({"ping": True}, path=socket_path):
+        thread.join(0.01)
+    yield thread
+    agent.send({"stop": True}, path=socket_path)
+    thread.join(5)
+
+
+def test_send_without_agent(socket_path):
+    assert agent.send({"ping": True}, path=socket_path) is None
+
+    # a socket left behind by an agent that was killed
+    open(socket_path, "w").close()
+    assert agent.send({"ping": True}, path=socket_path) is None
+
+
+def test_send_to_hung_agent(socket_path):
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    try:
+        with pytest.raises(socket.timeout):
+            agent.send({"ping": True}, timeout=0.1, path=socket_path)
+    finally:
+        server.close()
+
+
+def test_command_environment_tells_if_client_is_a_terminal(tmp_path):
+    request = {"cwd": str(tmp_path), "env": {}, "args": [], "tty": True}
+
+    with agent.command_environment(request):
+        assert sys.stdout.isatty()
+        assert not sys.stderr.isatty()
+        assert os.getcwd() == str(tmp_path)
+
+    assert os.getcwd() != str(tmp_path)
+
+
+def test_agent_runs_commands(server, socket_path, tmp_path, monkeypatch):
+    # the CLI installs its own exception hook
+    monkeypatch.setattr(sys, "excepthook", sys.excepthook)
+
+    response = agent.send(
+        {
+            "args": ["regions", "list", "--help"],
+            "cwd": str(tmp_path),
+            "env": dict(os.environ),
+        },
+        path=socket_path,
+    )
+
+    assert response["exit_code"] == 0
+    assert response["stdout"].startswith("Usage: divio regions list")
+    # the agent is left as it was
+    assert os.getcwd() != str(tmp_path)
+
+
+def test_agent_drops_silent_clients(server, socket_path):
+    silent = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    silent.connect(socket_path)
+    try:
+        # answered once the silent client is dropped
+        assert agent.send({"ping": True}, timeout=5, path=socket_path)
+    finally:
+        silent.close()
+
+
+def test_agent_stops(server, socket_path):
+    assert agent.send({"stop": True}, path=socket_path) == {"stopped": True}
+
+    server.join(5)
+    assert not server.is_alive()
+    assert not os.path.exists(socket_path)
+
+
+def test_agent_stops_when_idle(socket_path):
+    agent.serve(path=socket_path, idle_timeout=0.1)
+
+    assert not os.path.exists(socket_path)
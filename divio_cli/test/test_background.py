@@ -0,0 +1,43 @@
+import threading
+import time
+
+from divio_cli.background import join_all, run_in_background
+
+
+def test_run_in_background():
+    task = run_in_background(lambda x: x * 2, 21)
+
+    assert task.join(time.monotonic() + 5)
+    assert task.result == 42
+    assert task.thread.daemon
+
+
+def test_run_in_background_deadline():
+    event = threading.Event()
+    task = run_in_background(event.wait)
+
+    assert not task.join(time.monotonic())
+    assert task.result is None
+
+    event.set()
+    assert task.join(time.monotonic() + 5)
+
+
+def test_run_in_background_exception():
+    def fail():
+        raise ValueError("boom")
+
+    task = run_in_background(fail)
+
+    assert task.join(time.monotonic() + 5)
+    assert isinstance(task.exception, ValueError)
+
+
+def test_join_all():
+    event = threading.Event()
+    task = run_in_background(lambda: event.wait(5))
+    threading.Timer(0.05, event.set).start()
+
+    join_all()
+
+    assert task.result is True
@@ -0,0 +1,49 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from divio_cli import client as client_module
+from divio_cli.client import Client
+
+
+USER_INFO = {"email": "jane@example.com", "first_name": "Jane"}
+
+
+@pytest.fixture(autouse=True)
+def _user_info_cache(monkeypatch):
+    monkeypatch.setattr(client_module, "_user_info_cache", {})
+
+
+def make_session():
+    session = MagicMock()
+    session.request.return_value.status_code = 200
+    session.request.return_value.json.return_value = USER_INFO
+    return session
+
+
+def test_client_uses_shared_session_and_netrc():
+    session = make_session()
+    netrc = MagicMock()
+    netrc.hosts = {"control.divio.com": ("jane", None, "<token>")}
+
+    client = Client(session=session, netrc=netrc)
+
+    assert client.authenticate() is True
+    assert client.session is session
+    assert client.get_netrc() is netrc
+    assert client.headers["Authorization"] == "Token <token>"
+    assert client.get_user_email() == "jane@example.com"
+
+
+def test_client_retrieves_user_info_once_per_token():
+    session = make_session()
+
+    Client(token="<token>", session=session)
+    client = Client(token="<token>", session=session)
+
+    assert session.request.call_count == 1
+    assert client.get_user_email() == "jane@example.com"
+
+    Client(token="<other-token>", session=session)
+
+    assert session.request.call_count == 2
@@ -0,0 +1,234 @@
+import time
+from unittest.mock import MagicMock
+
+# divio_cli.cloud and divio_cli.localdev import each other, importing the
+# latter first resolves the cycle
+import divio_cli.localdev  # noqa: F401
+from divio_cli import cloud, messages
+from divio_cli.cloud import CloudClient
+from divio_cli.logs import LogArchive
+from divio_cli.store import MetadataStore
+
+
+def make_client():
+    # skip __init__, which reads the user's config and netrc
+    return CloudClient.__new__(CloudClient)
+
+
+def test_get_applications_with_organisations():
+    client = make_client()
+    client.get_applications = MagicMock(
+        return_value=(
+            [
+                {"uuid": "a1", "organisation": "o1"},
+                {"uuid": "a2", "organisation": "o1"},
+                {"uuid": "a3", "organisation": "o2"},
+            ],
+            [],
+        )
+    )
+    client.get_organisations = MagicMock(
+        return_value=([{"uuid": "o1", "name": "Org 1"}], [])
+    )
+    client.get_organisation = MagicMock(
+        return_value={"uuid": "o2", "name": "Org 2"}
+    )
+
+    applications, organisations = client.get_applications_with_organisations()
+
+    assert [application["uuid"] for application in applications] == [
+        "a1",
+        "a2",
+        "a3",
+    ]
+    assert organisations["o1"]["name"] == "Org 1"
+    assert organisations["o2"]["name"] == "Org 2"
+    # only organisations missing from the listing are fetched one by one
+    client.get_organisation.assert_called_once_with("o2")
+
+
+def make_store_client(tmp_path):
+    store = MetadataStore(str(tmp_path / "store.sqlite3"))
+    client = make_client()
+    client.session = MagicMock(headers={})
+    client.get_store = lambda: store
+    return client, store
+
+
+def test_get_listing_reads_stored_listings(tmp_path):
+    client, store = make_store_client(tmp_path)
+    fetch = MagicMock(return_value=([{"uuid": "r1"}, {"uuid": "r2"}], []))
+
+    assert client.get_listing("regions", fetch, cached=True)[0] == [
+        {"uuid": "r1"},
+        {"uuid": "r2"},
+    ]
+    assert client.get_listing("regions", fetch, cached=True) == (
+        [{"uuid": "r1"}, {"uuid": "r2"}],
+        [],
+    )
+    assert client.get_listing(
+        "regions", fetch, limit_results=1, cached=True
+    ) == (
+        [{"uuid": "r1"}],
+        [messages.RESULTS_LIMITED.format(count=2, limit=1)],
+    )
+    assert fetch.call_count == 1
+
+    client.get_listing("regions", fetch)
+    assert fetch.call_count == 2
+
+
+def test_get_listing_does_not_store_truncated_listings(tmp_path):
+    client, store = make_store_client(tmp_path)
+    fetch = MagicMock(return_value=([{"uuid": "r1"}], []))
+
+    client.get_listing("regions", fetch, limit_results=1)
+
+    assert store.get("regions") is None
+
+
+def test_sync_deployments_is_incremental(tmp_path, monkeypatch):
+    client, store = make_store_client(tmp_path)
+    store.replace(
+        "deployments",
+        [
+            {"uuid": "d2", "ended_at": None},
+            {"uuid": "d1", "ended_at": "2025-01-01"},
+        ],
+        application="a1",
+    )
+    listing = [
+        {"uuid": "d3", "ended_at": None},
+        {"uuid": "d2", "ended_at": "2025-01-03"},
+        {"uuid": "d1", "ended_at": "2025-01-01"},
+        {"uuid": "d0", "ended_at": "2024-12-01"},
+    ]
+    consumed = []
+
+    def iter_deployments(*args, **kwargs):
+        for deployment in listing:
+            consumed.append(deployment["uuid"])
+            yield deployment
+
+    monkeypatch.setattr(
+        cloud, "iter_json_response_request_paginate", iter_deployments
+    )
+
+    assert client.sync_deployments("a1") == 2
+    assert consumed == ["d3", "d2", "d1"]
+    assert store.get("deployments", application="a1") == listing[:3]
+
+
+def test_sync_metadata_store_shares_a_memory_resolver(tmp_path):
+    client, store = make_store_client(tmp_path)
+    client.get_regions = MagicMock()
+    client.get_applications_with_organisations = MagicMock(
+        return_value=(
+            [{"uuid": "a1", "slug": "one"}, {"uuid": "a2", "slug": "two"}],
+            {},
+        )
+    )
+    client.get_environment_resolver = MagicMock()
+    client.sync_application = MagicMock(
+        return_value={
+            "environments": 1,
+            "service_instances": 0,
+            "deployments": 0,
+        }
+    )
+
+    assert client.sync_metadata_store()["environments"] == 2
+
+    resolvers = {
+        call[1]["resolver"] for call in client.sync_application.call_args_list
+    }
+    assert len(resolvers) == 1
+    # the environments of all applications are not cached in the project
+    assert resolvers.pop().path is None
+    client.get_environment_resolver.assert_not_called()
+
+
+def test_start_deployment_forgets_stored_deployments(tmp_path):
+    client, store = make_store_client(tmp_path)
+    store.replace("deployments", [{"uuid": "d1"}], application="a1")
+    client.get_environment_resolver = MagicMock()
+    client.get_environment_resolver().get_environment.return_value = {
+        "uuid": "e1"
+    }
+    client.get_deployment_by_application = MagicMock(side_effect=IndexError)
+    client.deploy_project = MagicMock(return_value={"uuid": "d2"})
+
+    assert client.start_deployment("a1", "live", "AUTO") == (
+        {"uuid": "d2"},
+        False,
+    )
+    # listed again with the new deployment
+    assert store.get("deployments", application="a1") is None
+
+
+def test_get_listing_revalidates_stale_listings(tmp_path, monkeypatch):
+    client, store = make_store_client(tmp_path)
+    client.revalidations = []
+    store.replace("regions", [{"uuid": "r1"}])
+    synced_at = store.get_synced_at("regions")
+    fetch = MagicMock(return_value=([{"uuid": "r2"}], []))
+
+    assert client.get_listing("regions", fetch, max_staleness=60) == (
+        [{"uuid": "r1"}],
+        [],
+    )
+    ((stored_at, task),) = client.revalidations
+    assert stored_at == synced_at
+    assert task.join(deadline=time.monotonic() + 5)
+    assert store.get("regions") == [{"uuid": "r2"}]
+
+    # too old to be printed
+    monkeypatch.setattr(time, "time", lambda: stored_at + 3600)
+    fetch.return_value = ([{"uuid": "r3"}], [])
+    assert client.get_listing("regions", fetch, max_staleness=60) == (
+        [{"uuid": "r3"}],
+        [],
+    )
+    assert len(client.revalidations) == 1
+
+
+def test_show_log_archive_resumes(tmp_path, monkeypatch, capsys):
+    client = make_client()
+    resolver = MagicMock()
+    resolver.get_environment.return_value = {"uuid": "e1", "deployed": True}
+    client.get_environment_resolver = lambda: resolver
+    archive = LogArchive(str(tmp_path / "e1.sqlite3"))
+    archive.append([], cursor="https://logs/?page=2")
+    monkeypatch.setattr(archive, "close", MagicMock())
+    client.get_log_archive = lambda *args: archive
+    entry = {
+        "timestamp": "2024-03-01T10:00:00Z",
+        "service": "web",
+        "message": "started",
+    }
+    pages = {
+        "https://logs/?page=2": {
+            "results": [entry],
+            "next": "https://logs/?page=3",
+        },
+        "https://logs/?page=3": {
+            "results": [],
+            "next": "https://logs/?page=3",
+        },
+    }
+    client.session = MagicMock()
+    client.session.request.side_effect = lambda url, method: MagicMock(
+        ok=True, json=lambda: pages[url]
+    )
+    log_request = MagicMock()
+    monkeypatch.setattr(cloud.api_requests, "LogRequest", log_request)
+
+    client.show_log("a1", "test", archive=True)
+
+    # the initial page is only requested when there is nothing to resume
+    log_request.assert_not_called()
+    assert "started" in capsys.readouterr().out
+    assert archive.get_cursor() == "https://logs/?page=3"
+    assert [e["message"] for e in archive.search("started")] == ["started"]
+    archive.close.assert_called_once_with()
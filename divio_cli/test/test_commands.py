@@ -8,7 +8,7 @@ import pytest
 from click.testing import CliRunner
 
 from divio_cli import cli
-from divio_cli.cloud import WritableNetRC
+from divio_cli.config import WritableNetRC
 
 
 NOI = "--noinput"
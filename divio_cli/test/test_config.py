@@ -0,0 +1,87 @@
+import os
+import stat
+
+import pytest
+
+from divio_cli import config, settings
+
+
+@pytest.fixture
+def netrc_path(tmp_path, monkeypatch):
+    path = tmp_path / "netrc"
+    path.write_text("machine control.divio.com\n\tpassword <token>\n")
+    os.chmod(path, 0o600)
+    monkeypatch.setenv("NETRC_PATH", str(path))
+    monkeypatch.setattr(config, "_netrc_cache", {})
+    return path
+
+
+def test_get_netrc_is_memoized(netrc_path):
+    netrc = config.get_netrc()
+
+    assert netrc.get_token("control.divio.com") == "<token>"
+    assert netrc.get_token("control.example.com") is None
+    assert config.get_netrc() is netrc
+
+
+def test_get_netrc_is_invalidated_on_change(netrc_path):
+    netrc = config.get_netrc()
+
+    netrc_path.write_text(
+        "machine control.divio.com\n\tpassword <new-token>\n"
+    )
+    os.utime(netrc_path, ns=(0, 0))
+
+    new_netrc = config.get_netrc()
+    assert new_netrc is not netrc
+    assert new_netrc.get_token("control.divio.com") == "<new-token>"
+
+
+def test_write_is_atomic_and_keeps_cache(netrc_path):
+    netrc = config.get_netrc()
+    netrc.add("api.divio.com", "jane", None, "<token>")
+
+    netrc.write()
+
+    assert config.get_netrc() is netrc
+    assert stat.S_IMODE(os.stat(netrc_path).st_mode) == 0o600
+    assert os.listdir(netrc_path.parent) == ["netrc"]
+    assert "machine api.divio.com" in netrc_path.read_text()
+
+
+def test_write_keeps_symlink_and_mode(tmp_path, monkeypatch):
+    target = tmp_path / "dotfiles" / "netrc"
+    target.parent.mkdir()
+    target.write_text("machine control.divio.com\n\tpassword <token>\n")
+    os.chmod(target, 0o640)
+    link = tmp_path / "netrc"
+    link.symlink_to(target)
+    monkeypatch.setenv("NETRC_PATH", str(link))
+    monkeypatch.setattr(config, "_netrc_cache", {})
+
+    netrc = config.get_netrc()
+    netrc.add("api.divio.com", "jane", None, "<token>")
+    netrc.write()
+
+    assert link.is_symlink()
+    assert "machine api.divio.com" in target.read_text()
+    assert stat.S_IMODE(os.stat(target).st_mode) == 0o640
+    assert sorted(os.listdir(target.parent)) == ["netrc"]
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (8, 8),
+        ("8", 8),
+        (0, 1),
+        ("many", settings.DEFAULT_DOWNLOAD_CONNECTIONS),
+        (None, settings.DEFAULT_DOWNLOAD_CONNECTIONS),
+    ],
+)
+def test_get_download_connections(monkeypatch, value, expected):
+    monkeypatch.setattr(config.Config, "read", lambda self: None)
+    conf = config.Config()
+    conf.config = {"download-connections": value}
+
+    assert conf.get_download_connections() == expected
@@ -0,0 +1,146 @@
+import itertools
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+
+from divio_cli import deploy
+from divio_cli.exceptions import DivioException, EnvironmentDoesNotExist
+
+
+APP_UUID = "0e8a4b6a-1d2c-4c5b-9a4e-8f1b2c3d4e5f"
+
+
+def test_parse_targets():
+    targets = deploy.parse_targets(
+        [
+            "# release 42\n",
+            "shop live\n",
+            "\n",
+            f"{APP_UUID}  # test by default\n",
+            "shop live\n",
+            "1234 demo",
+        ]
+    )
+
+    assert [(t.application, t.environment) for t in targets] == [
+        ("shop", "live"),
+        (APP_UUID, "test"),
+        ("1234", "demo"),
+    ]
+
+
+def test_parse_targets_invalid_line():
+    with pytest.raises(DivioException):
+        deploy.parse_targets(["shop live now"])
+
+
+class FakeClient:
+    """Deployments take three checks, those of `failing` fail."""
+
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.uuids = itertools.count()
+        self.checks = {}
+        self.running = 0
+        self.max_running = 0
+        self.get_application_uuid_for_slug = MagicMock(
+            side_effect=lambda slug: f"uuid-{slug}"
+        )
+
+    def start_deployment(self, application_uuid, environment, build_mode):
+        if environment == "unknown":
+            raise EnvironmentDoesNotExist(environment)
+        if environment == "offline":
+            raise requests.ConnectionError("Connection refused")
+        uuid = f"{application_uuid}-{environment}-{next(self.uuids)}"
+        self.checks[uuid] = 0
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        return {"uuid": uuid, "ended_at": None}, False
+
+    def get_deployment_by_uuid(self, uuid):
+        self.checks[uuid] += 1
+        ended = self.checks[uuid] >= 3
+        if ended:
+            self.running -= 1
+        return {
+            "uuid": uuid,
+            "status": "working",
+            "percent": 30 * self.checks[uuid],
+            "ended_at": "2026-01-01T00:00:00Z" if ended else None,
+            "success": not uuid.startswith(self.failing),
+        }
+
+
+def test_scheduler_limits_concurrency():
+    client = FakeClient()
+    targets = deploy.parse_targets(f"app{i} live" for i in range(5))
+    progress = []
+
+    deploy.DeploymentScheduler(
+        client,
+        targets,
+        concurrency=2,
+        on_progress=lambda targets: progress.append(
+            [t.status for t in targets]
+        ),
+    ).run()
+
+    assert client.max_running == 2
+    assert not any(target.failed for target in targets)
+    assert progress[0] == ["starting"] * 2 + ["waiting"] * 3
+    assert progress[-1] == ["done"] * 5
+    # each application slug is resolved once
+    assert client.get_application_uuid_for_slug.call_count == 5
+
+
+def test_scheduler_reports_failures():
+    client = FakeClient(failing=("uuid-broken",))
+    targets = deploy.parse_targets(
+        ["shop live", "broken live", "shop unknown"]
+    )
+
+    deploy.DeploymentScheduler(client, targets).run()
+
+    assert [t.status for t in targets] == ["done", "failed", "error"]
+    summary = deploy.get_summary(targets)
+    assert summary.startswith("2 of 3 deployments failed:")
+    assert "divio app deploy-log live --remote-id uuid-broken" in summary
+    assert "shop unknown: Environment with the name 'unknown'" in summary
+
+
+def test_scheduler_timeout():
+    targets = deploy.parse_targets(["shop live", "blog live"])
+
+    deploy.DeploymentScheduler(
+        FakeClient(), targets, concurrency=1, timeout=0
+    ).run()
+
+    # each deployment times out on its own, once it was started
+    assert [t.error for t in targets] == ["timed out"] * 2
+    assert all(t.deployment for t in targets)
+
+
+def test_scheduler_survives_unexpected_errors():
+    targets = deploy.parse_targets(["shop offline", "shop live"])
+
+    deploy.DeploymentScheduler(FakeClient(), targets).run()
+
+    assert [t.status for t in targets] == ["error", "done"]
+    assert targets[0].error == "Connection refused"
+
+
+def test_progress_table_logs_changes(capsys):
+    target = deploy.Target("shop", "live")
+    table = deploy.ProgressTable(interactive=False)
+
+    table([target])
+    table([target])
+    target.deployment = {"uuid": "d1", "status": "building", "percent": 10}
+    table([target])
+
+    assert capsys.readouterr().out.splitlines() == [
+        "shop live: waiting (0%)",
+        "shop live: building (10%)",
+    ]
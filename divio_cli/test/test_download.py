@@ -0,0 +1,359 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+
+import pytest
+
+from divio_cli import download
+from divio_cli.exceptions import DivioException
+
+
+def test_save_response(tmp_path, make_response):
+    body = os.urandom(3 * download.MIN_BUFFER_SIZE + 10)
+    response = make_response(body, {"Content-Length": str(len(body))})
+    progress = []
+
+    stats = download.save_response(
+        response, str(tmp_path / "data.dump"), on_progress=progress.append
+    )
+
+    assert (tmp_path / "data.dump").read_bytes() == body
+    assert stats.size == len(body)
+    assert stats.sha256 == hashlib.sha256(body).hexdigest()
+    # the buffer doubles while it is filled
+    assert progress == [
+        download.MIN_BUFFER_SIZE,
+        3 * download.MIN_BUFFER_SIZE,
+        3 * download.MIN_BUFFER_SIZE + 10,
+    ]
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        # the body is shorter than announced
+        {"Content-Length": "1000"},
+        {"Content-MD5": "AAAAAAAAAAAAAAAAAAAAAA=="},
+        {"x-goog-hash": "crc32c=AAAAAA==, md5=AAAAAAAAAAAAAAAAAAAAAA=="},
+    ],
+)
+def test_save_response_rejects_corrupted_body(
+    tmp_path, make_response, headers
+):
+    response = make_response(b"SELECT 1;\n" * 10, headers)
+
+    with pytest.raises(download.DownloadCorrupted):
+        download.save_response(response, str(tmp_path / "data.dump"))
+
+    assert not (tmp_path / "data.dump").exists()
+
+
+def test_save_response_checks_md5(tmp_path, make_response):
+    body = b"SELECT 1;\n" * 10
+    etag = f'"{hashlib.md5(body).hexdigest()}"'
+    response = make_response(body, {"ETag": etag, "x-amz-request-id": "42"})
+
+    stats = download.save_response(response, str(tmp_path / "data.dump"))
+
+    assert stats.size == len(body)
+
+
+@pytest.mark.parametrize(
+    ("headers", "checked"),
+    [
+        ({"x-amz-request-id": "42"}, True),
+        (
+            {
+                "x-amz-request-id": "42",
+                "x-amz-server-side-encryption": "aws:kms",
+            },
+            False,
+        ),
+        (
+            {
+                "x-amz-request-id": "42",
+                "x-amz-server-side-encryption-customer-algorithm": "AES256",
+            },
+            False,
+        ),
+        # not S3, the ETag is opaque
+        ({}, False),
+    ],
+)
+def test_save_response_warns_on_etag_mismatch(
+    tmp_path, capsys, make_response, headers, checked
+):
+    body = b"SELECT 1;\n" * 10
+    headers = dict(headers, ETag='"0123456789abcdef0123456789abcdef"')
+    response = make_response(body, headers)
+
+    stats = download.save_response(response, str(tmp_path / "data.dump"))
+
+    # the ETag may not be an MD5, the download is kept
+    assert (tmp_path / "data.dump").read_bytes() == body
+    assert stats.size == len(body)
+    assert ("differs from the ETag" in capsys.readouterr().err) == checked
+
+
+def test_save_response_decodes_content(tmp_path, make_response):
+    body = b"SELECT 1;\n" * 1000
+    response = make_response(gzip.compress(body), {"Content-Encoding": "gzip"})
+
+    stats = download.save_response(response, str(tmp_path / "data.tar.gz"))
+
+    assert (tmp_path / "data.tar.gz").read_bytes() == body
+    assert stats.size == len(body)
+
+
+def test_download_stats():
+    stats = download.DownloadStats("data.dump", 10 * 1024 * 1024, 2)
+
+    assert stats.throughput == 5 * 1024 * 1024
+    assert str(stats) == "10.0 MB at 5.0 MB/s"
+    assert download.DownloadStats("data.dump", 0, 0).throughput == 0
+
+
+class RangeSession:
+    """Serves `body` like a storage accepting ranges, or ignoring them."""
+
+    def __init__(self, make_response, body, ranges=True, etag=None):
+        self.make_response = make_response
+        self.body = body
+        self.ranges = ranges
+        self.etag = etag
+        # the length after which the next response breaks off
+        self.truncate = None
+        self.requested = []
+
+    def get(self, url, headers=None, stream=False):
+        headers = headers or {}
+        requested = headers.get("Range")
+        self.requested.append(requested)
+        if_range = headers.get("If-Range")
+        if requested and self.ranges and if_range in (None, self.etag):
+            start, end = map(int, requested[len("bytes=") :].split("-"))
+            body, status_code = self.body[start : end + 1], 206
+        else:
+            body, status_code = self.body, 200
+        if self.truncate is not None:
+            body, self.truncate = body[: self.truncate], None
+        response = self.make_response(
+            body,
+            {"Content-Length": str(len(self.body)), "Accept-Ranges": "bytes"},
+        )
+        if self.etag:
+            response.headers["ETag"] = self.etag
+        response.status_code = status_code
+        return response
+
+
+@pytest.fixture
+def range_session(make_response, monkeypatch):
+    """Return a function serving a body as the storage of downloads."""
+
+    def range_session(body, **kwargs):
+        session = RangeSession(make_response, body, **kwargs)
+        monkeypatch.setattr(download.transport, "get_session", lambda: session)
+        return session
+
+    return range_session
+
+
+def test_get_segments():
+    assert download.get_segments(10, 3, segment_size=4) == [
+        (0, 4),
+        (4, 8),
+        (8, 10),
+    ]
+    # small files are not split
+    assert download.get_segments(1000, 4) == [(0, 1000)]
+    # large files are downloaded in order, by ranges close to each other
+    segments = download.get_segments(10 * download.MAX_SEGMENT_SIZE, 4)
+    assert len(segments) == 10
+    assert segments[1] == (
+        download.MAX_SEGMENT_SIZE,
+        2 * download.MAX_SEGMENT_SIZE,
+    )
+
+
+def test_segment_queue():
+    queue = download.SegmentQueue([(0, 1), (1, 2), (2, 3), (3, 4)], 2)
+    stop = threading.Event()
+
+    assert queue.get(stop) == (0, (0, 1))
+    assert queue.get(stop) == (1, (1, 2))
+    queue.done(1)
+    # the first segment is not done, the next one would be too far ahead
+    items = []
+    thread = threading.Thread(target=lambda: items.append(queue.get(stop)))
+    thread.start()
+    thread.join(0.1)
+    assert items == []
+    queue.done(0)
+    thread.join()
+    assert items == [(2, (2, 3))]
+    assert queue.get(stop) == (3, (3, 4))
+    assert queue.get(stop) is None
+
+
+def test_ordered_digest(tmp_path):
+    body = os.urandom(3 * download.MIN_BUFFER_SIZE)
+    path = tmp_path / "data.dump"
+    path.write_bytes(body)
+    digest = download.OrderedDigest(str(path))
+    third = download.MIN_BUFFER_SIZE
+
+    # written out of order, only the first part is hashed on the way
+    digest.update_at(body[2 * third :], 2 * third)
+    digest.update_at(body[:third], 0)
+    assert digest.size == third
+    digest.catch_up(2 * third)
+    digest.update_at(body[2 * third :], 2 * third)
+    digest.catch_up(len(body))
+    digest.close()
+
+    assert digest.size == len(body)
+    assert digest.sha256.hexdigest() == hashlib.sha256(body).hexdigest()
+
+
+@pytest.mark.parametrize("ranges", [True, False])
+def test_download_by_ranges(tmp_path, range_session, ranges):
+    body = os.urandom(10 * download.MIN_BUFFER_SIZE + 5)
+    session = range_session(body, ranges=ranges)
+    progress = []
+
+    stats = download.download(
+        "https://storage/backup",
+        directory=str(tmp_path),
+        on_progress=progress.append,
+        connections=3,
+        segment_size=4 * download.MIN_BUFFER_SIZE,
+    )
+
+    assert (tmp_path / "data.dump").read_bytes() == body
+    assert stats.size == len(body)
+    assert progress[-1] == len(body)
+    if ranges:
+        assert stats.connections == 3
+        assert sorted(session.requested[1:]) == [
+            f"bytes={4 * download.MIN_BUFFER_SIZE}-"
+            f"{8 * download.MIN_BUFFER_SIZE - 1}",
+            f"bytes={8 * download.MIN_BUFFER_SIZE}-{len(body) - 1}",
+        ]
+    else:
+        # the body is downloaded again, in one piece
+        assert stats.connections == 1
+        assert session.requested[-1] is None
+
+
+def test_download_connections_are_capped_by_pool(
+    tmp_path, monkeypatch, range_session
+):
+    body = os.urandom(4 * download.MIN_BUFFER_SIZE)
+    range_session(body)
+    monkeypatch.setattr(download.transport, "get_pool_size", lambda: 2)
+
+    stats = download.download(
+        "https://storage/backup",
+        directory=str(tmp_path),
+        connections=4,
+        segment_size=download.MIN_BUFFER_SIZE,
+    )
+
+    assert (tmp_path / "data.dump").read_bytes() == body
+    assert stats.connections == 2
+
+
+@pytest.mark.parametrize("ranges", [True, False])
+def test_download_cancelled(tmp_path, range_session, ranges):
+    body = os.urandom(3 * download.MIN_BUFFER_SIZE)
+    range_session(body, ranges=ranges, etag='"v1"')
+    cancel = threading.Event()
+    cancel.set()
+
+    with pytest.raises(download.DownloadCancelled):
+        download.download(
+            "https://storage/backup",
+            str(tmp_path),
+            connections=2,
+            segment_size=download.MIN_BUFFER_SIZE,
+            cancel=cancel,
+        )
+
+    assert not (tmp_path / "data.dump").exists()
+    # what was received is kept to resume the download
+    assert (tmp_path / "data.dump.part.json").exists() == ranges
+
+
+@pytest.mark.parametrize("changed", [False, True])
+def test_download_resumes(tmp_path, range_session, changed):
+    body = os.urandom(3 * download.MIN_BUFFER_SIZE)
+    session = range_session(body, etag='"v1"')
+    session.truncate = download.MIN_BUFFER_SIZE + 10
+
+    with pytest.raises(DivioException):
+        download.download("https://storage/1", str(tmp_path), connections=1)
+
+    state = json.loads((tmp_path / "data.dump.part.json").read_text())
+    assert state["received"] == [[0, download.MIN_BUFFER_SIZE + 10]]
+    assert not (tmp_path / "data.dump").exists()
+
+    if changed:
+        session.etag = '"v2"'
+    # download URLs are signed anew for every download
+    stats = download.download(
+        "https://storage/2", str(tmp_path), connections=1
+    )
+
+    assert (tmp_path / "data.dump").read_bytes() == body
+    assert not (tmp_path / "data.dump.part.json").exists()
+    if changed:
+        assert stats.resumed == 0
+        assert session.requested[-1] is None
+    else:
+        assert stats.resumed == download.MIN_BUFFER_SIZE + 10
+        assert session.requested[-1] == (
+            f"bytes={download.MIN_BUFFER_SIZE + 10}-{len(body) - 1}"
+        )
+
+
+def test_download_records_digest(tmp_path, range_session):
+    body = os.urandom(10 * download.MIN_BUFFER_SIZE)
+    range_session(body, etag=f'"{hashlib.md5(body).hexdigest()}"')
+
+    stats = download.download(
+        "https://storage/backup",
+        str(tmp_path),
+        connections=3,
+        segment_size=2 * download.MIN_BUFFER_SIZE,
+    )
+
+    assert stats.sha256 == hashlib.sha256(body).hexdigest()
+    assert (tmp_path / "data.dump.sha256").read_text() == (
+        f"{stats.sha256}  data.dump\n"
+    )
+    assert download.verify_file(stats.path)
+
+    with open(stats.path, "r+b") as f:
+        f.write(b"corrupted")
+    with pytest.raises(download.DownloadCorrupted):
+        download.verify_file(stats.path)
+    download.remove(stats.path)
+    assert not download.verify_file(stats.path)
+    assert not os.listdir(tmp_path)
+
+
+def test_stream(range_session):
+    body = b"-- MySQL dump\n" + os.urandom(3 * download.MIN_BUFFER_SIZE)
+    range_session(body)
+    output = io.BytesIO()
+
+    with download.stream("https://storage/backup") as stream:
+        assert stream.head.startswith(b"-- MySQL dump\n")
+        stats = stream.copy(output)
+
+    assert output.getvalue() == body
+    assert stats.sha256 == hashlib.sha256(body).hexdigest()
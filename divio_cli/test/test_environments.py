@@ -0,0 +1,129 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+
+from divio_cli import api_requests
+from divio_cli.environments import EnvironmentResolver
+from divio_cli.exceptions import EnvironmentDoesNotExist
+
+
+def make_response(environments, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps({"results": environments}).encode()
+    return response
+
+
+def make_environment(uuid, slug, deployed=True):
+    return {
+        "uuid": uuid,
+        "slug": slug,
+        "branch": "main",
+        "last_finished_deployment": {"uuid": "d1"} if deployed else None,
+    }
+
+
+@pytest.fixture
+def session():
+    session = MagicMock()
+    session.host = "https://control.divio.com"
+    session.headers = {}
+    session.cache = None
+    session.request.return_value = make_response(
+        [make_environment("e1", "test"), make_environment("e2", "live")]
+    )
+    return session
+
+
+@pytest.fixture
+def resolver(session, tmp_path):
+    return EnvironmentResolver(session, directory=str(tmp_path))
+
+
+def test_resolver_stores_environments(session, resolver, tmp_path):
+    assert resolver.get_environment("a1", "live")["uuid"] == "e2"
+
+    other = EnvironmentResolver(session, directory=str(tmp_path))
+    assert other.get_slug_mapping("a1") == {"e1": "test", "e2": "live"}
+    assert session.request.call_count == 1
+
+
+def test_resolver_refreshes_expired_environments(session, tmp_path):
+    resolver = EnvironmentResolver(session, directory=str(tmp_path), ttl=-1)
+
+    resolver.get_environment("a1", "live")
+    resolver.get_environment("a1", "live")
+
+    assert session.request.call_count == 2
+
+
+def test_resolver_refreshes_unknown_environments_once(
+    session, resolver, tmp_path
+):
+    resolver.get_environment("a1", "live")
+    # environments fetched by this process are not fetched again
+    with pytest.raises(EnvironmentDoesNotExist):
+        resolver.get_environment("a1", "demo")
+    assert session.request.call_count == 1
+
+    other = EnvironmentResolver(session, directory=str(tmp_path))
+    with pytest.raises(EnvironmentDoesNotExist):
+        other.get_environment("a1", "demo")
+    with pytest.raises(EnvironmentDoesNotExist):
+        other.get_environment("a1", "demo")
+
+    assert session.request.call_count == 2
+
+
+def test_resolver_refreshes_environments_not_yet_deployed(session, resolver):
+    session.request.return_value = make_response(
+        [make_environment("e1", "test", deployed=False)]
+    )
+    assert not resolver.get_environment("a1", "test")["deployed"]
+
+    resolver._fetched.clear()
+    session.request.return_value = make_response(
+        [make_environment("e1", "test")]
+    )
+    assert resolver.get_environment("a1", "test", deployed=True)["deployed"]
+
+
+def test_resolver_keeps_ssh_endpoint(session, resolver):
+    endpoint = {"user": "jane", "host": "ssh.example.com", "port": 22}
+    resolver.set_ssh_endpoint("a1", "e2", endpoint)
+
+    resolver._fetched.clear()
+    with pytest.raises(KeyError):
+        resolver.get_slug("a1", "e3")
+
+    assert session.request.call_count == 2
+    assert resolver.get_environment("a1", "live")["ssh_endpoint"] == endpoint
+
+
+def test_resolver_invalidates_on_not_found(session, resolver, monkeypatch):
+    monkeypatch.setattr(
+        api_requests.APIRequest, "get_login", lambda self: False
+    )
+    resolver.get_environment("a1", "live")
+
+    session.request.return_value = make_response([], status_code=404)
+    with pytest.raises(api_requests.APIRequestError) as excinfo:
+        with resolver.invalidate_on_not_found("a1"):
+            api_requests.EnvironmentRequest(
+                session, url_kwargs={"environment_uuid": "e2"}
+            )()
+
+    assert excinfo.value.status_code == 404
+    assert "a1" not in resolver.load()
+
+
+def test_resolver_without_project_is_in_memory(session):
+    resolver = EnvironmentResolver(session)
+
+    resolver.get_environment("a1", "live")
+    resolver.get_environment("a1", "test")
+
+    assert resolver.path is None
+    assert session.request.call_count == 1
@@ -0,0 +1,127 @@
+import os
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+
+from divio_cli import api_requests
+from divio_cli.http_cache import HTTPCache, get_identity
+
+
+HOST = "https://control.divio.com"
+
+
+def make_response(status_code=200, content=b'{"results": []}', headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = f"{HOST}/apps/v3/regions/"
+    response.headers.update(headers or {})
+    response._content = content
+    return response
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return HTTPCache(directory=str(tmp_path), max_size=1024 * 1024)
+
+
+@pytest.fixture
+def session(cache):
+    session = MagicMock()
+    session.host = HOST
+    session.headers = {"Authorization": "Token foo"}
+    session.cache = cache
+    return session
+
+
+def test_cache_serves_fresh_entries(session):
+    session.request.return_value = make_response(headers={"ETag": '"abc"'})
+
+    assert api_requests.ListRegionsRequest(session)() == {"results": []}
+    assert api_requests.ListRegionsRequest(session)() == {"results": []}
+
+    assert session.request.call_count == 1
+
+
+def test_cache_revalidates_expired_entries(session, monkeypatch):
+    session.request.return_value = make_response(
+        headers={"ETag": '"abc"', "Last-Modified": "Wed, 01 Jan 2025"}
+    )
+    api_requests.ListRegionsRequest(session)()
+
+    monkeypatch.setattr(api_requests.ListRegionsRequest, "cache_ttl", 0)
+    session.request.return_value = make_response(status_code=304, content=b"")
+
+    assert api_requests.ListRegionsRequest(session)() == {"results": []}
+
+    headers = session.request.call_args.kwargs["headers"]
+    assert headers["If-None-Match"] == '"abc"'
+    assert headers["If-Modified-Since"] == "Wed, 01 Jan 2025"
+
+
+def test_cache_is_keyed_by_identity(session):
+    session.request.return_value = make_response()
+    api_requests.ListRegionsRequest(session)()
+
+    session.headers = {"Authorization": "Token bar"}
+    api_requests.ListRegionsRequest(session)()
+
+    assert session.request.call_count == 2
+
+
+def test_cache_ignores_requests_without_ttl(session):
+    session.request.return_value = make_response()
+
+    api_requests.EnvironmentsListRequest(session)()
+    api_requests.EnvironmentsListRequest(session)()
+
+    assert session.request.call_count == 2
+
+
+def test_cache_does_not_store_errors(session, monkeypatch):
+    monkeypatch.setattr(
+        api_requests.APIRequest, "get_login", lambda self: False
+    )
+    session.request.return_value = make_response(status_code=500)
+
+    with pytest.raises(api_requests.APIRequestError):
+        api_requests.ListRegionsRequest(session)()
+
+    assert os.listdir(session.cache.directory) == []
+
+
+def test_cache_evicts_least_recently_used(cache):
+    keys = [cache.get_key("GET", f"{HOST}/{i}/") for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.set(key, make_response(content=b"x" * 100))
+        path = cache.get_path(key)
+        os.utime(path, (i, i))
+
+    # using an entry marks it as recently used
+    cache.get(keys[0])
+    cache.max_size = sum(
+        os.path.getsize(cache.get_path(key)) for key in (keys[0], keys[2])
+    )
+    cache.evict()
+
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+
+
+def test_cache_drops_corrupt_entries(cache):
+    key = cache.get_key("GET", f"{HOST}/")
+    os.makedirs(cache.directory, exist_ok=True)
+    with open(cache.get_path(key), "w") as fh:
+        fh.write("{")
+
+    assert cache.get(key) is None
+    assert not os.path.exists(cache.get_path(key))
+
+
+def test_get_identity():
+    assert get_identity({}) == ""
+    assert get_identity({"Authorization": "Token foo"}) != get_identity(
+        {"Authorization": "Token foo", "X-Sudo": "make me a sandwich"}
+    )
+    assert "foo" not in get_identity({"Authorization": "Token foo"})
@@ -1,3 +1,4 @@
+import sys
 from datetime import datetime, timedelta, timezone
 from unittest.mock import MagicMock, Mock, mock_open, patch
 
@@ -183,14 +184,20 @@ def test_upload_backup_wrong_handler():
 
 def test__upload_backup_aws(monkeypatch):
     boto3 = MagicMock()
-    monkeypatch.setattr("divio_cli.localdev.backups.boto3", boto3)
+    botocore_config = MagicMock()
+    BotoConfig = botocore_config.Config
+    monkeypatch.setitem(sys.modules, "boto3", boto3)
+    monkeypatch.setitem(sys.modules, "botocore.config", botocore_config)
+    monkeypatch.setattr("divio_cli.transport.get_pool_size", lambda: 16)
 
     backups._upload_backup_aws(AWS_PARAMS["upload_parameters"], "file")
+    BotoConfig.assert_called_with(max_pool_connections=16, tcp_keepalive=True)
     boto3.client.assert_called_with(
         "s3",
         aws_access_key_id="aws_access_key_id",
         aws_secret_access_key="aws_secret_access_key",
         aws_session_token="aws_session_token",
+        config=BotoConfig.return_value,
     )
     boto3.client.return_value.upload_file.assert_called_with(
         "file", Bucket="bucket", Key="key"
@@ -198,15 +205,20 @@ def test__upload_backup_aws(monkeypatch):
 
 
 def test__upload_backup_azure(monkeypatch):
-    BlobClient = MagicMock()
-    monkeypatch.setattr("divio_cli.localdev.backups.BlobClient", BlobClient)
+    azure_storage_blob = MagicMock()
+    BlobClient = azure_storage_blob.BlobClient
+    session = MagicMock()
+    monkeypatch.setitem(sys.modules, "azure.storage.blob", azure_storage_blob)
+    monkeypatch.setattr("divio_cli.transport.get_session", lambda: session)
 
     with patch("builtins.open", mock_open()) as mock_file:
         backups._upload_backup_azure(AZURE_PARAMS["upload_parameters"], "file")
 
     mock_file.assert_called_with("file", "rb")
     BlobClient.from_blob_url.assert_called_with(
-        blob_url="https://account.core.windows.net/container/key"
+        blob_url="https://account.core.windows.net/container/key",
+        session=session,
+        session_owner=False,
     )
     BlobClient.from_blob_url.return_value.upload_blob.assert_called_with(
         mock_file.return_value, overwrite=True, max_concurrency=10
@@ -222,9 +234,9 @@ def test__upload_backup_azure(monkeypatch):
     ],
 )
 def test__upload_backup_exoscale(monkeypatch, file_size, max_size, ok):
-    requests = MagicMock()
+    session = MagicMock()
     os = MagicMock()
-    monkeypatch.setattr("divio_cli.localdev.backups.requests", requests)
+    monkeypatch.setattr("divio_cli.transport.get_session", lambda: session)
     monkeypatch.setattr("divio_cli.localdev.backups.os", os)
     os.stat().st_size = file_size
 
@@ -236,7 +248,7 @@ def test__upload_backup_exoscale(monkeypatch, file_size, max_size, ok):
             backups._upload_backup_exoscale(upload_params, "file")
 
         mock_file.assert_called_with("file", "rb")
-        requests.put.assert_called_once_with(
+        session.put.assert_called_once_with(
             upload_params["url"], data=mock_file()
         )
     else:
@@ -363,3 +375,35 @@ def test__wait_for_backup_to_complete_no_si(si_backups):
             client, "<uuid>", message="message"
         )
     assert "No service instance backup was found." in str(excinfo.value)
+
+
+@patch.object(backups, "download_file", return_value="/tmp/data.dump")
+@patch.object(backups, "create_backup_download_url", return_value="https://dl")
+@patch.object(backups, "create_backup", return_value=("bk", "si_bk"))
+def test_prefetch_backup(create_backup, create_url, download_file, tmp_path):
+    client = MagicMock()
+    client.get_service_instance.return_value = {
+        "uuid": "si_uuid",
+        "service_status": "READY",
+    }
+
+    path = backups.prefetch_backup(
+        client, "<app>", "test", backups.Type.DB, str(tmp_path / "db")
+    )
+
+    assert path == "/tmp/data.dump"
+    download_file.assert_called_once_with(
+        "https://dl", directory=str(tmp_path / "db"), cancel=None
+    )
+
+
+def test_prefetch_backup_ignores_errors(tmp_path):
+    client = MagicMock()
+    client.get_service_instance.side_effect = DivioException("no service")
+
+    assert (
+        backups.prefetch_backup(
+            client, "<app>", "test", backups.Type.MEDIA, str(tmp_path)
+        )
+        is None
+    )
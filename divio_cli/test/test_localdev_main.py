@@ -0,0 +1,102 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from divio_cli import download
+from divio_cli.exceptions import DivioException
+from divio_cli.localdev import main
+
+
+@pytest.mark.parametrize(
+    ("head", "db_type", "streamable"),
+    [
+        (b"PGDMP\x01\x0e\x00", "fsm-postgres", True),
+        (b"--\n-- PostgreSQL database dump\n--", "fsm-postgres", False),
+        (b"-- MySQL dump 10.13", "fsm-mysql", True),
+    ],
+)
+def test_is_streamable_dump(head, db_type, streamable):
+    assert main.is_streamable_dump(head, db_type) == streamable
+
+
+@pytest.mark.parametrize("exit_code", [0, 1])
+def test_stream_dump(tmp_path, monkeypatch, make_response, exit_code):
+    body = b"INSERT INTO t VALUES (1);\n" * 100000
+    target = tmp_path / "restored.sql"
+    commands = []
+    popen = subprocess.Popen
+
+    def fake_popen(command, **kwargs):
+        # a restore command writing what it reads to a file
+        commands.append(command)
+        script = (
+            "import shutil, sys\n"
+            f"if {exit_code}: sys.exit({exit_code})\n"
+            "shutil.copyfileobj(sys.stdin.buffer, open(sys.argv[1], 'wb'))"
+        )
+        return popen([sys.executable, "-c", script, str(target)], **kwargs)
+
+    monkeypatch.setattr(main.subprocess, "Popen", fake_popen)
+    importer = object.__new__(main.ImportRemoteDatabase)
+    stream = download.Stream(make_response(body))
+
+    if exit_code:
+        with pytest.raises(DivioException):
+            importer.stream_dump("db", "mysql db < /dev/stdin", stream)
+    else:
+        importer.stream_dump("db", "mysql db < /dev/stdin", stream)
+        assert target.read_bytes() == body
+
+    assert commands == [
+        [
+            "docker",
+            "exec",
+            "-i",
+            "db",
+            "/bin/bash",
+            "-c",
+            "mysql db < /dev/stdin",
+        ]
+    ]
+
+
+def test_stream_dump_kills_restore_if_download_fails(
+    monkeypatch, make_response
+):
+    body = b"INSERT INTO t VALUES (1);\n" * 100000
+    processes = []
+    popen = subprocess.Popen
+
+    def fake_popen(command, **kwargs):
+        # a restore command waiting for the end of its input
+        script = "import sys\nsys.stdin.buffer.read()"
+        processes.append(popen([sys.executable, "-c", script], **kwargs))
+        return processes[-1]
+
+    monkeypatch.setattr(main.subprocess, "Popen", fake_popen)
+    importer = object.__new__(main.ImportRemoteDatabase)
+    # the body is shorter than announced
+    response = make_response(body, {"Content-Length": str(2 * len(body))})
+
+    with pytest.raises(DivioException, match="partially restored"):
+        importer.stream_dump(
+            "db", "mysql db < /dev/stdin", download.Stream(response)
+        )
+
+    # killed before its input ended
+    assert processes[0].returncode != 0
+
+
+@pytest.mark.parametrize("received", [[], [[0, 10]]])
+def test_hint_resume(tmp_path, capsys, received):
+    state = {"url": "https://storage/backup", "size": 20, "received": received}
+    (tmp_path / "data.dump.part.json").write_text(json.dumps(state))
+
+    with pytest.raises(DivioException):
+        with main.hint_resume("<si-backup>", str(tmp_path)):
+            raise DivioException("Connection lost.")
+
+    hint = "--service-instance-backup <si-backup>"
+    assert (hint in capsys.readouterr().err) == bool(received)
@@ -0,0 +1,122 @@
+from unittest.mock import MagicMock
+
+import click
+import pytest
+from dateutil.parser import isoparse
+
+from divio_cli import logs
+from divio_cli.exceptions import DivioException
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "2024-03-01T10:20:30Z",
+        "2024-03-01T10:20:30.123456Z",
+        "2024-03-01T10:20:30.123+01:00",
+        "2024-03-01T10:20:30.1234Z",
+        "20240301T102030Z",
+    ],
+)
+def test_parse_timestamp(value):
+    assert logs.parse_timestamp(value) == isoparse(value)
+
+
+def make_entry(message, service="web"):
+    return {
+        "timestamp": "2024-03-01T10:20:30.5Z",
+        "service": service,
+        "message": message,
+    }
+
+
+def test_render_without_color(monkeypatch):
+    stdout = MagicMock()
+    monkeypatch.setattr("sys.stdout", stdout)
+
+    logs.LogRenderer(color=False).render(
+        [make_entry("\x1b[H\x1b[Jready\r"), make_entry("done", "worker")]
+    )
+
+    stdout.write.assert_called_once_with(
+        "2024-03-01 10:20:30.500000+00:00 │       web        │ ready\n"
+        "2024-03-01 10:20:30.500000+00:00 │      worker      │ done\n"
+    )
+
+
+def test_render_with_color(capsys):
+    renderer = logs.LogRenderer(color=True)
+
+    renderer.render([make_entry("ready"), make_entry("again")])
+
+    output = capsys.readouterr().out
+    assert output.count("\x1b[34m      web       \x1b[0m") == 2
+    assert list(renderer.labels) == ["web"]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = logs.LogArchive(str(tmp_path / "logs" / "e1.sqlite3"))
+    yield archive
+    archive.close()
+
+
+def test_archive_search(archive):
+    archive.append(
+        [
+            {
+                "timestamp": "2024-03-01T10:00:00Z",
+                "service": "web",
+                "message": "GET /health 200",
+            },
+            {
+                "timestamp": "2024-03-01T11:00:00Z",
+                "service": "worker",
+                "message": "connection refused by redis",
+            },
+        ],
+        cursor="https://control.divio.com/logs/?after=2",
+    )
+    archive.append(
+        [
+            {
+                "timestamp": "2024-03-01T12:00:00Z",
+                "service": "web",
+                "message": "GET /shop 500 connection refused",
+            }
+        ],
+        cursor="https://control.divio.com/logs/?after=3",
+    )
+
+    def messages(*args, **kwargs):
+        return [entry["message"] for entry in archive.search(*args, **kwargs)]
+
+    assert archive.get_cursor() == "https://control.divio.com/logs/?after=3"
+    assert messages('"connection refused"') == [
+        "connection refused by redis",
+        "GET /shop 500 connection refused",
+    ]
+    assert messages("refused", services=["web"]) == [
+        "GET /shop 500 connection refused"
+    ]
+    assert messages(
+        since=logs.parse_time("2024-03-01T10:30:00Z"),
+        until=logs.parse_time("2024-03-01T12:00:00Z"),
+    ) == ["connection refused by redis"]
+    # the latest entries, oldest first
+    assert messages(limit=2) == [
+        "connection refused by redis",
+        "GET /shop 500 connection refused",
+    ]
+    with pytest.raises(DivioException):
+        archive.search('"unbalanced')
+
+
+def test_parse_time(monkeypatch):
+    monkeypatch.setattr(logs.time, "time", lambda: 10000)
+
+    assert logs.parse_time("90s") == 9910
+    assert logs.parse_time("2h") == 10000 - 7200
+    assert logs.parse_time("1970-01-01T01:00:00Z") == 3600
+    with pytest.raises(click.BadParameter):
+        logs.parse_time("yesterday")
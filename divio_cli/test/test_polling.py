@@ -0,0 +1,71 @@
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from divio_cli import polling
+
+
+def test_poll_backs_off():
+    states = iter(["pending"] * 5 + ["done"])
+    progress = []
+
+    result = polling.poll(
+        lambda: next(states),
+        until=lambda state: state == "done",
+        on_progress=progress.append,
+        interval=1,
+        max_interval=3,
+        backoff=2,
+    )
+
+    assert result == "done"
+    assert progress == ["pending"] * 5 + ["done"]
+    assert [call.args[0] for call in time.sleep.call_args_list] == [
+        1,
+        2,
+        3,
+        3,
+        3,
+    ]
+
+
+def test_poll_returns_without_waiting():
+    assert polling.poll(lambda: 42, until=bool) == 42
+    time.sleep.assert_not_called()
+
+
+def test_poll_timeout():
+    fetch = Mock(return_value={"state": "CLONING"})
+
+    with pytest.raises(polling.PollTimeout) as excinfo:
+        polling.poll(
+            fetch,
+            until=lambda repository: repository["state"] == "CLONED",
+            timeout=0,
+            message="Verification timed out",
+        )
+
+    assert str(excinfo.value).startswith("Verification timed out after")
+    assert excinfo.value.result == {"state": "CLONING"}
+    fetch.assert_called_once_with()
+
+
+def test_poll_cancel():
+    cancel = threading.Event()
+    cancel.set()
+
+    with pytest.raises(polling.PollCancelled):
+        polling.poll(lambda: None, until=bool, cancel=cancel)
+
+
+def test_poller_reset():
+    poller = polling.Poller(interval=1, max_interval=5, backoff=2)
+    poller.wait()
+    poller.wait()
+    assert poller.interval == 4
+
+    poller.reset()
+
+    assert poller.interval == 1
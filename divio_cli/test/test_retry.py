@@ -0,0 +1,146 @@
+import io
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+
+from divio_cli import retry
+
+
+URL = "https://api.divio.com/apps/v3/regions/"
+
+
+def make_response(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response.raw = io.BytesIO()
+    return response
+
+
+@pytest.fixture
+def policy():
+    return retry.RetryPolicy(budget=retry.RetryBudget(max_retries=10))
+
+
+@pytest.mark.parametrize(
+    ("method", "status_code", "attempts"),
+    [
+        ("GET", 503, 2),
+        ("GET", 429, 2),
+        ("GET", 500, 1),
+        ("GET", 404, 1),
+        ("PUT", 502, 2),
+        ("POST", 503, 1),
+        ("POST", 429, 2),
+    ],
+)
+def test_call_retries_status_codes(policy, method, status_code, attempts):
+    send = MagicMock(
+        side_effect=[make_response(status_code), make_response(200)]
+    )
+
+    response = policy.call(send, method, URL)
+
+    assert send.call_count == attempts
+    assert response.status_code == (200 if attempts == 2 else status_code)
+
+
+def test_call_retries_connection_errors(policy):
+    send = MagicMock(
+        side_effect=[requests.exceptions.ReadTimeout(), make_response(200)]
+    )
+
+    assert policy.call(send, "GET", URL).status_code == 200
+
+
+def test_call_does_not_retry_sent_post_requests(policy):
+    send = MagicMock(side_effect=requests.exceptions.ReadTimeout())
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        policy.call(send, "POST", URL)
+
+    assert send.call_count == 1
+
+
+def test_call_retries_post_requests_not_sent(policy):
+    send = MagicMock(
+        side_effect=[requests.exceptions.ConnectTimeout(), make_response(200)]
+    )
+
+    assert policy.call(send, "POST", URL).status_code == 200
+
+
+def test_call_gives_up_after_max_attempts(policy):
+    send = MagicMock(return_value=make_response(503))
+
+    assert policy.call(send, "GET", URL).status_code == 503
+    assert send.call_count == policy.max_attempts
+
+
+def test_call_respects_budget():
+    policy = retry.RetryPolicy(budget=retry.RetryBudget(max_retries=1))
+    send = MagicMock(return_value=make_response(503))
+
+    policy.call(send, "GET", URL)
+    assert send.call_count == 2
+
+    policy.call(send, "GET", URL)
+    assert send.call_count == 3
+
+
+def test_call_honours_retry_after(policy, monkeypatch):
+    sleep = MagicMock()
+    monkeypatch.setattr(retry.time, "sleep", sleep)
+    send = MagicMock(
+        side_effect=[
+            make_response(429, headers={"Retry-After": "7"}),
+            make_response(200),
+        ]
+    )
+
+    policy.call(send, "GET", URL)
+
+    sleep.assert_called_once_with(7.0)
+
+
+def test_call_gives_up_on_long_retry_after(policy):
+    send = MagicMock(
+        return_value=make_response(503, headers={"Retry-After": "3600"})
+    )
+
+    assert policy.call(send, "GET", URL).status_code == 503
+    assert send.call_count == 1
+
+
+def test_get_delay_is_bounded(policy):
+    delay = policy.base_delay
+    for _ in range(50):
+        delay = policy.get_delay(delay)
+        assert policy.base_delay <= delay <= policy.max_delay
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        (None, None),
+        ("", None),
+        ("120", 120.0),
+        ("-1", 0.0),
+        ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0),
+        ("soon", None),
+    ],
+)
+def test_parse_retry_after(value, expected):
+    assert retry.parse_retry_after(value) == expected
+
+
+def test_reset_budget(monkeypatch):
+    policy = retry.RetryPolicy(budget=retry.RetryBudget(max_retries=1))
+    monkeypatch.setattr(retry, "default_policy", policy)
+    policy.call(MagicMock(return_value=make_response(503)), "GET", URL)
+    assert not policy.budget.acquire()
+
+    retry.reset_budget()
+
+    assert policy.budget.acquire()
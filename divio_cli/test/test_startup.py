@@ -0,0 +1,57 @@
+import subprocess
+import sys
+
+import pytest
+
+
+# Modules that are slow to import and only needed by a few commands. They
+# must not be imported to parse the command line.
+LAZY_MODULES = [
+    "azure.storage.blob",
+    "boto3",
+    "inquirer",
+    "ipdb",
+    "sentry_sdk",
+    "tabulate",
+    "yaml",
+]
+
+# Cumulative import time of divio_cli.cli in microseconds. Generous on
+# purpose: this is meant to catch regressions like an SDK imported at module
+# level, not to benchmark.
+STARTUP_BUDGET = 1_500_000
+
+
+@pytest.fixture(scope="module")
+def import_times():
+    process = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "from divio_cli.cli import cli; cli(['--help'])",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    import_times = {}
+    for line in process.stderr.splitlines():
+        # e.g. "import time:       406 |       1325 |   divio_cli.utils"
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            import_times[name.strip()] = int(cumulative)
+    return import_times
+
+
+@pytest.mark.parametrize("module", LAZY_MODULES)
+def test_help_does_not_import(import_times, module):
+    assert module not in import_times
+
+
+def test_startup_budget(import_times):
+    assert import_times["divio_cli.cli"] < STARTUP_BUDGET
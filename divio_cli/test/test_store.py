@@ -0,0 +1,106 @@
+import os
+import stat
+
+import pytest
+
+from divio_cli.store import MetadataStore, get_store_path
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MetadataStore(str(tmp_path / "metadata" / "store.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_get_store_path():
+    path = get_store_path("/tmp", "https://control.divio.com", "<identity>")
+
+    assert os.path.dirname(path) == "/tmp"
+    assert path != get_store_path(
+        "/tmp", "https://control.divio.com", "<other-identity>"
+    )
+    assert path != get_store_path(
+        "/tmp", "https://control.example.com", "<identity>"
+    )
+
+
+def test_get_unknown_listing(store):
+    assert store.get("applications") is None
+    assert store.get_synced_at("applications") is None
+
+    store.replace("applications", [])
+
+    assert store.get("applications") == []
+    assert store.get_synced_at("applications") is not None
+
+
+def test_replace_keeps_order_and_scope(store):
+    store.replace(
+        "deployments",
+        [
+            {"uuid": "d2", "environment": "e1"},
+            {"uuid": "d1", "environment": "e2"},
+        ],
+        application="a1",
+    )
+    store.replace("deployments", [{"uuid": "d3"}], application="a2")
+
+    assert [d["uuid"] for d in store.get("deployments", application="a1")] == [
+        "d2",
+        "d1",
+    ]
+    # the listing of an application covers each of its environments
+    assert store.get("deployments", application="a1", environment="e2") == [
+        {"uuid": "d1", "environment": "e2"}
+    ]
+    # the scope fills in fields missing from the records
+    assert store.get("deployments", application="a2") == [{"uuid": "d3"}]
+    assert store.get("deployments", application="a3") is None
+
+    store.replace(
+        "deployments", [{"uuid": "d1", "environment": "e2"}], application="a1"
+    )
+
+    assert store.get("deployments", application="a1") == [
+        {"uuid": "d1", "environment": "e2"}
+    ]
+    assert store.get("deployments", application="a2") == [{"uuid": "d3"}]
+
+
+def test_delete(store):
+    store.replace("environments", [{"uuid": "e1"}], application="a1")
+    store.replace("environments", [{"uuid": "e2"}], application="a2")
+
+    store.delete("environments", application="a1")
+
+    assert store.get("environments", application="a1") is None
+    assert store.get("environments", application="a2") == [{"uuid": "e2"}]
+
+
+def test_invalid_scope(store):
+    with pytest.raises(ValueError):
+        store.get("regions", application="a1")
+
+
+def test_save_ignores_errors(store, tmp_path):
+    store.path = str(tmp_path)
+
+    store.save("regions", [{"uuid": "r1"}])
+
+    assert store._connection is None
+
+
+def test_clear(store):
+    store.replace("regions", [{"uuid": "r1"}])
+
+    store.clear()
+
+    assert not os.path.exists(store.path)
+    assert store.get("regions") is None
+
+
+def test_store_is_private(store):
+    store.replace("regions", [])
+
+    assert stat.S_IMODE(os.stat(store.path).st_mode) == 0o600
@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from divio_cli.taskgraph import TaskGraph
+
+
+def test_task_graph_runs_independent_tasks_concurrently():
+    graph = TaskGraph()
+    barrier = threading.Barrier(2, timeout=5)
+    order = []
+
+    def clone():
+        barrier.wait()
+        order.append("clone")
+        return "repository"
+
+    def backup():
+        barrier.wait()
+        order.append("backup")
+        return "dump"
+
+    def restore():
+        order.append("restore")
+        return (graph.results["clone"], graph.results["backup"])
+
+    graph.add("clone", clone)
+    graph.add("backup", backup)
+    graph.add("restore", restore, after=["clone", "backup"])
+
+    results = graph.run()
+
+    assert results["restore"] == ("repository", "dump")
+    assert order[-1] == "restore"
+    assert set(graph.durations) == {"clone", "backup", "restore"}
+
+
+def test_task_graph_stops_on_error():
+    graph = TaskGraph()
+    ran = []
+
+    def clone():
+        raise ValueError("clone failed")
+
+    def backup():
+        # stops once the clone failed
+        assert graph.cancel.wait(5)
+        return "dump"
+
+    graph.add("clone", clone)
+    graph.add("backup", backup)
+    graph.add("restore", lambda: ran.append("restore"), after=["clone"])
+
+    with pytest.raises(ValueError, match="clone failed"):
+        graph.run()
+
+    assert graph.results == {"backup": "dump"}
+    assert not ran
+
+
+def test_task_graph_unknown_dependency():
+    graph = TaskGraph()
+
+    with pytest.raises(ValueError):
+        graph.add("restore", lambda: None, after=["backup"])
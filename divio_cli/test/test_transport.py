@@ -0,0 +1,45 @@
+import socket
+
+import requests
+
+from divio_cli import transport
+from divio_cli.api_requests import SingleHostSession
+
+
+def test_mount():
+    session = transport.mount(requests.Session(), pool_size=4)
+
+    for prefix in ("https://", "http://"):
+        adapter = session.get_adapter(f"{prefix}example.com")
+        assert isinstance(adapter, transport.PooledHTTPAdapter)
+        assert adapter._pool_maxsize == 4
+        assert adapter.poolmanager.connection_pool_kw["socket_options"] == (
+            transport.SOCKET_OPTIONS
+        )
+
+    assert (
+        socket.SOL_SOCKET,
+        socket.SO_KEEPALIVE,
+        1,
+    ) in transport.SOCKET_OPTIONS
+    assert (
+        socket.IPPROTO_TCP,
+        socket.TCP_NODELAY,
+        1,
+    ) in transport.SOCKET_OPTIONS
+
+
+def test_single_host_session_is_pooled():
+    session = SingleHostSession("https://control.divio.com", pool_size=8)
+
+    adapter = session.get_adapter("https://api.divio.com/")
+    assert isinstance(adapter, transport.PooledHTTPAdapter)
+    assert adapter._pool_maxsize == 8
+    assert not hasattr(session, "pool_size")
+
+
+def test_get_session_is_shared(monkeypatch):
+    monkeypatch.setattr(transport, "_session", None)
+    monkeypatch.setattr(transport, "get_pool_size", lambda: 2)
+
+    assert transport.get_session() is transport.get_session()
@@ -0,0 +1,185 @@
+import pytest
+
+from divio_cli import utils
+from divio_cli.exceptions import DivioException
+
+
+BASE_URL = "https://api.example.com/apps/v3/deployments/"
+
+
+def make_request_class(count, page_size, max_page_size=None):
+    """
+    Build a fake APIRequest class serving `count` results split into pages
+    using page number pagination.
+    """
+    calls = []
+
+    class FakeRequest:
+        def __init__(self, session, url=None, params=None, url_kwargs=None):
+            self.url = url
+            self.params = params or {}
+
+        def __call__(self):
+            calls.append(self.url)
+            if self.url:
+                query = dict(
+                    part.split("=")
+                    for part in self.url.split("?")[1].split("&")
+                )
+                page = int(query["page"])
+                size = int(query["page_size"])
+            else:
+                page = 1
+                size = self.params.get("page_size") or page_size
+            if max_page_size:
+                size = min(size, max_page_size)
+
+            start = (page - 1) * size
+            results = list(range(count))[start : start + size]
+            next_page = None
+            if start + size < count:
+                next_page = f"{BASE_URL}?page={page + 1}&page_size={size}"
+            return {"count": count, "next": next_page, "results": results}
+
+    return FakeRequest, calls
+
+
+@pytest.mark.parametrize(
+    ("count", "limit_results", "max_page_size", "expected", "message"),
+    [
+        (0, None, None, [], False),
+        (5, None, None, list(range(5)), False),
+        (95, None, 10, list(range(95)), False),
+        (95, 30, 10, list(range(30)), True),
+        (95, 25, 10, list(range(30)), True),
+        (20, 30, 10, list(range(20)), False),
+    ],
+)
+def test_json_response_request_paginate(
+    count, limit_results, max_page_size, expected, message
+):
+    request, calls = make_request_class(
+        count, page_size=10, max_page_size=max_page_size
+    )
+
+    results, messages = utils.json_response_request_paginate(
+        request, session=None, limit_results=limit_results
+    )
+
+    assert results == expected
+    assert bool(messages) == message
+    # every page is fetched exactly once
+    assert len(calls) == len(set(calls))
+
+
+def test_get_remaining_page_urls():
+    response = {
+        "count": 25,
+        "next": f"{BASE_URL}?page=2&page_size=10",
+        "results": list(range(10)),
+    }
+
+    assert utils.get_remaining_page_urls(response) == [
+        f"{BASE_URL}?page=2&page_size=10",
+        f"{BASE_URL}?page=3&page_size=10",
+    ]
+    assert utils.get_remaining_page_urls(response, limit_results=15) == [
+        f"{BASE_URL}?page=2&page_size=10",
+    ]
+
+
+def test_get_remaining_page_urls_cursor_pagination():
+    response = {
+        "count": 25,
+        "next": f"{BASE_URL}?cursor=cD0yMDI0",
+        "results": list(range(10)),
+    }
+
+    assert utils.get_remaining_page_urls(response) == []
+
+
+def test_json_response_request_paginate_invalid_limit():
+    with pytest.raises(DivioException):
+        utils.json_response_request_paginate(
+            None, session=None, limit_results=0
+        )
+
+
+def test_paginated_results_pages():
+    request, calls = make_request_class(25, page_size=10)
+
+    paginated_results = utils.iter_json_response_request_paginate(
+        request, session=None, limit_results=None
+    )
+
+    assert paginated_results.count == 25
+    assert [len(page) for page in paginated_results.pages()] == [10, 10, 5]
+    assert paginated_results.messages == []
+
+
+def test_paginated_results_early_termination():
+    request, calls = make_request_class(1000, page_size=10)
+
+    paginated_results = utils.iter_json_response_request_paginate(
+        request, session=None, limit_results=None
+    )
+    pages = paginated_results.pages()
+    assert next(pages) == list(range(10))
+    pages.close()
+
+    # only the first page and the prefetched ones were requested
+    assert len(calls) <= 1 + utils.PAGINATION_MAX_WORKERS
+
+
+def test_iter_table():
+    chunks = list(
+        utils.iter_table(
+            [[[1, "a"]], [], [[22, "a longer name"], [None, "b"]]],
+            ["id", "name"],
+        )
+    )
+
+    # each page is printed as it arrives, in the columns of the first one
+    assert len(chunks) == 2
+    assert "".join(chunks).splitlines() == [
+        "+------+--------+",
+        "|   id | name   |",
+        "+======+========+",
+        "|    1 | a      |",
+        "+------+--------+",
+        "|   22 | a      |",
+        "|      | longer |",
+        "|      | name   |",
+        "+------+--------+",
+        "|      | b      |",
+        "+------+--------+",
+    ]
+
+
+@pytest.mark.parametrize(
+    ("version", "expected"),
+    [
+        ("3.20.1", None),
+        ("3.20.1.dev4+g1a2b3c4", "1a2b3c4"),
+        ("3.20.1.dev4+g1a2b3c4.d20240101", "1a2b3c4"),
+        ("0.0.0", None),
+        ("not a version", None),
+    ],
+)
+def test_get_revision(monkeypatch, version, expected):
+    monkeypatch.setattr(utils, "__version__", version)
+
+    assert utils.get_revision() == expected
+
+
+def test_get_user_agent_is_cached(monkeypatch):
+    utils.get_user_agent.cache_clear()
+    monkeypatch.setattr(utils, "__version__", "3.20.1.dev4+g1a2b3c4")
+
+    user_agent = utils.get_user_agent()
+    assert user_agent.startswith("divio-cli/3.20.1.dev4+g1a2b3c4-1a2b3c4 (")
+
+    monkeypatch.setattr(utils, "__version__", "3.20.2")
+    assert utils.get_user_agent() is user_agent
+
+    utils.get_user_agent.cache_clear()
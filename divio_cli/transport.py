@@ -0,0 +1,69 @@
+import socket
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+
+# urllib3 already sets TCP_NODELAY, so that small requests (e.g. status
+# polls) are sent immediately. Keep-alive lets the OS detect dead idle
+# connections in the pool.
+SOCKET_OPTIONS = [
+    *HTTPConnection.default_socket_options,
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+if hasattr(socket, "TCP_KEEPIDLE"):
+    SOCKET_OPTIONS.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    A transport adapter keeping up to `pool_size` connections per host alive,
+    with TCP_NODELAY and keep-alive enabled on every socket.
+    """
+
+    def __init__(self, pool_size=None, **kwargs):
+        pool_size = pool_size or get_pool_size()
+        kwargs.setdefault("pool_connections", pool_size)
+        kwargs.setdefault("pool_maxsize", pool_size)
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault("socket_options", SOCKET_OPTIONS)
+        super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        proxy_kwargs.setdefault("socket_options", SOCKET_OPTIONS)
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+
+def get_pool_size():
+    # import done here to prevent circular import
+    from .config import Config
+
+    return Config().get_http_pool_size()
+
+
+def mount(session, pool_size=None):
+    """Make `session` use the pooled transport for all its requests."""
+    adapter = PooledHTTPAdapter(pool_size=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    """
+    Return the session shared by all requests that do not go to the Divio
+    API, e.g. to storage backends or PyPI.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = mount(requests.Session())
+        return _session
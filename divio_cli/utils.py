@@ -1,3 +1,4 @@
+import functools
 import io
 import json
 import os
@@ -8,23 +9,29 @@ import subprocess
 import sys
 import tarfile
 import tempfile
+import textwrap
 import unicodedata
-from contextlib import contextmanager
-from math import log
-from urllib.parse import urljoin
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, suppress
+from math import ceil, log
+from urllib.parse import parse_qs, urlencode, urljoin, urlparse, urlunparse
 
 import click
 import requests
 from packaging import version
-from tabulate import tabulate
 
 from divio_cli.exceptions import DivioException, EnvironmentDoesNotExist
 
-from . import __version__
+from . import __version__, messages, settings, transport
 
 
 ALDRYN_DEFAULT_BRANCH_NAME = "develop"
 
+# Maximum number of pages fetched in parallel by
+# `json_response_request_paginate`.
+PAGINATION_MAX_WORKERS = 4
+
 
 def status_print(message, status="default", **kwargs):
     status_colors = {
@@ -54,6 +61,9 @@ def hr(char="-", width=None, **kwargs):
 
 
 def table(data, headers, **kwargs):
+    # imported here as most commands never print a table
+    from tabulate import tabulate
+
     return tabulate(data, headers, **kwargs)
 
 
@@ -84,6 +94,24 @@ def redirect_stderr(new_stream):
         sys.stderr = original_stream
 
 
+@contextmanager
+def atomic_open(path, mode="w"):
+    """
+    Open a temporary file that replaces `path` once it was written
+    successfully, so that concurrent readers never see a partial file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as fh:
+            yield fh
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
 def is_wsl():
     return "microsoft-standard" in platform.uname().release
 
@@ -246,7 +274,10 @@ def get_size(start_path):
 
 def get_latest_version_from_pypi():
     try:
-        response = requests.get("https://pypi.python.org/pypi/divio-cli/json")
+        response = transport.get_session().get(
+            "https://pypi.python.org/pypi/divio-cli/json",
+            timeout=settings.PYPI_TIMEOUT,
+        )
         response.raise_for_status()
         newest_version = version.parse(response.json()["info"]["version"])
         return newest_version, None
@@ -256,28 +287,21 @@ def get_latest_version_from_pypi():
         return False, None
 
 
-def get_git_commit():
-    script_home = os.path.dirname(__file__)
-    git_dir = os.path.join(script_home, "..", ".git")
-    if os.path.exists(git_dir):
-        try:
-            return (
-                subprocess.check_output(
-                    [
-                        "git",
-                        "--git-dir",
-                        git_dir,
-                        "rev-parse",
-                        "--short",
-                        "HEAD",
-                    ],
-                    env=get_subprocess_env(),
-                )
-                .strip()
-                .decode("utf-8")
-            )
-        except Exception:
-            return None
+def get_revision():
+    """
+    Return the git revision the package was built from.
+
+    setuptools_scm records it in the local segment of development versions,
+    e.g. ``3.20.1.dev4+g1a2b3c4`` or ``3.20.1.dev4+g1a2b3c4.d20240101`` for
+    a dirty tree, so no git call is needed at runtime.
+    """
+    try:
+        local = version.parse(__version__).local
+    except version.InvalidVersion:
+        return None
+    match = re.match(r"g([0-9a-f]+)", local or "")
+    if match:
+        return match.group(1)
     return None
 
 
@@ -295,8 +319,9 @@ def get_git_checked_branch():
         return ALDRYN_DEFAULT_BRANCH_NAME
 
 
+@functools.lru_cache(maxsize=None)
 def get_user_agent():
-    revision = get_git_commit()
+    revision = get_revision()
     if revision:
         client = f"divio-cli/{__version__}-{revision}"
     else:
@@ -307,24 +332,13 @@ def get_user_agent():
     return f"{client} ({os_identifier}; {python})"
 
 
-def download_file(url, directory=None, filename=None):
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-
-    if not filename:
-        if response.headers.get("Content-Encoding") == "gzip":
-            filename = "data.tar.gz"
-        else:
-            filename = "data.dump"
+def download_file(url, directory=None, filename=None, cancel=None):
+    # imported here as the download module depends on this one
+    from .download import download
 
-    dump_path = os.path.join(directory or create_temp_dir(), filename)
-
-    with open(dump_path, "wb") as f:
-        for chunk in response.iter_content(chunk_size=1024):
-            if chunk:  # filter out keep-alive new chunks
-                f.write(chunk)
-                f.flush()
-    return dump_path
+    return download(
+        url, directory=directory, filename=filename, cancel=cancel
+    ).path
 
 
 def json_dumps_unicode(d, **kwargs):
@@ -395,54 +409,217 @@ def needs_legacy_migration():
 def echo_large_content(content, ctx):
     if ctx.pager:
         click.echo_via_pager(content)
-    else:
+    elif isinstance(content, str):
         click.echo(content)
+    else:
+        # an iterable of chunks, e.g. from `iter_table`
+        for chunk in content:
+            click.echo(chunk, nl=False)
+
+
+def get_remaining_page_urls(response, limit_results=None):
+    """
+    Build the URLs of all pages following the first page of a paginated
+    response, based on its ``count`` and ``next`` link.
+
+    Returns an empty list if the remaining pages can not be derived from the
+    first page (e.g. cursor based pagination), in which case the ``next``
+    links have to be followed one after another.
+    """
+    next_page = response.get("next")
+    page_size = len(response["results"])
+    if not next_page or not page_size:
+        return []
+
+    url = urlparse(next_page)
+    query = parse_qs(url.query, keep_blank_values=True)
+    if query.get("page") != ["2"]:
+        return []
+
+    total = response["count"]
+    if limit_results:
+        total = min(total, limit_results)
+
+    urls = []
+    for page in range(2, ceil(total / page_size) + 1):
+        query["page"] = [str(page)]
+        urls.append(
+            urlunparse(url._replace(query=urlencode(query, doseq=True)))
+        )
+    return urls
+
+
+class PaginatedResults:
+    """
+    Lazily iterate over the records of a paginated API listing.
+
+    The first page is requested right away, so that `count` is known and
+    errors surface at the call site. Following pages are requested in the
+    background while the caller works on the current one, and no more pages
+    are requested once the caller stops iterating. `messages` is populated
+    once all pages were consumed.
+    """
+
+    def __init__(
+        self,
+        request,
+        session,
+        limit_results,
+        params=None,
+        url_kwargs=None,
+        prefetch=PAGINATION_MAX_WORKERS,
+    ):
+        if url_kwargs is None:
+            url_kwargs = {}
+        if params is None:
+            params = {}
+        if limit_results is not None and limit_results < 1:
+            raise DivioException(
+                "The maximum number of results cannot be lower than 1. "
+                "Please adjust the --limit option accordingly."
+            )
+
+        self.request = request
+        self.session = session
+        self.limit_results = limit_results
+        self.prefetch = prefetch
+        self.messages = []
+
+        params.update({"page_size": limit_results})
+        self._first_page = self.fetch(params=params, url_kwargs=url_kwargs)
+        self.count = self._first_page["count"]
+
+    def __iter__(self):
+        for page in self.pages():
+            yield from page
+
+    def fetch(self, **kwargs):
+        try:
+            response = self.request(self.session, **kwargs)()
+        except json.decoder.JSONDecodeError:
+            raise DivioException("Error establishing connection.")
+        if "count" not in response or "results" not in response:
+            raise DivioException("Error establishing connection.")
+        return response
+
+    def pages(self):
+        """Yield the results of every page, one list per page."""
+        response, self._first_page = self._first_page, None
+        if response is None:
+            raise RuntimeError("paginated results can only be iterated once")
+
+        # Pages following the first one are fetched ahead of time, either
+        # from their precomputed URLs or by following the `next` links.
+        page_urls = deque(
+            get_remaining_page_urls(response, self.limit_results)
+        )
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=self.prefetch)
+        received = 0
+
+        try:
+            while True:
+                received += len(response["results"])
+                next_page = response.get("next")
+                done = not next_page or (
+                    self.limit_results and received >= self.limit_results
+                )
+
+                if done:
+                    if self.limit_results and self.limit_results < self.count:
+                        self.messages.append(
+                            messages.RESULTS_LIMITED.format(
+                                count=self.count, limit=self.limit_results
+                            )
+                        )
+                else:
+                    while page_urls and len(pending) < self.prefetch:
+                        pending.append(
+                            executor.submit(
+                                self.fetch, url=page_urls.popleft()
+                            )
+                        )
+                    if not pending:
+                        pending.append(
+                            executor.submit(self.fetch, url=next_page)
+                        )
+
+                yield response["results"]
+
+                if done:
+                    break
+                response = pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+def iter_json_response_request_paginate(
+    request, session, limit_results, params=None, url_kwargs=None
+):
+    return PaginatedResults(
+        request,
+        session,
+        limit_results=limit_results,
+        params=params,
+        url_kwargs=url_kwargs,
+    )
 
 
 def json_response_request_paginate(
     request, session, limit_results, params=None, url_kwargs=None
 ):
-    if url_kwargs is None:
-        url_kwargs = {}
-    if params is None:
-        params = {}
-    if limit_results is not None and limit_results < 1:
-        raise DivioException(
-            "The maximum number of results cannot be lower than 1. "
-            "Please adjust the --limit option accordingly."
-        )
+    paginated_results = iter_json_response_request_paginate(
+        request,
+        session,
+        limit_results=limit_results,
+        params=params,
+        url_kwargs=url_kwargs,
+    )
+    results = list(paginated_results)
+    return results, paginated_results.messages
 
-    params.update({"page_size": limit_results})
-    try:
-        response = request(session, params=params, url_kwargs=url_kwargs)()
-        count_total_results = response["count"]
-        results = []
-        messages = []
-        while True:
-            results += response["results"]
-            next_page = response.get("next")
-
-            if not limit_results and not next_page:
-                break
-
-            if limit_results and (
-                not next_page or len(results) >= limit_results
-            ):
-                if limit_results < count_total_results:
-                    messages.append(
-                        f"There were {count_total_results} results available, "
-                        f"but the limit is currently set at {limit_results}. "
-                        "Adjust the --limit option for more."
-                    )
-                break
-            response = request(
-                session,
-                url=next_page,
-            )()
-    except (KeyError, json.decoder.JSONDecodeError):
-        raise DivioException("Error establishing connection.")
-
-    return results, messages
+
+def iter_table(pages, headers, maxcolwidths=None):
+    """
+    Render the rows of the pages as one grid table, yielding each page as
+    it arrives. The column widths are those of the first page that has
+    rows, longer cells of the next pages are wrapped.
+    """
+    pages = iter(pages)
+    rows = next((page for page in pages if page), None)
+    if rows is None:
+        return
+    output = table(rows, headers, tablefmt="grid", maxcolwidths=maxcolwidths)
+    yield f"{output}\n"
+
+    border = output.splitlines()[-1]
+    widths = [len(column) - 2 for column in border[1:-1].split("+")]
+    for page in pages:
+        lines = []
+        for row in page:
+            lines += _grid_row_lines(row, widths)
+            lines.append(border)
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+
+def _grid_row_lines(row, widths):
+    cells = [
+        textwrap.wrap("" if value is None else str(value), width) or [""]
+        for value, width in zip(row, widths)
+    ]
+    for index in range(max(len(cell) for cell in cells)):
+        columns = []
+        for value, cell, width in zip(row, cells, widths):
+            text = cell[index] if index < len(cell) else ""
+            # numbers are aligned to the right, as tabulate does
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                columns.append(text.rjust(width))
+            else:
+                columns.append(text.ljust(width))
+        yield f"| {' | '.join(columns)} |"
 
 
 def clean_table_cell(d: dict, key: str):
@@ -7,8 +7,6 @@ from textwrap import wrap
 
 import click
 
-from divio_cli.config import WritableNetRC
-
 
 _config = {
     "interactive": True,
@@ -425,7 +423,7 @@ def confirm(prompt, default=False):
 
 
 def login(client, token=""):
-    netrc = WritableNetRC()
+    netrc = client.get_netrc()
 
     def validate_token(token):
         distinct_characters = set(token)
@@ -482,7 +480,7 @@ def login(client, token=""):
 
 
 def logout(client):
-    netrc = WritableNetRC()
+    netrc = client.get_netrc()
 
     if _config["interactive"]:
         if not confirm(
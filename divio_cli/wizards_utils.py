@@ -1,10 +1,9 @@
 from __future__ import annotations
 
-import time
-
 import inquirer
 from click import prompt
 
+from . import polling, settings
 from .utils import slugify, status_print
 
 
@@ -269,13 +268,17 @@ def verify_app_repo(client, uuid, branch):
     # Initiating the celery task to verify the repository.
     client.check_repository(uuid, branch)
 
-    c = 0
-    while True:
-        repo_state = client.get_repository(uuid)["state"]
-        if repo_state in ["INVALID", "CLONED"] or c > 14:
-            break
-        c += 1
-        time.sleep(2)
+    try:
+        repository = polling.poll(
+            lambda: client.get_repository(uuid),
+            until=lambda repository: (
+                repository["state"] in ["INVALID", "CLONED"]
+            ),
+            timeout=settings.REPOSITORY_VERIFICATION_TIMEOUT,
+        )
+    except polling.PollTimeout as exc:
+        repository = exc.result
+    repo_state = repository["state"]
 
     if repo_state != "CLONED":
         if repo_state == "CLONING":